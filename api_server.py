@@ -0,0 +1,397 @@
+"""
+Standalone HTTP API for the chatbot.
+
+Serves the same Gemini chat, image analysis and history features as the
+Streamlit app (app.py / main_web.py) for programmatic clients, without
+Streamlit's rerun model. Blocking Gemini, image and database work runs on a
+thread pool so the event loop keeps serving other connections.
+
+Endpoints:
+    GET  /health                    Liveness check
+    POST /chat                      {"message": str, "stream": bool}
+    POST /conversation              {"history": [{"role", "content"}], "message": str, "stream": bool}
+    POST /analyze-image             multipart: image=<file>, question=<text>
+    GET  /history/search?q=&limit=  Search saved conversations
+    GET  /metrics                   Request scheduler queue and per-session usage
+
+Model calls go through a per-worker RequestScheduler: clients are queued
+fairly by the X-Session-Id header (or their address), "X-Priority:
+background" marks bulk traffic that yields to interactive requests, and a
+request that cannot be started within API_MAX_QUEUE_WAIT seconds gets a 503.
+
+With "stream": true the response is newline-delimited JSON: one
+{"delta": "..."} line per chunk, then a final {"done": true, ...} line.
+
+Usage:
+    python api_server.py --port 8000 --workers 4
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import threading
+from contextlib import asynccontextmanager
+
+from PIL import Image
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from database import DatabaseManager
+from image_utils import ImageProcessor
+from request_scheduler import RequestScheduler, RequestRejected, INTERACTIVE, BACKGROUND
+import tracing
+
+# Largest accepted request body (image uploads included)
+MAX_REQUEST_BYTES = 20 * 1024 * 1024
+
+# How often a stream that is waiting for the model checks whether its client left (seconds)
+DISCONNECT_POLL_INTERVAL = 1.0
+
+SUPPORTED_IMAGE_TYPES = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']
+
+# Per worker process: each worker builds its own clients on start-up
+_services = {}
+
+def create_gemini_client():
+    """
+    Create the Gemini client for this worker.
+
+    GEMINI_BACKEND=fake serves it from the fake backend (used by the load test).
+    """
+    from gemini_client import GeminiClient
+    return GeminiClient()
+
+@asynccontextmanager
+async def lifespan(app):
+    _services["gemini"] = create_gemini_client()
+    _services["images"] = ImageProcessor()
+    _services["db"] = DatabaseManager(os.getenv("CHATBOT_DB_PATH", "chatbot_history.db"))
+    _services["scheduler"] = RequestScheduler(
+        max_concurrent=int(os.getenv("API_MAX_CONCURRENT", "16")),
+        max_queue_wait=float(os.getenv("API_MAX_QUEUE_WAIT", "30"))
+    )
+    yield
+    _services["scheduler"].shutdown()
+    _services.clear()
+
+def error_response(message: str, status_code: int = 400) -> JSONResponse:
+    """JSON error body in the same shape as a failed client result."""
+    return JSONResponse({"success": False, "response": None, "error": message}, status_code=status_code)
+
+class BodyTooLarge(Exception):
+    """Raised while reading a request body that exceeds its byte limit."""
+
+def limit_body(request: Request, max_bytes: int) -> Request:
+    """
+    The same request, but reading more than max_bytes of body raises BodyTooLarge.
+
+    Counts the bytes actually received, so chunked uploads (which have no
+    Content-Length) are held to the limit too.
+    """
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > max_bytes:
+                raise BodyTooLarge()
+        return message
+
+    return Request(request.scope, receive)
+
+def remove_files(*paths):
+    """Delete temporary files, ignoring ones that are already gone."""
+    for path in set(filter(None, paths)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+async def read_json(request: Request):
+    """Parse a JSON request body, returning (body, None) or (None, error response)."""
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None, error_response("Request body must be JSON")
+    if not isinstance(body, dict):
+        return None, error_response("Request body must be a JSON object")
+    return body, None
+
+def client_session(request: Request) -> str:
+    """Session a request is scheduled and traced under: X-Session-Id, or the client's address."""
+    return request.headers.get("x-session-id") or (request.client.host if request.client else "anonymous")
+
+def traced_endpoint(name: str):
+    """Run an endpoint as the root span of its own trace (model, image and database work become children)."""
+    def decorator(handler):
+        if not tracing.ENABLED:
+            return handler
+
+        @functools.wraps(handler)
+        async def wrapper(request: Request):
+            with tracing.span(name, session_id=client_session(request), path=request.url.path):
+                response = await handler(request)
+                tracing.set_attributes(status_code=response.status_code,
+                                       stream=isinstance(response, StreamingResponse))
+                return response
+        return wrapper
+    return decorator
+
+def schedule(request: Request, fn, *args):
+    """Queue a model call under the client's session and priority; returns a concurrent Future."""
+    session_id = client_session(request)
+    priority = BACKGROUND if request.headers.get("x-priority", "").lower() == BACKGROUND else INTERACTIVE
+    return _services["scheduler"].submit(fn, *args, session_id=session_id, priority=priority)
+
+async def call_model(request: Request, fn, *args) -> dict:
+    """Run a model call through the scheduler without blocking the event loop."""
+    try:
+        return await asyncio.wrap_future(schedule(request, fn, *args))
+    except RequestRejected as e:
+        return {"success": False, "response": None, "usage": None, "model": None, "error": str(e), "rejected": True}
+
+def model_response(response: dict) -> JSONResponse:
+    """JSON response for a model result: 503 if it was never run, 502 if the API failed."""
+    if response.get("rejected"):
+        return JSONResponse(response, status_code=503, headers={"Retry-After": "5"})
+    return JSONResponse(response, status_code=200 if response["success"] else 502)
+
+async def save_conversation(user_query: str, response: dict, query_type: str = "text", image_path: str = None):
+    """Store a successful exchange in the history database."""
+    if response.get("success"):
+        await run_in_threadpool(
+            _services["db"].add_conversation,
+            user_query, response["response"], query_type, image_path
+        )
+
+def stream_response(request: Request, message: str, history: list = None) -> StreamingResponse:
+    """Relay a streamed Gemini answer as newline-delimited JSON."""
+    gemini = _services["gemini"]
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    # The body is sent after the endpoint returned; keep saving it in the request's trace
+    trace = tracing.current_span()
+
+    def emit(kind, value=None):
+        loop.call_soon_threadsafe(events.put_nowait, (kind, value))
+
+    def produce():
+        # Holds one scheduler slot for the whole stream
+        try:
+            for chunk in gemini.stream_text_response(message, history, cancel=cancel):
+                emit("delta", chunk)
+            emit("done")
+        except Exception as e:
+            emit("error", str(e))
+
+    def on_finished(future):
+        if future.cancelled():
+            emit("error", "Request cancelled")
+        elif future.exception() is not None:
+            emit("error", str(future.exception()))
+
+    # Set when the client goes away, so the model call stops and frees its slot
+    cancel = threading.Event()
+    future = schedule(request, produce)
+    future.add_done_callback(on_finished)
+
+    async def next_event():
+        """Next event from the producer, or None once the client has disconnected."""
+        getter = asyncio.ensure_future(events.get())
+        while True:
+            done, _ = await asyncio.wait({getter}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return getter.result()
+            if await request.is_disconnected():
+                getter.cancel()
+                return None
+
+    async def generate():
+        parts = []
+        finished = False
+        try:
+            while True:
+                event = await next_event()
+                if event is None:
+                    return
+                kind, value = event
+                if kind == "delta":
+                    parts.append(value)
+                    yield json.dumps({"delta": value}) + "\n"
+                elif kind == "error":
+                    finished = True
+                    yield json.dumps({"done": True, "success": False, "error": value}) + "\n"
+                    return
+                else:
+                    finished = True
+                    break
+        finally:
+            # Disconnects surface here too: as a cancelled or closed generator when a write fails
+            if not finished:
+                cancel.set()
+                future.cancel()
+
+        result = {"done": True, "success": True, "response": "".join(parts), "error": None}
+        with tracing.use_span(trace):
+            await save_conversation(message, result)
+        yield json.dumps(result) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+async def health(request: Request):
+    return JSONResponse({"status": "ok", "pid": os.getpid()})
+
+@traced_endpoint("api.chat")
+async def chat(request: Request):
+    body, error = await read_json(request)
+    if error:
+        return error
+
+    message = body.get("message")
+    if not isinstance(message, str) or not message.strip():
+        return error_response("'message' is required")
+
+    if body.get("stream"):
+        return stream_response(request, message)
+
+    response = await call_model(request, _services["gemini"].get_text_response, message, body.get("system_message"))
+    await save_conversation(message, response)
+    return model_response(response)
+
+@traced_endpoint("api.conversation")
+async def conversation(request: Request):
+    body, error = await read_json(request)
+    if error:
+        return error
+
+    message = body.get("message")
+    history = body.get("history", [])
+    if not isinstance(message, str) or not message.strip():
+        return error_response("'message' is required")
+    if not isinstance(history, list) or not all(isinstance(m, dict) and "role" in m and "content" in m for m in history):
+        return error_response("'history' must be a list of {role, content} objects")
+
+    if body.get("stream"):
+        return stream_response(request, message, history)
+
+    response = await call_model(request, _services["gemini"].get_conversation_response, history, message)
+    await save_conversation(message, response)
+    return model_response(response)
+
+@traced_endpoint("api.analyze_image")
+async def analyze_image(request: Request):
+    too_large = error_response(f"Upload too large (limit {MAX_REQUEST_BYTES // (1024 * 1024)} MB)", 413)
+    # Content-Length rejects honest clients early; limit_body enforces the limit on what is actually sent
+    if int(request.headers.get("content-length") or 0) > MAX_REQUEST_BYTES:
+        return too_large
+
+    images = _services["images"]
+    try:
+        async with limit_body(request, MAX_REQUEST_BYTES).form() as form:
+            upload = form.get("image")
+            question = form.get("question") or "What do you see in this image?"
+            if upload is None or isinstance(upload, str):
+                return error_response("'image' file is required")
+
+            suffix = os.path.splitext(upload.filename or "")[1].lower() or ".png"
+            if suffix not in SUPPORTED_IMAGE_TYPES:
+                return error_response(f"Unsupported image type: {suffix}")
+
+            image_path = await run_in_threadpool(images.save_upload, upload.file, suffix)
+    except BodyTooLarge:
+        return too_large
+
+    prepared_path = None
+    try:
+        try:
+            prepared_path = await run_in_threadpool(images.prepare_for_ai_analysis, image_path)
+        except (ValueError, Image.DecompressionBombError) as e:
+            return error_response(str(e))
+        except OSError:
+            # Includes PIL.UnidentifiedImageError: the upload is not an image
+            return error_response("Could not read image")
+        if not prepared_path:
+            return error_response("Could not read image")
+
+        response = await call_model(request, _services["gemini"].analyze_image, prepared_path, question)
+        # The files are deleted below, so history records the client's filename
+        await save_conversation(question, response, query_type="image", image_path=upload.filename or None)
+        return model_response(response)
+    finally:
+        # The upload and its prepared copy are only needed for this request
+        await run_in_threadpool(remove_files, image_path, prepared_path)
+
+@traced_endpoint("api.search_history")
+async def search_history(request: Request):
+    term = request.query_params.get("q", "").strip()
+    if not term:
+        return error_response("'q' is required")
+    try:
+        limit = max(1, min(100, int(request.query_params.get("limit", 20))))
+    except ValueError:
+        return error_response("'limit' must be an integer")
+
+    rows = await run_in_threadpool(_services["db"].search_conversations, term)
+    results = [
+        {
+            "id": id_,
+            "user_query": user_query,
+            "ai_response": ai_response,
+            "timestamp": timestamp,
+            "query_type": query_type,
+            "image_path": image_path
+        }
+        for id_, user_query, ai_response, timestamp, query_type, image_path in rows[:limit]
+    ]
+    return JSONResponse({"success": True, "count": len(rows), "results": results})
+
+async def metrics(request: Request):
+    providers = getattr(_services["gemini"], "providers", None)
+    return JSONResponse({
+        "pid": os.getpid(),
+        **_services["scheduler"].metrics(),
+        "providers": providers.status() if providers is not None else [],
+        "routing": _services["gemini"].router.metrics() if getattr(_services["gemini"], "router", None) else None,
+        "hedging": _services["gemini"].hedger.metrics() if getattr(_services["gemini"], "hedger", None) else None
+    })
+
+app = Starlette(
+    routes=[
+        Route("/health", health, methods=["GET"]),
+        Route("/chat", chat, methods=["POST"]),
+        Route("/conversation", conversation, methods=["POST"]),
+        Route("/analyze-image", analyze_image, methods=["POST"]),
+        Route("/history/search", search_history, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+    ],
+    lifespan=lifespan
+)
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the chatbot HTTP API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("API_WORKERS", os.cpu_count() or 1)),
+                        help="Worker processes (each with its own Gemini client and thread pool)")
+    parser.add_argument("--keep-alive", type=int, default=30, help="Seconds to keep idle connections open")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        "api_server:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_keep_alive=args.keep_alive
+    )
+
+if __name__ == "__main__":
+    main()
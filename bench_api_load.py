@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Load test for the HTTP API server (api_server.py).
+
+Starts the server with the fake Gemini backend (fake_gemini.py, fixed
+latency, no network or API key needed), drives it from many concurrent keep-alive connections
+and reports throughput and latency percentiles per endpoint.
+
+Usage:
+    python bench_api_load.py --workers 4 --concurrency 64 --duration 15
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from PIL import Image
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def make_test_image() -> bytes:
+    buffer = io.BytesIO()
+    Image.linear_gradient("L").convert("RGB").resize((640, 480)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+def multipart_body(image: bytes, question: str):
+    """Encode an image upload as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"question\"\r\n\r\n{question}\r\n"
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"test.jpg\"\r\n"
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + image + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+def build_requests(image: bytes) -> dict:
+    """Request templates per endpoint: (method, path, body, content type)."""
+    upload, upload_type = multipart_body(image, "What is this?")
+    return {
+        "chat": ("POST", "/chat", json.dumps({"message": "Hello there"}).encode(), "application/json"),
+        "chat-stream": ("POST", "/chat", json.dumps({"message": "Hello", "stream": True}).encode(), "application/json"),
+        "conversation": ("POST", "/conversation", json.dumps({
+            "history": [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello!"}],
+            "message": "How are you?"
+        }).encode(), "application/json"),
+        "analyze-image": ("POST", "/analyze-image", upload, upload_type),
+        "search": ("GET", "/history/search?q=Hello&limit=5", None, None),
+    }
+
+def client_loop(port: int, requests: dict, mix: list, deadline: float, results: dict, lock: threading.Lock):
+    """Send requests over one keep-alive connection until the deadline."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    i = 0
+    while time.time() < deadline:
+        name = mix[i % len(mix)]
+        i += 1
+        method, path, body, content_type = requests[name]
+        headers = {"Content-Type": content_type} if content_type else {}
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            ok = False
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        elapsed = time.perf_counter() - start
+
+        with lock:
+            stats = results.setdefault(name, {"latencies": [], "errors": 0})
+            stats["latencies"].append(elapsed)
+            stats["errors"] += not ok
+    conn.close()
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def wait_for_server(port: int, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Server exited during start-up")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not start in time")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chatbot HTTP API against the fake Gemini backend")
+    parser.add_argument("--workers", type=int, default=2, help="Server worker processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent keep-alive client connections")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to run")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Fake Gemini latency to the first token")
+    parser.add_argument("--mix", default="chat,chat,conversation,chat-stream,analyze-image,search",
+                        help="Comma-separated endpoint mix, cycled by every client")
+    args = parser.parse_args()
+
+    port = free_port()
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(
+        os.environ,
+        GEMINI_BACKEND="fake",
+        FAKE_GEMINI_LATENCY=f"fixed:{args.latency_ms / 1000}",
+        FAKE_GEMINI_ERROR_RATE="0",
+        CHATBOT_DB_PATH=os.path.join(tempfile.mkdtemp(), "bench_api.db"),
+    )
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(repo_dir, "api_server.py"), "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(args.workers)],
+        cwd=repo_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    try:
+        wait_for_server(port, server)
+        requests = build_requests(make_test_image())
+        mix = [name.strip() for name in args.mix.split(",")]
+        results, lock = {}, threading.Lock()
+
+        print(f"{args.workers} workers, {args.concurrency} connections, {args.duration:.0f}s, "
+              f"fake Gemini latency {args.latency_ms:.0f} ms")
+        deadline = time.time() + args.duration
+        threads = [
+            # Stagger the mix so connections don't all hit the same endpoint at once
+            threading.Thread(target=client_loop, args=(port, requests, mix[i % len(mix):] + mix[:i % len(mix)],
+                                                       deadline, results, lock))
+            for i in range(args.concurrency)
+        ]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.time() - start
+
+        total = sum(len(stats["latencies"]) for stats in results.values())
+        print(f"Throughput: {total / wall:.1f} req/s ({total} requests)")
+        print(f"{'endpoint':<15}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+        print("-" * 57)
+        for name, stats in sorted(results.items()):
+            latencies = sorted(stats["latencies"])
+            print(f"{name:<15}{len(latencies):>7}{statistics.median(latencies) * 1000:>9.0f}"
+                  f"{percentile(latencies, 0.95) * 1000:>9.0f}{percentile(latencies, 0.99) * 1000:>9.0f}"
+                  f"{stats['errors']:>8}")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+if __name__ == "__main__":
+    main()
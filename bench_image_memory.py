@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for image ingestion.
+Compares peak memory of decoding a large photo at full size against
+ImageProcessor's reduce-on-load path. Each strategy runs in a fresh
+process so the peak resident set size can be measured in isolation.
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+from PIL import Image
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS counter (Linux only). Returns True on success."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb() -> float:
+    """Return this process's peak resident set size in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def create_test_image(path: str, megapixels: int):
+    """Write a synthetic JPEG with roughly the given number of megapixels."""
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    # A linear gradient compresses well but still has to be fully decoded
+    gradient = Image.linear_gradient("L").resize((width, height))
+    Image.merge("RGB", (gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), gradient)).save(path, quality=90)
+
+def run_strategy(strategy: str, image_path: str):
+    """Decode image_path with one strategy and print the memory used."""
+    from image_utils import ImageProcessor
+    processor = ImageProcessor()
+    reset_peak_rss()
+    baseline = peak_rss_mb()
+
+    if strategy == "full":
+        # Previous behaviour: full decode, convert, then thumbnail
+        with Image.open(image_path) as img:
+            img = img.convert("RGB")
+            img.thumbnail(processor.max_image_size, Image.Resampling.LANCZOS)
+    elif strategy == "reduced":
+        img = processor.open_reduced(image_path)
+    elif strategy == "prepare":
+        processor.prepare_for_ai_analysis(image_path)
+    else:
+        raise ValueError(f"Unknown strategy: {strategy}")
+
+    print(f"{peak_rss_mb() - baseline:.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure peak memory of image ingestion")
+    parser.add_argument("--megapixels", type=int, default=50, help="Size of the synthetic test photo")
+    parser.add_argument("--image", help="Use an existing image instead of a synthetic one")
+    parser.add_argument("--worker", nargs=2, metavar=("STRATEGY", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_strategy(*args.worker)
+        return
+
+    image_path = args.image
+    if not image_path:
+        image_path = os.path.join(tempfile.mkdtemp(), f"bench_{args.megapixels}mp.jpg")
+        print(f"Creating {args.megapixels} MP test image...")
+        create_test_image(image_path, args.megapixels)
+
+    with Image.open(image_path) as img:
+        print(f"Image: {img.width}×{img.height} ({img.width * img.height / 1e6:.1f} MP), "
+              f"{os.path.getsize(image_path) / 1e6:.1f} MB on disk")
+
+    print("-" * 50)
+    for strategy in ["full", "reduced", "prepare"]:
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", strategy, image_path],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        if result.returncode != 0:
+            print(f"{strategy:>8}: failed\n{result.stderr}")
+            continue
+        print(f"{strategy:>8}: peak memory +{result.stdout.strip().splitlines()[-1]} MB")
+
+if __name__ == "__main__":
+    main()
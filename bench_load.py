@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of GeminiClient against the local fake backend.
+
+Simulates concurrent chat sessions, each running a mix of single
+questions, multi-turn conversations (with growing history), streamed
+answers and image questions through the real client code: model routing,
+the provider pool with failover and, optionally, hedging. Only the
+network call is replaced by fake_gemini.FakeGeminiProvider, so no key or
+network is needed.
+
+Reports throughput and p50/p95/p99 latency and error rate per operation.
+
+Usage:
+    python bench_load.py --sessions 50 --turns 20 --latency "lognormal:0.3:0.6,tail:0.02:3"
+    python bench_load.py --sessions 50 --error-rate 0.05 --keys 3 --hedging
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from PIL import Image
+
+from fake_gemini import FakeGeminiProvider
+from gemini_client import GeminiClient
+from llm_providers import ProviderError
+from model_router import create_model_router
+from request_hedger import RequestHedger
+
+QUESTIONS = [
+    "What's the capital of France?",
+    "Give me a quick tip for better sleep.",
+    "Explain why the sky is blue, step by step.",
+    "def add(a, b):\n    return a - b\nWhat's wrong with this function?",
+    "Summarize the plot of Hamlet in two sentences.",
+]
+
+def make_test_image(directory: str) -> str:
+    path = os.path.join(directory, "load_test.jpg")
+    Image.linear_gradient("L").convert("RGB").resize((640, 480)).save(path, format="JPEG")
+    return path
+
+def run_session(client: GeminiClient, session: int, turns: int, image_path: str, mix: list,
+                results: dict, lock: threading.Lock):
+    """One simulated user: a conversation whose turns cycle through the operation mix."""
+    rng = random.Random(session)
+    history = []
+    for turn in range(turns):
+        operation = mix[(session + turn) % len(mix)]
+        question = rng.choice(QUESTIONS)
+        start = time.perf_counter()
+        first_chunk = None
+
+        if operation == "text":
+            ok = client.get_text_response(question)["success"]
+        elif operation == "conversation":
+            result = client.get_conversation_response(history, question)
+            ok = result["success"]
+            if ok:
+                history += [{"role": "user", "content": question}, {"role": "assistant", "content": result["response"]}]
+        elif operation == "stream":
+            try:
+                for _ in client.stream_text_response(question, history):
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - start
+                ok = True
+            except Exception:
+                ok = False
+        else:
+            ok = client.analyze_image(image_path, "What is in this picture?")["success"]
+        elapsed = time.perf_counter() - start
+
+        with lock:
+            stats = results.setdefault(operation, {"latencies": [], "first_chunk": [], "errors": 0})
+            stats["latencies"].append(elapsed)
+            stats["errors"] += not ok
+            if first_chunk is not None:
+                stats["first_chunk"].append(first_chunk)
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))] if sorted_values else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test GeminiClient against a fake Gemini backend")
+    parser.add_argument("--sessions", type=int, default=20, help="Concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=10, help="Requests per session")
+    parser.add_argument("--latency", default="lognormal:0.3:0.5,tail:0.02:2",
+                        help="Fake latency distribution (see fake_gemini.LatencyDistribution)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Chance of an injected outage per call")
+    parser.add_argument("--quota-rate", type=float, default=0.0, help="Chance of an injected quota error per call")
+    parser.add_argument("--keys", type=int, default=1, help="Fake API keys (providers) per model")
+    parser.add_argument("--hedging", action="store_true", help="Hedge slow calls")
+    parser.add_argument("--mix", default="text,conversation,conversation,stream,image",
+                        help="Comma-separated operation mix: text, conversation, stream, image")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the fake backend")
+    args = parser.parse_args()
+
+    router = create_model_router()
+    models = router.models() if router else ["gemini-2.5-flash"]
+    error_rates = {ProviderError.UNAVAILABLE: args.error_rate, ProviderError.QUOTA: args.quota_rate}
+    providers = [
+        FakeGeminiProvider(name=f"fake-{model}/{key}", model_name=model, latency=args.latency,
+                           error_rates={kind: rate for kind, rate in error_rates.items() if rate},
+                           chunk_interval=0.01, seed=args.seed + key * len(models) + i)
+        for key in range(args.keys)
+        for i, model in enumerate(models)
+    ]
+    client = GeminiClient(providers=providers, router=router, hedger=RequestHedger() if args.hedging else None)
+
+    image_path = make_test_image(tempfile.mkdtemp())
+    mix = [operation.strip() for operation in args.mix.split(",")]
+    results, lock = {}, threading.Lock()
+
+    print(f"{args.sessions} sessions x {args.turns} turns, latency {args.latency}, "
+          f"errors {args.error_rate:.0%} outage / {args.quota_rate:.0%} quota, {args.keys} key(s) per model, "
+          f"hedging {'on' if args.hedging else 'off'}")
+    threads = [
+        threading.Thread(target=run_session, args=(client, session, args.turns, image_path, mix, results, lock))
+        for session in range(args.sessions)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    total = sum(len(stats["latencies"]) for stats in results.values())
+    errors = sum(stats["errors"] for stats in results.values())
+    print(f"Throughput: {total / wall:.1f} req/s ({total} requests in {wall:.1f}s), "
+          f"error rate {errors / total if total else 0.0:.1%}")
+    print(f"{'operation':<14}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'TTFC p50':>10}{'errors':>8}")
+    print("-" * 66)
+    for name, stats in sorted(results.items()):
+        latencies = sorted(stats["latencies"])
+        first_chunk = sorted(stats["first_chunk"])
+        ttfc = f"{percentile(first_chunk, 0.5) * 1000:.0f}" if first_chunk else "-"
+        print(f"{name:<14}{len(latencies):>7}{percentile(latencies, 0.5) * 1000:>9.0f}"
+              f"{percentile(latencies, 0.95) * 1000:>9.0f}{percentile(latencies, 0.99) * 1000:>9.0f}"
+              f"{ttfc:>10}{stats['errors']:>8}")
+
+    print("\nProviders:")
+    for provider, status in zip(providers, client.providers.status()):
+        counters = provider.stats()
+        print(f"  {status['name']:<32} {counters['calls']:>5} calls, {counters['errors']:>4} injected errors, "
+              f"{counters['output_tokens']:>7} tokens out, {status['successes']:>5} ok")
+    if router is not None:
+        for name, route in router.metrics()["routes"].items():
+            print(f"Route {name}: {route['model']}, {route['requests']} requests, {route['rerouted']} rerouted")
+    if client.hedger is not None:
+        hedging = client.hedger.metrics()
+        print(f"Hedging: {hedging['hedge_rate']:.1%} hedged, {hedging['hedge_win_rate']:.0%} of hedges won, "
+              f"{hedging['latency_saved_seconds']:.1f}s saved")
+
+if __name__ == "__main__":
+    main()
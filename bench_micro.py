@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the hot paths behind every chat turn.
+
+Covers DatabaseManager insert/search/stats/recent at several table sizes,
+ImageProcessor.prepare_for_ai_analysis on small, large and huge images,
+conversation prompt assembly in GeminiClient with long histories, and
+process_voice_commands on long transcripts. All inputs come from seeded
+generators, so every run measures the same work; the model call is a
+zero-latency FakeProvider.
+
+Results can be saved as a baseline and later runs compared with it;
+operations slower than the baseline by more than the threshold are
+reported and the exit status is 1.
+
+Usage:
+    python bench_micro.py --output micro_baseline.json
+    python bench_micro.py --sizes 1000,100000 --baseline micro_baseline.json --threshold 0.2
+    python bench_micro.py --only voice,prompt
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import timeit
+
+from PIL import Image
+
+from database import DatabaseManager
+from gemini_client import GeminiClient
+from image_utils import ImageProcessor
+from llm_providers import FakeProvider
+from voice_utils import process_voice_commands
+
+VOCABULARY = (
+    "image photo question answer model python code weather travel recipe music history science "
+    "explain how why what when where please could you tell me about the a of and in to for with"
+).split()
+
+# Appears in one row in a thousand, so searches return a realistic handful of matches
+RARE_TERM = "zebracorn"
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+def history_rows(count: int, seed: int = 1):
+    """Deterministic (user_query, ai_response, query_type, timestamp offset) rows."""
+    rng = random.Random(seed)
+    for i in range(count):
+        query = sentence(rng, 8)
+        if i % 1000 == 0:
+            query += f" {RARE_TERM}"
+        yield query, sentence(rng, 30), "image" if i % 10 == 0 else "text", f"-{i % 30} days"
+
+def conversation(count: int, seed: int = 2) -> list:
+    rng = random.Random(seed)
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": sentence(rng, 15 if i % 2 == 0 else 60)}
+        for i in range(count)
+    ]
+
+def transcript(words: int, seed: int = 3, command: str = None) -> str:
+    """Dictated text; a command phrase, if given, is put at the end (the slowest place to find it)."""
+    text = sentence(random.Random(seed), words)
+    return f"{text} {command}" if command else text
+
+def make_image(path: str, size: tuple, seed: int = 4):
+    """Image of deterministic noise tiles, so it compresses like a photo rather than a flat colour."""
+    tile = Image.frombytes("RGB", (256, 256), random.Random(seed).randbytes(256 * 256 * 3))
+    image = Image.new("RGB", size)
+    for x in range(0, size[0], 256):
+        for y in range(0, size[1], 256):
+            image.paste(tile, (x, y))
+    image.save(path)
+    return path
+
+def measure(fn, repeat: int = 5) -> dict:
+    """Per-call time in µs: best and median over `repeat` batches of at least 0.2 s each."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    runs = [t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number)]
+    return {"best_us": min(runs), "median_us": statistics.median(runs), "calls": number * repeat}
+
+def bench_database(work_dir: str, sizes: list) -> dict:
+    results = {}
+    for size in sizes:
+        db = DatabaseManager(os.path.join(work_dir, f"history_{size}.db"))
+        conn = sqlite3.connect(db.db_path)
+        conn.executemany(
+            "INSERT INTO history (user_query, ai_response, query_type, timestamp) "
+            "VALUES (?, ?, ?, datetime('now', ?))",
+            history_rows(size)
+        )
+        conn.commit()
+        conn.close()
+
+        results[f"db.insert[{size}]"] = measure(lambda: db.add_conversation("benchmark question", "benchmark answer"))
+        results[f"db.search[{size}]"] = measure(lambda: db.search_conversations(RARE_TERM), repeat=3)
+        results[f"db.stats[{size}]"] = measure(db.get_conversation_stats, repeat=3)
+        results[f"db.recent[{size}]"] = measure(lambda: db.get_all_conversations(limit=50), repeat=3)
+    return results
+
+def bench_images(work_dir: str) -> dict:
+    processor = ImageProcessor()
+    images = {
+        "small-jpeg": make_image(os.path.join(work_dir, "small.jpg"), (640, 480)),
+        "large-jpeg": make_image(os.path.join(work_dir, "large.jpg"), (4032, 3024)),
+        "large-png": make_image(os.path.join(work_dir, "large.png"), (4032, 3024)),
+        "huge-jpeg": make_image(os.path.join(work_dir, "huge.jpg"), (12000, 8000)),
+    }
+    return {
+        f"image.prepare[{name}]": measure(lambda path=path: processor.prepare_for_ai_analysis(path), repeat=3)
+        for name, path in images.items()
+    }
+
+def bench_prompts() -> dict:
+    client = GeminiClient(providers=[FakeProvider(response=lambda request: "ok")], hedger=None)
+    results = {}
+    for length in (10, 100, 1000, 10000):
+        history = conversation(length)
+        results[f"prompt.build[{length}]"] = measure(
+            lambda: client.build_conversation_context(history, "And what about tomorrow?")
+        )
+        results[f"prompt.conversation_response[{length}]"] = measure(
+            lambda: client.get_conversation_response(history, "And what about tomorrow?")
+        )
+    return results
+
+def bench_voice() -> dict:
+    results = {}
+    for words in (10, 1000, 10000):
+        plain = transcript(words)
+        with_command = transcript(words, command="search history for recipes")
+        results[f"voice.commands[{words}w]"] = measure(lambda: process_voice_commands(plain))
+        results[f"voice.commands[{words}w+command]"] = measure(lambda: process_voice_commands(with_command))
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before and result["median_us"] > before["median_us"] * (1 + threshold):
+            regressions.append(f"{name}: {before['median_us']:.1f} -> {result['median_us']:.1f} µs "
+                               f"(+{result['median_us'] / before['median_us'] - 1:.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark database, image, prompt and voice hot paths")
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="Comma-separated history table sizes")
+    parser.add_argument("--only", default="db,image,prompt,voice", help="Comma-separated groups to run")
+    parser.add_argument("--output", help="Save results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare with results saved by an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown over the baseline before an operation counts as a regression")
+    args = parser.parse_args()
+
+    groups = {name.strip() for name in args.only.split(",")}
+    work_dir = tempfile.mkdtemp(prefix="bench_micro_")
+    results = {}
+    if "db" in groups:
+        results.update(bench_database(work_dir, [int(size) for size in args.sizes.split(",")]))
+    if "image" in groups:
+        results.update(bench_images(work_dir))
+    if "prompt" in groups:
+        results.update(bench_prompts())
+    if "voice" in groups:
+        results.update(bench_voice())
+
+    print(f"\n{'operation':<42}{'best µs':>14}{'median µs':>14}{'calls':>8}")
+    print("-" * 78)
+    for name, result in results.items():
+        print(f"{name:<42}{result['best_us']:>14.1f}{result['median_us']:>14.1f}{result['calls']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": platform.python_version(), "results": results}, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\nRegressions over {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions over {args.threshold:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
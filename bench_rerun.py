@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Rerun cost of the Streamlit web app (main_web.py), measured with AppTest.
+
+Each scenario seeds a fresh working directory (app database, session
+store, uploaded image), opens the app on a session with ?session=<id>
+and times the first run (session start-up) and a series of plain
+reruns, then measures the memory a rerun allocates. Gemini runs on the
+local fake backend; voice and camera are stubbed, so no key, microphone
+or camera is needed.
+
+Results can be saved and compared with an earlier run; any scenario
+whose median rerun time or rerun memory grew by more than the threshold
+is reported and the exit status is 1.
+
+Usage:
+    python bench_rerun.py --output rerun_baseline.json
+    python bench_rerun.py --baseline rerun_baseline.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+# The app builds its Gemini client from the environment; use the in-repo fake
+os.environ["GEMINI_BACKEND"] = "fake"
+os.environ.setdefault("FAKE_GEMINI_LATENCY", "fixed:0.01")
+os.environ.pop("SESSION_STORE", None)
+
+import streamlit as st
+from PIL import Image
+from streamlit.testing.v1 import AppTest
+
+from database import DatabaseManager
+from session_store import SQLiteSessionStore
+
+class StubVoiceManager:
+    """VoiceManager stand-in: no audio devices, TTS writes an empty clip."""
+    tts_engine = None
+
+    class recognizer_backend:
+        name = "google"
+
+    def get_tts_settings(self) -> dict:
+        return {}
+
+    def set_recognizer_backend(self, name: str) -> bool:
+        return True
+
+    def speak_to_file(self, text: str, path: str) -> bool:
+        with open(path, "wb") as f:
+            f.write(b"RIFF")
+        return True
+
+    def listen_once(self, timeout: int = 5):
+        return None
+
+class StubCameraManager:
+    """CameraManager stand-in that reports no camera (probing real devices is slow)."""
+    camera_available = False
+
+def message_text(i: int) -> str:
+    """Deterministic chat message with some markdown, like real answers."""
+    if i % 2 == 0:
+        return f"Question {i}: how does feature {i % 17} work with option {i % 5}?"
+    return (f"**Answer {i}.** Feature {i % 17} works like this:\n\n"
+            + "".join(f"- step {step}: do thing {step * i % 11}\n" for step in range(4))
+            + "\nSee `config_{i % 7}` for details. " + "More context. " * 10)
+
+def seed_transcript(db: DatabaseManager, session_id: str, messages: int):
+    store = SQLiteSessionStore(db)
+    for i in range(messages):
+        store.add_message(session_id, i + 1, "user" if i % 2 == 0 else "assistant", message_text(i), "12:00:00")
+
+def seed_history(db_path: str, rows: int):
+    """Bulk-insert conversation history rows directly (add_conversation is one transaction per row)."""
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO history (user_query, ai_response, query_type, timestamp) VALUES (?, ?, ?, datetime('now', ?))",
+        ((message_text(2 * i), message_text(2 * i + 1), "image" if i % 10 == 0 else "text", f"-{i % 30} days")
+         for i in range(rows))
+    )
+    conn.commit()
+    conn.close()
+
+def seed_image(work_dir: str, db: DatabaseManager, session_id: str):
+    path = os.path.join(work_dir, "upload_prepared.jpg")
+    Image.linear_gradient("L").convert("RGB").resize((1024, 768)).save(path, format="JPEG")
+    SQLiteSessionStore(db).save_state(session_id, {"current_image_path": path, "current_upload_id": "bench"})
+
+def scenarios(db_rows: int) -> dict:
+    """Scenario name -> setup(work_dir, db, session_id)."""
+    return {
+        "empty": lambda work_dir, db, session_id: None,
+        "transcript-10": lambda work_dir, db, session_id: seed_transcript(db, session_id, 10),
+        "transcript-100": lambda work_dir, db, session_id: seed_transcript(db, session_id, 100),
+        "transcript-1000": lambda work_dir, db, session_id: seed_transcript(db, session_id, 1000),
+        "image": lambda work_dir, db, session_id: seed_image(work_dir, db, session_id),
+        f"history-db-{db_rows}": lambda work_dir, db, session_id: seed_history(db.db_path, db_rows),
+    }
+
+def run_app(app: AppTest):
+    app.run()
+    if app.exception:
+        raise RuntimeError(f"App raised: {app.exception[0].value}")
+
+def measure(setup, reruns: int) -> dict:
+    work_dir = tempfile.mkdtemp(prefix="bench_rerun_")
+    os.chdir(work_dir)
+    # Resources cached by the app (session store, pools) must not leak between scenarios
+    st.cache_resource.clear()
+
+    session_id = uuid.uuid4().hex
+    db = DatabaseManager(os.path.join(work_dir, "chatbot_history.db"))
+    setup(work_dir, db, session_id)
+
+    app = AppTest.from_file(os.path.join(REPO_DIR, "main_web.py"), default_timeout=120)
+    app.session_state["voice_manager"] = StubVoiceManager()
+    app.session_state["camera_manager"] = StubCameraManager()
+    app.query_params["session"] = session_id
+
+    start = time.perf_counter()
+    run_app(app)
+    cold = time.perf_counter() - start
+
+    timings = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        run_app(app)
+        timings.append(time.perf_counter() - start)
+
+    # Memory is measured on separate reruns; tracing slows them down
+    tracemalloc.start()
+    peaks = []
+    for _ in range(3):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        run_app(app)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "cold_ms": cold * 1000,
+        "rerun_median_ms": statistics.median(timings) * 1000,
+        "rerun_p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+        "rerun_peak_kib": statistics.median(peaks) / 1024,
+    }
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Scenarios that got slower or hungrier than the baseline by more than threshold."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        for metric in ("rerun_median_ms", "rerun_peak_kib"):
+            if before[metric] > 0 and result[metric] > before[metric] * (1 + threshold):
+                regressions.append(f"{name}: {metric} {before[metric]:.1f} -> {result[metric]:.1f} "
+                                   f"(+{result[metric] / before[metric] - 1:.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark main_web.py reruns with Streamlit's AppTest")
+    parser.add_argument("--reruns", type=int, default=20, help="Timed reruns per scenario")
+    parser.add_argument("--db-rows", type=int, default=100000, help="History rows in the large-database scenario")
+    parser.add_argument("--only", help="Comma-separated scenario names to run")
+    parser.add_argument("--output", help="Save results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare with results saved by an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed growth over the baseline before a scenario counts as a regression")
+    args = parser.parse_args()
+
+    selected = scenarios(args.db_rows)
+    if args.only:
+        names = [name.strip() for name in args.only.split(",")]
+        selected = {name: setup for name, setup in selected.items() if name in names}
+
+    results = {}
+    print(f"{'scenario':<20}{'cold ms':>10}{'rerun p50':>11}{'rerun p95':>11}{'rerun KiB':>11}")
+    print("-" * 63)
+    for name, setup in selected.items():
+        result = results[name] = measure(setup, args.reruns)
+        print(f"{name:<20}{result['cold_ms']:>10.0f}{result['rerun_median_ms']:>11.1f}"
+              f"{result['rerun_p95_ms']:>11.1f}{result['rerun_peak_kib']:>11.0f}")
+    os.chdir(REPO_DIR)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "streamlit": st.__version__,
+                "reruns": args.reruns,
+                "scenarios": results,
+            }, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\nRegressions over {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions over {args.threshold:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Per-rerun overhead of the session stores.
+
+Measures what the web app does against its session store: restoring a
+session on a new replica (UI state plus transcript tail), saving changed
+UI state at the end of a rerun, and writing a chat message through.
+A rerun that changes nothing does no store I/O at all.
+
+Usage:
+    python bench_session_store.py --messages 1000 --repeats 200
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+from session_store import SQLiteSessionStore, FileSessionStore
+from database import DatabaseManager
+from transcript import Transcript
+
+def sample_state(i: int) -> dict:
+    """UI state of the same shape the web app persists."""
+    return {
+        "current_image_path": f"/tmp/upload_{i}_prepared.jpg",
+        "current_upload_id": uuid.uuid4().hex,
+        "auto_read_enabled": i % 2 == 0,
+        "chat_window": 30,
+        "last_request_key": uuid.uuid4().hex * 2,
+    }
+
+def time_calls(fn, repeats: int) -> list:
+    timings = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def benchmark_store(name: str, store, messages: int, repeats: int) -> dict:
+    session_id = uuid.uuid4().hex
+    for i in range(messages):
+        store.add_message(session_id, i + 1, "user" if i % 2 == 0 else "assistant",
+                          f"Message {i} " + "lorem ipsum " * 20, "12:00:00")
+    store.save_state(session_id, sample_state(0))
+
+    results = {
+        # New replica picking up the session: UI state plus the in-memory transcript tail
+        "resume": time_calls(lambda i: (store.load_state(session_id), Transcript(store, session_id)), repeats),
+        # End of a rerun that changed a toggle or the current image
+        "save state": time_calls(lambda i: store.save_state(session_id, sample_state(i)), repeats),
+        # Chat turn written through to the store
+        "add message": time_calls(
+            lambda i: store.add_message(session_id, messages + i + 1, "user", "Hello again", "12:00:01"), repeats
+        ),
+    }
+    return {op: (statistics.median(t) * 1e6, sorted(t)[int(len(t) * 0.95)] * 1e6) for op, t in results.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark session store read/write overhead per rerun")
+    parser.add_argument("--messages", type=int, default=1000, help="Transcript length of the benchmark session")
+    parser.add_argument("--repeats", type=int, default=200, help="Operations timed per measurement")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    stores = {
+        "sqlite": SQLiteSessionStore(DatabaseManager(os.path.join(work_dir, "sessions.db"))),
+        "file": FileSessionStore(os.path.join(work_dir, "sessions")),
+    }
+
+    print(f"Session with {args.messages} messages, {args.repeats} repeats (median / p95 in µs)")
+    print(f"{'store':<8}{'resume':>20}{'save state':>20}{'add message':>20}")
+    print("-" * 68)
+    for name, store in stores.items():
+        result = benchmark_store(name, store, args.messages, args.repeats)
+        print(f"{name:<8}" + "".join(f"{f'{median:.0f} / {p95:.0f}':>20}" for median, p95 in result.values()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Latency/accuracy benchmark for the speech recognition backends.
+
+Runs every backend over a fixed set of WAV fixtures and reports latency and
+word error rate (WER), so a backend can be chosen per deployment.
+
+Each fixture is a WAV file with a transcript of the same name:
+    fixtures/speech/weather.wav
+    fixtures/speech/weather.txt
+
+Use --generate to render the built-in sentences with the local TTS engine
+(synthetic speech, but a fixed and repeatable set); add real recordings to
+the same directory for a more realistic comparison.
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+
+import speech_recognition as sr
+
+from voice_utils import RECOGNIZER_BACKENDS, create_recognizer_backend
+
+DEFAULT_FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "speech")
+
+FIXTURE_SENTENCES = {
+    "greeting": "Hello, how are you doing today?",
+    "weather": "What is the weather going to be like tomorrow morning?",
+    "image": "Can you describe what you see in this picture?",
+    "history": "Search history for my conversation about recipes.",
+    "numbers": "Set a timer for twenty five minutes.",
+    "question": "Explain how photosynthesis works in simple terms.",
+    "command": "Take photo and tell me what is on the table.",
+    "long": "I would like a short summary of the last three messages we exchanged, please keep it brief.",
+}
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level edit distance divided by the reference length."""
+    ref = reference.lower().replace(",", "").replace(".", "").replace("?", "").split()
+    hyp = hypothesis.lower().replace(",", "").replace(".", "").replace("?", "").split()
+    if not ref:
+        return 0.0 if not hyp else 1.0
+
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, start=1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, start=1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word)
+            )
+        previous = current
+    return previous[-1] / len(ref)
+
+def generate_fixtures(fixtures_dir: str):
+    """Render FIXTURE_SENTENCES to WAV files with pyttsx3."""
+    import pyttsx3
+
+    os.makedirs(fixtures_dir, exist_ok=True)
+    engine = pyttsx3.init()
+    engine.setProperty("rate", 170)
+
+    for name, sentence in FIXTURE_SENTENCES.items():
+        with open(os.path.join(fixtures_dir, f"{name}.txt"), "w") as f:
+            f.write(sentence)
+        engine.save_to_file(sentence, os.path.join(fixtures_dir, f"{name}.wav"))
+    engine.runAndWait()
+    print(f"Wrote {len(FIXTURE_SENTENCES)} fixtures to {fixtures_dir}")
+
+def load_fixtures(fixtures_dir: str) -> list:
+    """Load (name, audio, transcript) for every WAV file with a transcript."""
+    fixtures = []
+    for wav_path in sorted(glob.glob(os.path.join(fixtures_dir, "*.wav"))):
+        txt_path = os.path.splitext(wav_path)[0] + ".txt"
+        if not os.path.exists(txt_path):
+            print(f"Skipping {wav_path}: no transcript")
+            continue
+        with sr.AudioFile(wav_path) as source:
+            audio = sr.Recognizer().record(source)
+        with open(txt_path) as f:
+            fixtures.append((os.path.basename(wav_path), audio, f.read().strip()))
+    return fixtures
+
+def benchmark_backend(name: str, fixtures: list, repeats: int, verbose: bool) -> dict:
+    """Run one backend over all fixtures."""
+    backend = create_recognizer_backend(name)
+
+    start = time.perf_counter()
+    try:
+        backend.warm_up()
+    except sr.RequestError as e:
+        return {"backend": name, "error": str(e)}
+    load_time = time.perf_counter() - start
+
+    latencies, error_rates, failures = [], [], 0
+    for fixture_name, audio, transcript in fixtures:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            try:
+                text = backend.recognize(audio)
+            except sr.UnknownValueError:
+                text = ""
+            except sr.RequestError as e:
+                failures += 1
+                if verbose:
+                    print(f"  {name} {fixture_name}: {e}")
+                continue
+            latencies.append(time.perf_counter() - start)
+            error_rates.append(word_error_rate(transcript, text))
+
+        if verbose and latencies:
+            print(f"  {name} {fixture_name}: '{text}' ({latencies[-1] * 1000:.0f} ms)")
+
+    if not latencies:
+        return {"backend": name, "error": f"all {failures} recognitions failed"}
+
+    latencies.sort()
+    return {
+        "backend": name,
+        "load_s": load_time,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        "wer": statistics.mean(error_rates),
+        "failures": failures,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark speech recognition backends")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES_DIR, help="Directory of WAV + TXT fixtures")
+    parser.add_argument("--backends", default=",".join(RECOGNIZER_BACKENDS), help="Comma-separated backend names")
+    parser.add_argument("--repeats", type=int, default=1, help="Recognitions per fixture")
+    parser.add_argument("--generate", action="store_true", help="Render the built-in fixtures with pyttsx3 first")
+    parser.add_argument("--verbose", action="store_true", help="Print every transcript")
+    args = parser.parse_args()
+
+    if args.generate:
+        generate_fixtures(args.fixtures)
+
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        print(f"No fixtures found in {args.fixtures}. Run with --generate or add WAV/TXT pairs.")
+        return
+
+    print(f"Benchmarking on {len(fixtures)} fixtures")
+    print(f"{'backend':<10}{'load (s)':>10}{'mean (ms)':>12}{'p95 (ms)':>12}{'WER':>8}{'failed':>8}")
+    print("-" * 60)
+    for name in args.backends.split(","):
+        result = benchmark_backend(name.strip(), fixtures, args.repeats, args.verbose)
+        if "error" in result:
+            print(f"{result['backend']:<10}unavailable: {result['error']}")
+            continue
+        print(f"{result['backend']:<10}{result['load_s']:>10.2f}{result['mean_ms']:>12.0f}"
+              f"{result['p95_ms']:>12.0f}{result['wer']:>8.1%}{result['failures']:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,10 @@ from datetime import datetime
 from typing import List, Tuple, Optional
 import os
 
+from profiling import timed
+import tracing
+from tracing import traced
+
 class DatabaseManager:
     def __init__(self, db_path: str = "chatbot_history.db"):
         """Initialize database connection and create tables if they don't exist."""
@@ -27,6 +31,38 @@ class DatabaseManager:
                 )
             ''')
             
+            # Idempotency key of the chat submission behind each row, so a
+            # replayed submission is ignored instead of stored twice
+            cursor.execute('PRAGMA table_info(history)')
+            if 'request_key' not in [column[1] for column in cursor.fetchall()]:
+                cursor.execute('ALTER TABLE history ADD COLUMN request_key TEXT')
+            cursor.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_history_request_key
+                ON history (request_key)
+            ''')
+            
+            # Chat transcripts per browser session, paged back in on demand
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    timestamp TEXT,
+                    UNIQUE (session_id, message_id)
+                )
+            ''')
+            
+            # Small per-session UI state (current image, toggles) as JSON
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
             conn.commit()
             conn.close()
             print("Database initialized successfully!")
@@ -34,16 +70,26 @@ class DatabaseManager:
         except sqlite3.Error as e:
             print(f"Database initialization error: {e}")
     
-    def add_conversation(self, user_query: str, ai_response: str, query_type: str = 'text', image_path: str = None) -> bool:
-        """Add a new conversation entry to the database."""
+    @timed("db.add_conversation")
+    @traced("db.add_conversation")
+    def add_conversation(self, user_query: str, ai_response: str, query_type: str = 'text', image_path: str = None,
+                         request_key: str = None) -> bool:
+        """
+        Add a new conversation entry to the database.
+        
+        A row whose request_key is already stored is a replayed submission
+        and is skipped.
+        """
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute('''
-                INSERT INTO history (user_query, ai_response, query_type, image_path)
-                VALUES (?, ?, ?, ?)
-            ''', (user_query, ai_response, query_type, image_path))
+                INSERT OR IGNORE INTO history (user_query, ai_response, query_type, image_path, request_key)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (user_query, ai_response, query_type, image_path, request_key))
+            # A replayed submission inserts nothing
+            tracing.set_attributes(bytes=len(user_query.encode()) + len(ai_response.encode()), inserted=cursor.rowcount == 1)
             
             conn.commit()
             conn.close()
@@ -51,8 +97,10 @@ class DatabaseManager:
             
         except sqlite3.Error as e:
             print(f"Error adding conversation: {e}")
+            tracing.set_attributes(db_error=str(e))
             return False
     
+    @timed("db.get_all_conversations")
     def get_all_conversations(self, limit: int = None) -> List[Tuple]:
         """Retrieve all conversations from the database."""
         try:
@@ -81,6 +129,7 @@ class DatabaseManager:
             print(f"Error retrieving conversations: {e}")
             return []
     
+    @timed("db.search_conversations")
     def search_conversations(self, search_term: str) -> List[Tuple]:
         """Search for conversations containing the search term."""
         try:
@@ -135,6 +184,174 @@ class DatabaseManager:
             return False
     
     
+    @timed("db.add_message")
+    @traced("db.add_message")
+    def add_message(self, session_id: str, message_id: int, role: str, content: str, timestamp: str = None) -> bool:
+        """Store a chat message from a session's transcript."""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT OR REPLACE INTO messages (session_id, message_id, role, content, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (session_id, message_id, role, content, timestamp))
+            tracing.set_attributes(role=role, bytes=len(content.encode()))
+            
+            conn.commit()
+            conn.close()
+            return True
+            
+        except sqlite3.Error as e:
+            print(f"Error adding message: {e}")
+            tracing.set_attributes(db_error=str(e))
+            return False
+    
+    @timed("db.get_messages")
+    def get_messages(self, session_id: str, before_id: int = None, limit: int = 50) -> List[Tuple]:
+        """
+        Retrieve a page of a session's chat messages.
+        
+        Args:
+            session_id (str): Session whose transcript to read
+            before_id (int, optional): Only return messages older than this message id
+            limit (int): Maximum number of messages
+            
+        Returns:
+            List of (message_id, role, content, timestamp), oldest first
+        """
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT message_id, role, content, timestamp
+                FROM messages
+                WHERE session_id = ? AND message_id < ?
+                ORDER BY message_id DESC
+                LIMIT ?
+            ''', (session_id, before_id if before_id is not None else 2 ** 62, limit))
+            
+            messages = cursor.fetchall()
+            conn.close()
+            messages.reverse()
+            return messages
+            
+        except sqlite3.Error as e:
+            print(f"Error retrieving messages: {e}")
+            return []
+    
+    def get_message(self, session_id: str, message_id: int) -> Optional[Tuple]:
+        """Retrieve a single chat message as (message_id, role, content, timestamp)."""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT message_id, role, content, timestamp
+                FROM messages
+                WHERE session_id = ? AND message_id = ?
+            ''', (session_id, message_id))
+            
+            message = cursor.fetchone()
+            conn.close()
+            return message
+            
+        except sqlite3.Error as e:
+            print(f"Error retrieving message: {e}")
+            return None
+    
+    @timed("db.get_message_bounds")
+    def get_message_bounds(self, session_id: str) -> Tuple[int, int]:
+        """Get (message count, highest message id) for a session's transcript."""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT COUNT(*), COALESCE(MAX(message_id), 0)
+                FROM messages
+                WHERE session_id = ?
+            ''', (session_id,))
+            
+            count, last_id = cursor.fetchone()
+            conn.close()
+            return count, last_id
+            
+        except sqlite3.Error as e:
+            print(f"Error counting messages: {e}")
+            return 0, 0
+    
+    def clear_messages(self, session_id: str) -> bool:
+        """Delete a session's chat transcript."""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            cursor.execute('DELETE FROM messages WHERE session_id = ?', (session_id,))
+            
+            conn.commit()
+            conn.close()
+            return True
+            
+        except sqlite3.Error as e:
+            print(f"Error clearing messages: {e}")
+            return False
+    
+    @timed("db.save_session_state")
+    def save_session_state(self, session_id: str, state: str) -> bool:
+        """Store a session's serialized UI state, replacing any previous state."""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT OR REPLACE INTO sessions (session_id, state, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+            ''', (session_id, state))
+            
+            conn.commit()
+            conn.close()
+            return True
+            
+        except sqlite3.Error as e:
+            print(f"Error saving session state: {e}")
+            return False
+    
+    @timed("db.get_session_state")
+    def get_session_state(self, session_id: str) -> Optional[str]:
+        """Retrieve a session's serialized UI state, or None if it has none."""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT state FROM sessions WHERE session_id = ?', (session_id,))
+            
+            row = cursor.fetchone()
+            conn.close()
+            return row[0] if row else None
+            
+        except sqlite3.Error as e:
+            print(f"Error retrieving session state: {e}")
+            return None
+    
+    def delete_session_state(self, session_id: str) -> bool:
+        """Delete a session's UI state."""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            cursor.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+            
+            conn.commit()
+            conn.close()
+            return True
+            
+        except sqlite3.Error as e:
+            print(f"Error deleting session state: {e}")
+            return False
+    
+    @timed("db.get_conversation_stats")
     def get_conversation_stats(self) -> dict:
         """Get statistics about conversations."""
         try:
@@ -0,0 +1,158 @@
+import os
+import random
+import threading
+from typing import Dict, Any, Iterator, List
+
+from llm_providers import LLMProvider, ProviderError, ProviderRequest
+
+WORDS = (
+    "the model looked at your question and here is a considered answer with some detail about "
+    "images text code latency tokens streaming results example further notes"
+).split()
+
+class LatencyDistribution:
+    """
+    Random call latency in seconds.
+
+    Specs:
+        "fixed:0.5"              always 0.5 s
+        "uniform:0.2:1.5"        uniform between 0.2 and 1.5 s
+        "lognormal:0.8:0.5"      median 0.8 s, sigma 0.5 (a long right tail, like real APIs)
+    Any spec may end with ",tail:0.02:5" to make 2% of calls take an extra 5 s.
+    """
+
+    def __init__(self, spec: str = "lognormal:0.8:0.5"):
+        self.spec = spec
+        base, _, tail = spec.partition(",")
+        kind, *params = base.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+        self.tail_probability, self.tail_seconds = 0.0, 0.0
+        if tail:
+            _, probability, seconds = tail.split(":")
+            self.tail_probability, self.tail_seconds = float(probability), float(seconds)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            seconds = self.params[0]
+        elif self.kind == "uniform":
+            seconds = rng.uniform(self.params[0], self.params[1])
+        else:
+            median, sigma = self.params
+            seconds = median * rng.lognormvariate(0.0, sigma)
+        if self.tail_probability and rng.random() < self.tail_probability:
+            seconds += self.tail_seconds
+        return seconds
+
+class FakeGeminiProvider(LLMProvider):
+    """
+    Local Gemini stand-in for load tests: no key, no network.
+
+    Each call sleeps for a latency drawn from a distribution (scaled by
+    output length when streaming), may fail with an injected error, and
+    returns a response of a sampled number of tokens (one word per token,
+    so GeminiClient's usage counts match). Streams deliver the first chunk
+    after the sampled latency and the rest at chunk_interval.
+    """
+
+    def __init__(self, name: str = "fake-gemini", model_name: str = "gemini-2.5-flash", tier: int = 0,
+                 latency: str = "lognormal:0.8:0.5", output_tokens: tuple = (50, 300), chunk_tokens: int = 8,
+                 chunk_interval: float = 0.02, error_rates: Dict[str, float] = None, seed: int = None):
+        """
+        Initialize the fake backend.
+
+        Args:
+            name (str): Unique provider name
+            model_name (str): Model reported in results
+            tier (int): Routing preference (see LLMProvider)
+            latency (str): LatencyDistribution spec for the (first chunk of the) response
+            output_tokens (tuple): Range of response lengths in tokens
+            chunk_tokens (int): Tokens per streamed chunk
+            chunk_interval (float): Seconds between streamed chunks
+            error_rates (dict, optional): Probability per ProviderError kind, e.g. {"quota": 0.02}
+            seed (int, optional): Seed for reproducible runs
+        """
+        super().__init__(name, model_name, tier)
+        self.latency = LatencyDistribution(latency)
+        self.output_tokens = output_tokens
+        self.chunk_tokens = chunk_tokens
+        self.chunk_interval = chunk_interval
+        self.error_rates = dict(error_rates or {})
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "errors": 0, "prompt_tokens": 0, "output_tokens": 0}
+
+    def _plan(self, request: ProviderRequest):
+        """Draw this call's latency, error and response length."""
+        with self._lock:
+            self.counters["calls"] += 1
+            self.counters["prompt_tokens"] += len(request.prompt.split())
+            latency = self.latency.sample(self._rng)
+            error_kind = None
+            roll = self._rng.random()
+            for kind, rate in self.error_rates.items():
+                if roll < rate:
+                    error_kind = kind
+                    break
+                roll -= rate
+            tokens = self._rng.randint(*self.output_tokens)
+            if error_kind:
+                self.counters["errors"] += 1
+            else:
+                self.counters["output_tokens"] += tokens
+        return latency, error_kind, tokens
+
+    def _wait(self, request: ProviderRequest, seconds: float):
+        if request.cancel.wait(seconds):
+            raise ProviderError("Request cancelled", kind=ProviderError.CANCELLED, provider=self.name)
+
+    def _text(self, request: ProviderRequest, tokens: int) -> List[str]:
+        prefix = "Looking at the image," if request.image_path else "Answer:"
+        return [prefix] + [WORDS[(i + len(request.prompt)) % len(WORDS)] for i in range(tokens - 1)]
+
+    def generate(self, request: ProviderRequest) -> str:
+        latency, error_kind, tokens = self._plan(request)
+        if error_kind:
+            # Failures tend to come back faster than answers
+            self._wait(request, latency / 4)
+            raise ProviderError(f"Injected {error_kind} error", kind=error_kind, provider=self.name)
+        self._wait(request, latency + self.chunk_interval * (tokens // self.chunk_tokens))
+        return " ".join(self._text(request, tokens))
+
+    def stream(self, request: ProviderRequest) -> Iterator[str]:
+        latency, error_kind, tokens = self._plan(request)
+        self._wait(request, latency)
+        if error_kind:
+            raise ProviderError(f"Injected {error_kind} error", kind=error_kind, provider=self.name)
+        words = self._text(request, tokens)
+        for i in range(0, len(words), self.chunk_tokens):
+            if i:
+                self._wait(request, self.chunk_interval)
+            yield " ".join(words[i:i + self.chunk_tokens]) + " "
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counters)
+
+def fake_providers_from_env(models: list = None) -> list:
+    """
+    Fake Gemini providers configured from environment variables.
+
+    FAKE_GEMINI_LATENCY is a LatencyDistribution spec, FAKE_GEMINI_ERROR_RATE
+    the chance of an injected outage per call, FAKE_GEMINI_KEYS how many
+    fake keys (providers) to create per model.
+    """
+    providers = []
+    error_rate = float(os.getenv("FAKE_GEMINI_ERROR_RATE", "0"))
+    for i in range(int(os.getenv("FAKE_GEMINI_KEYS", "1"))):
+        for model_name in models or ["gemini-2.5-flash"]:
+            providers.append(FakeGeminiProvider(
+                name=f"fake-{model_name}/{i}",
+                model_name=model_name,
+                latency=os.getenv("FAKE_GEMINI_LATENCY", "lognormal:0.8:0.5"),
+                error_rates={ProviderError.UNAVAILABLE: error_rate} if error_rate else None
+            ))
+    return providers
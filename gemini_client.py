@@ -1,27 +1,354 @@
 import os
 import base64
-from typing import Optional, Dict, Any
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, Iterator
 from dotenv import load_dotenv
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from google.ai import generativelanguage as glm
+from google.generativeai.types import content_types, generation_types
 from PIL import Image
 import json
 
+from llm_providers import LLMProvider, ProviderError, ProviderPool, ProviderRequest
+from model_router import ModelRouter, create_model_router
+from request_hedger import RequestHedger, create_request_hedger
+from openai_client import OpenAICompatibleProvider
+from fake_gemini import fake_providers_from_env
+from profiling import timed
+import tracing
+from tracing import traced
+
 # Load environment variables
 load_dotenv()
 
+class ImageHandleCache:
+    """
+    Remember images uploaded to the Gemini File API so each is uploaded once.
+    
+    Files whose reference is evicted, expired or invalidated are deleted
+    from the File API in the background rather than left to its 48 hour
+    expiry.
+    """
+    
+    def __init__(self, max_entries: int = 128, expiry_margin: timedelta = timedelta(minutes=5)):
+        """
+        Initialize an empty cache.
+        
+        Args:
+            max_entries (int): Maximum number of file references to keep
+            expiry_margin (timedelta): Treat references as expired this long before the server does
+        """
+        self.max_entries = max_entries
+        self.expiry_margin = expiry_margin
+        self._handles = OrderedDict()  # key -> (file reference, expires_at)
+        self._lock = threading.Lock()
+    
+    def _key(self, image_path: str) -> tuple:
+        """Identify an image by path, modification time and size."""
+        stat = os.stat(image_path)
+        return (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+    
+    def get(self, image_path: str):
+        """
+        Look up the file reference for an image.
+        
+        Args:
+            image_path (str): Path to the image file
+            
+        Returns:
+            Tuple of (file reference or None, expired flag). Expired entries
+            are dropped so the next call uploads the image again.
+        """
+        key = self._key(image_path)
+        with self._lock:
+            entry = self._handles.get(key)
+            if entry is None:
+                return None, False
+            
+            file_ref, expires_at = entry
+            if datetime.now(timezone.utc) + self.expiry_margin >= expires_at:
+                del self._handles[key]
+                self._delete([file_ref])
+                return None, True
+            
+            self._handles.move_to_end(key)
+            return file_ref, False
+    
+    def upload(self, image_path: str):
+        """
+        Upload an image to the File API and cache the returned reference.
+        
+        Args:
+            image_path (str): Path to the image file
+            
+        Returns:
+            The uploaded file reference
+        """
+        key = self._key(image_path)
+        file_ref = genai.upload_file(image_path)
+        
+        expires_at = getattr(file_ref, 'expiration_time', None)
+        if not expires_at:
+            # Uploaded files are kept for 48 hours
+            expires_at = datetime.now(timezone.utc) + timedelta(hours=47)
+        elif expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        
+        evicted = []
+        with self._lock:
+            previous = self._handles.pop(key, None)
+            if previous is not None:
+                evicted.append(previous[0])
+            self._handles[key] = (file_ref, expires_at)
+            while len(self._handles) > self.max_entries:
+                evicted.append(self._handles.popitem(last=False)[1][0])
+        self._delete(evicted)
+        
+        return file_ref
+    
+    def invalidate(self, image_path: str):
+        """Forget the cached reference for an image."""
+        try:
+            key = self._key(image_path)
+        except OSError:
+            return
+        with self._lock:
+            entry = self._handles.pop(key, None)
+        if entry is not None:
+            self._delete([entry[0]])
+    
+    def clear(self):
+        """Forget all cached references."""
+        with self._lock:
+            file_refs = [file_ref for file_ref, _ in self._handles.values()]
+            self._handles.clear()
+        self._delete(file_refs)
+    
+    @staticmethod
+    def _delete(file_refs: list):
+        """Delete uploaded files off the request path; failures only mean the server expires them later."""
+        if not file_refs:
+            return
+        
+        def delete_all():
+            for file_ref in file_refs:
+                try:
+                    genai.delete_file(file_ref.name)
+                except google_exceptions.NotFound:
+                    pass
+                except Exception as e:
+                    print(f"Could not delete uploaded image {file_ref.name}: {e}")
+        
+        threading.Thread(target=delete_all, name="image-cache-delete", daemon=True).start()
+
+def classify_google_error(error: Exception, provider: str = None) -> ProviderError:
+    """Map a Gemini API exception to a ProviderError kind."""
+    if isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+        kind = ProviderError.QUOTA
+    elif isinstance(error, (google_exceptions.Unauthenticated, google_exceptions.PermissionDenied)):
+        kind = ProviderError.AUTH
+    elif isinstance(error, (google_exceptions.ServiceUnavailable, google_exceptions.InternalServerError,
+                            google_exceptions.DeadlineExceeded, google_exceptions.BadGateway,
+                            google_exceptions.GatewayTimeout, ConnectionError, TimeoutError)):
+        kind = ProviderError.UNAVAILABLE
+    else:
+        # Invalid arguments, blocked prompts (response.text raises ValueError), ...
+        kind = ProviderError.INVALID
+    return ProviderError(str(error), kind=kind, provider=provider)
+
+class GeminiProvider(LLMProvider):
+    """A Gemini model reached with one API key."""
+    
+    def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash", name: str = None, tier: int = 0,
+                 use_file_api: bool = False, image_cache: "ImageHandleCache" = None):
+        """
+        Initialize the provider.
+        
+        Args:
+            api_key (str): Gemini API key
+            model_name (str): Gemini model to use
+            name (str, optional): Unique provider name (defaults to model plus the key's last characters)
+            tier (int): Routing preference (see LLMProvider)
+            use_file_api (bool): Upload images once and reuse the reference. Uploads go
+                through genai's process-wide key, so only enable this on the provider
+                whose key was passed to genai.configure.
+            image_cache (ImageHandleCache, optional): Cache shared with the key's other models
+        """
+        super().__init__(name or f"{model_name}/...{api_key[-4:]}", model_name, tier)
+        self.model_path = f"models/{model_name}"
+        # genai.configure only sets a process-wide default key, so each provider calls its own client
+        self.client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+        
+        # Upload each image once and reuse the file reference for follow-up questions
+        self.use_file_api = use_file_api
+        self.image_cache = image_cache or ImageHandleCache()
+    
+    def _get_image_reference(self, image_path: str):
+        """
+        Get a File API reference for an image, uploading it on first use.
+        
+        Returns:
+            The file reference, or None if the image should be sent inline
+        """
+        if not self.use_file_api:
+            return None
+        
+        file_ref, expired = self.image_cache.get(image_path)
+        tracing.set_attributes(image_cache="hit" if file_ref is not None else "expired" if expired else "miss")
+        if file_ref is not None:
+            return file_ref
+        
+        # First use, or the old reference expired: upload now so this and later turns can use it
+        try:
+            return self.image_cache.upload(image_path)
+        except Exception as e:
+            print(f"Image upload failed, sending inline instead: {e}")
+            return None
+    
+    def _load_image(self, image_path: str) -> Image.Image:
+        try:
+            image = Image.open(image_path)
+            # Convert to RGB if necessary
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            return image
+        except Exception as img_error:
+            raise ProviderError(f"Failed to load image: {img_error}", kind=ProviderError.INVALID, provider=self.name)
+    
+    def _call(self, contents, generation_config: genai.types.GenerationConfig, stream: bool):
+        """Send a generate request with this provider's client, wrapped like GenerativeModel's responses."""
+        api_request = genai.protos.GenerateContentRequest(
+            model=self.model_path,
+            contents=content_types.to_contents(contents),
+            generation_config=generation_types.to_generation_config_dict(generation_config),
+        )
+        if api_request.contents and not api_request.contents[-1].role:
+            api_request.contents[-1].role = "user"
+        
+        if stream:
+            chunks = iter(self.client.stream_generate_content(api_request))
+            # Read the first chunk here, so a rejected image reference is raised to
+            # _generate_content's fallback rather than later, while the caller iterates
+            first = next(chunks)
+            return generation_types.GenerateContentResponse.from_iterator(itertools.chain([first], chunks))
+        return generation_types.GenerateContentResponse.from_response(self.client.generate_content(api_request))
+    
+    def _generate_content(self, request: ProviderRequest, stream: bool):
+        generation_config = genai.types.GenerationConfig(**request.config)
+        if not request.image_path:
+            return self._call(request.prompt, generation_config, stream)
+        
+        # Follow-up questions about the same image only send the file reference
+        image_ref = self._get_image_reference(request.image_path)
+        if image_ref is not None:
+            try:
+                return self._call([request.prompt, image_ref], generation_config, stream)
+            except (google_exceptions.NotFound, google_exceptions.PermissionDenied) as ref_error:
+                # Reference expired or was deleted server-side, fall back to inline bytes
+                # (streamed calls are covered too: _call reads their first chunk)
+                print(f"Cached image reference rejected, sending inline: {ref_error}")
+                self.image_cache.invalidate(request.image_path)
+        
+        return self._call([request.prompt, self._load_image(request.image_path)], generation_config, stream)
+    
+    def generate(self, request: ProviderRequest) -> str:
+        try:
+            return self._generate_content(request, stream=False).text
+        except ProviderError:
+            raise
+        except Exception as e:
+            raise classify_google_error(e, self.name)
+    
+    def stream(self, request: ProviderRequest) -> Iterator[str]:
+        try:
+            for chunk in self._generate_content(request, stream=True):
+                if request.cancel.is_set():
+                    raise ProviderError("Request cancelled", kind=ProviderError.CANCELLED, provider=self.name)
+                if chunk.text:
+                    yield chunk.text
+        except ProviderError:
+            raise
+        except Exception as e:
+            raise classify_google_error(e, self.name)
+
+def split_keys(value: Optional[str]) -> list:
+    """Split a comma-separated list of API keys from the environment."""
+    return [key.strip() for key in (value or "").split(",") if key.strip()]
+
+def providers_from_env(models: list = None) -> list:
+    """
+    Build the provider list from environment variables.
+    
+    GEMINI_API_KEY / GEMINI_API_KEYS (comma-separated) give one Gemini provider per
+    key and model, used round-robin. OPENAI_API_KEY(S), with optional OPENAI_BASE_URL
+    and OPENAI_MODEL, add an OpenAI-compatible endpoint that is only used as a
+    fallback when every Gemini key is failing.
+    
+    GEMINI_BACKEND=fake replaces all of them with local fake providers
+    (see fake_gemini.py) for load tests without a key or network.
+    
+    Args:
+        models (list, optional): Gemini models to serve (defaults to gemini-2.5-flash)
+    """
+    if os.getenv("GEMINI_BACKEND", "").lower() == "fake":
+        return fake_providers_from_env(models)
+    
+    gemini_keys = split_keys(os.getenv("GEMINI_API_KEYS")) or split_keys(os.getenv("GEMINI_API_KEY"))
+    providers = []
+    for i, key in enumerate(gemini_keys):
+        # The first key is the process-wide default, so it can use the File API
+        image_cache = ImageHandleCache()
+        for model_name in models or ["gemini-2.5-flash"]:
+            providers.append(GeminiProvider(key, model_name, use_file_api=(i == 0), image_cache=image_cache))
+    
+    openai_keys = split_keys(os.getenv("OPENAI_API_KEYS")) or split_keys(os.getenv("OPENAI_API_KEY"))
+    for key in openai_keys:
+        provider = OpenAICompatibleProvider(
+            key,
+            base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+            model_name=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+            tier=1
+        )
+        provider.name = f"{provider.name}/...{key[-4:]}"
+        providers.append(provider)
+    return providers
+
 class GeminiClient:
-    def __init__(self):
-        """Initialize Gemini client with API key from environment variables."""
-        self.api_key = os.getenv("GEMINI_API_KEY")
-        if not self.api_key:
-            raise ValueError("Gemini API key not found in environment variables")
+    def __init__(self, providers: list = None, router: ModelRouter = None, hedger: RequestHedger = None):
+        """
+        Initialize Gemini client with API keys from environment variables.
+        
+        Args:
+            providers (list or ProviderPool, optional): LLMProvider instances to use
+                instead of the environment's keys (e.g. FakeProviders in tests), or a
+                pool shared with other clients
+            router (ModelRouter, optional): Picks a model per request; built from the
+                environment when providers also are, otherwise any provider is used
+            hedger (RequestHedger, optional): Races a second copy of slow calls; off unless
+                given or GEMINI_HEDGING=on
+        """
+        # The first Gemini key is the process-wide default (file uploads, model listing)
+        gemini_keys = split_keys(os.getenv("GEMINI_API_KEYS")) or split_keys(os.getenv("GEMINI_API_KEY"))
+        self.api_key = gemini_keys[0] if gemini_keys else None
+        if self.api_key:
+            genai.configure(api_key=self.api_key)
         
-        # Configure Gemini
-        genai.configure(api_key=self.api_key)
+        if providers is None:
+            router = router or create_model_router()
+            providers = providers_from_env(router.models() if router else None)
+            if not providers:
+                raise ValueError("Gemini API key not found in environment variables")
         
-        # Initialize models (using latest available models)
-        self.text_model = genai.GenerativeModel('gemini-2.5-flash')
-        self.vision_model = genai.GenerativeModel('gemini-2.5-flash')
+        # Requests are spread across keys and fail over between them
+        self.providers = providers if isinstance(providers, ProviderPool) else ProviderPool(providers)
+        self.router = router
+        self.hedger = hedger if hedger is not None else create_request_hedger()
         
         # Default parameters
         self.generation_config = genai.types.GenerationConfig(
@@ -31,6 +358,76 @@ class GeminiClient:
             top_k=40
         )
     
+    def _request(self, prompt: str, image_path: str = None) -> ProviderRequest:
+        """Build a provider request with the current generation settings."""
+        config = {
+            name: getattr(self.generation_config, name)
+            for name in ("temperature", "max_output_tokens", "top_p", "top_k")
+            if getattr(self.generation_config, name, None) is not None
+        }
+        return ProviderRequest(prompt, image_path=image_path, config=config)
+    
+    def _choose_model(self, message: str, image_path: str = None, depth: int = 0) -> Optional[str]:
+        """Model the router picks for a request (None lets the pool use any provider)."""
+        if self.router is None:
+            return None
+        return self.router.choose(message, image_path=image_path, depth=depth)
+    
+    def _record(self, model: Optional[str], start: float, error: Exception = None):
+        """Feed a call's latency or failure back to the router."""
+        if self.router is None or model is None:
+            return
+        if isinstance(error, ProviderError) and not error.failover:
+            return  # The request was bad, not the model
+        self.router.record(model, time.monotonic() - start, ok=error is None)
+    
+    @timed("gemini.model_call")
+    @traced("llm.generate")
+    def _generate(self, prompt: str, image_path: str = None, message: str = None, depth: int = 0):
+        """
+        Run a prompt on the routed model.
+        
+        Args:
+            prompt (str): Full prompt sent to the model
+            image_path (str, optional): Attached image
+            message (str, optional): The user's own message, used for routing (defaults to prompt)
+            depth (int): Messages of conversation history behind the prompt
+            
+        Returns:
+            Tuple of (response text, provider that answered)
+        """
+        model = self._choose_model(message if message is not None else prompt, image_path, depth)
+        request = self._request(prompt, image_path)
+        tracing.set_attributes(routed_model=model, depth=depth, prompt_chars=len(prompt),
+                               image_bytes=os.path.getsize(image_path) if image_path else None)
+        
+        def attempt():
+            # Each attempt gets its own cancel flag, so the hedger can stop the loser
+            attempt_request = request.copy()
+            return attempt_request, lambda: self.providers.generate(attempt_request, model=model)
+        
+        start = time.monotonic()
+        try:
+            if self.hedger is None:
+                text, provider = self.providers.generate(request, model=model)
+            else:
+                text, provider = self.hedger.run(
+                    model or "default", attempt, cancel=lambda attempt_request: attempt_request.cancel.set()
+                )
+        except Exception as e:
+            self._record(model, start, e)
+            raise
+        if model is not None and provider.model_name != model:
+            # Every provider of the chosen model failed before another model answered
+            self._record(model, start, ProviderError("failed over", provider=provider.name))
+        self._record(provider.model_name, start)
+        # Same word-count approximation as the usage in result dicts
+        tracing.set_attributes(model=provider.model_name, provider=provider.name,
+                               prompt_tokens=len(prompt.split()), completion_tokens=len(text.split()) if text else 0)
+        tracing.set_content(prompt=prompt, response=text)
+        return text, provider
+    
+    @timed("gemini.get_text_response")
     def get_text_response(self, user_message: str, system_message: str = None) -> Dict[str, Any]:
         """
         Get a response from Gemini for text-based queries.
@@ -49,20 +446,17 @@ class GeminiClient:
             else:
                 full_message = user_message
             
-            response = self.text_model.generate_content(
-                full_message,
-                generation_config=self.generation_config
-            )
+            text, provider = self._generate(full_message, message=user_message)
             
             return {
                 "success": True,
-                "response": response.text,
+                "response": text,
                 "usage": {
                     "prompt_tokens": len(full_message.split()),  # Approximation
-                    "completion_tokens": len(response.text.split()) if response.text else 0,
-                    "total_tokens": len(full_message.split()) + (len(response.text.split()) if response.text else 0)
+                    "completion_tokens": len(text.split()) if text else 0,
+                    "total_tokens": len(full_message.split()) + (len(text.split()) if text else 0)
                 },
-                "model": "gemini-2.5-flash",
+                "model": provider.model_name,
                 "error": None
             }
             
@@ -75,6 +469,7 @@ class GeminiClient:
                 "error": str(e)
             }
     
+    @timed("gemini.analyze_image")
     def analyze_image(self, image_path: str, user_question: str = "What do you see in this image?") -> Dict[str, Any]:
         """
         Analyze an image using Gemini Pro Vision.
@@ -97,36 +492,17 @@ class GeminiClient:
                     "error": "File not found"
                 }
             
-            # Open image using PIL
-            try:
-                image = Image.open(image_path)
-                # Convert to RGB if necessary
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-            except Exception as img_error:
-                return {
-                    "success": False,
-                    "response": f"Failed to load image: {str(img_error)}",
-                    "usage": None,
-                    "model": None,
-                    "error": str(img_error)
-                }
-            
-            # Generate content with image and text
-            response = self.vision_model.generate_content(
-                [user_question, image],
-                generation_config=self.generation_config
-            )
+            text, provider = self._generate(user_question, image_path=image_path)
             
             return {
                 "success": True,
-                "response": response.text,
+                "response": text,
                 "usage": {
                     "prompt_tokens": len(user_question.split()),  # Approximation
-                    "completion_tokens": len(response.text.split()) if response.text else 0,
-                    "total_tokens": len(user_question.split()) + (len(response.text.split()) if response.text else 0)
+                    "completion_tokens": len(text.split()) if text else 0,
+                    "total_tokens": len(user_question.split()) + (len(text.split()) if text else 0)
                 },
-                "model": "gemini-2.5-flash",
+                "model": provider.model_name,
                 "error": None
             }
             
@@ -139,6 +515,182 @@ class GeminiClient:
                 "error": str(e)
             }
     
+    @timed("gemini.analyze_images_batch")
+    def analyze_images_batch(self, image_paths: list, user_question: str = "What do you see in this image?",
+                             image_processor=None, max_concurrent_requests: int = 4,
+                             max_preprocess_workers: int = None, submit=None) -> Iterator[Dict[str, Any]]:
+        """
+        Analyze many images, streaming results back as each one finishes.
+        
+        Images are decoded and resized in a process pool while already
+        prepared images are sent to Gemini concurrently, so preprocessing
+        overlaps with the API calls. Prepared copies are deleted once their
+        analysis is done; the original files are left to the caller.
+        
+        Args:
+            image_paths (list): Paths to the image files
+            user_question (str): Question to ask about every image
+            image_processor (ImageProcessor, optional): Processor used for preprocessing
+            max_concurrent_requests (int): Maximum number of Gemini calls in flight
+            max_preprocess_workers (int, optional): Number of preprocessing processes
+            submit (callable, optional): Runs the Gemini calls instead of a private
+                thread pool, with the signature of Executor.submit (e.g. a
+                RequestScheduler.submit bound to a session and priority)
+            
+        Yields:
+            Dict containing the analysis result for one image, plus its
+            'index' and 'image_path', in order of completion
+        """
+        if image_processor is None:
+            from image_utils import ImageProcessor
+            image_processor = ImageProcessor()
+        
+        prepared_copies = []
+        
+        def remove_prepared(item):
+            if item['prepared_path'] != item['image_path']:
+                try:
+                    os.remove(item['prepared_path'])
+                except FileNotFoundError:
+                    pass
+        
+        def analyze_prepared(item):
+            try:
+                result = self.analyze_image(item['prepared_path'], user_question)
+            finally:
+                remove_prepared(item)
+            result['index'] = item['index']
+            result['image_path'] = item['image_path']
+            return result
+        
+        def failed(item, error):
+            return {
+                "success": False,
+                "response": f"Failed to analyze image: {error}",
+                "usage": None,
+                "model": None,
+                "error": str(error),
+                "index": item['index'],
+                "image_path": item['image_path']
+            }
+        
+        def collect(future):
+            try:
+                return future.result()
+            except Exception as e:
+                # e.g. rejected by the scheduler after waiting too long
+                return failed(pending[future], e)
+        
+        api_pool = None
+        if submit is None:
+            api_pool = ThreadPoolExecutor(max_workers=max(1, max_concurrent_requests))
+            submit = api_pool.submit
+        
+        try:
+            pending = {}  # future -> prepared item
+            
+            for item in image_processor.prepare_batch(image_paths, max_workers=max_preprocess_workers):
+                if item['error']:
+                    yield {
+                        "success": False,
+                        "response": f"Failed to prepare image: {item['error']}",
+                        "usage": None,
+                        "model": None,
+                        "error": item['error'],
+                        "index": item['index'],
+                        "image_path": item['image_path']
+                    }
+                else:
+                    prepared_copies.append(item)
+                    pending[submit(analyze_prepared, item)] = item
+                
+                # Hand back any analyses that finished while we were preprocessing
+                finished = [future for future in pending if future.done()]
+                for future in finished:
+                    yield collect(future)
+                    del pending[future]
+            
+            for future in as_completed(list(pending)):
+                yield collect(future)
+        finally:
+            if api_pool is not None:
+                api_pool.shutdown(wait=False, cancel_futures=True)
+            # Copies whose analysis was rejected, cancelled or never collected
+            for item in prepared_copies:
+                remove_prepared(item)
+    
+    def build_conversation_context(self, conversation_history: list, new_message: str) -> str:
+        """
+        Build the prompt for a message in the context of a conversation.
+        
+        Args:
+            conversation_history (list): List of previous messages
+            new_message (str): New user message
+            
+        Returns:
+            str: Prompt text
+        """
+        # Build conversation context
+        context = "You are a helpful AI assistant. Here's our conversation history:\n\n"
+        
+        # Add conversation history (limit to last 10 exchanges to avoid token limits)
+        for i, msg in enumerate(conversation_history[-20:]):  # Last 20 messages
+            if msg["role"] == "user":
+                context += f"User: {msg['content']}\n"
+            elif msg["role"] == "assistant":
+                context += f"Assistant: {msg['content']}\n"
+        
+        # Add current message
+        context += f"\nNow respond to: {new_message}"
+        return context
+    
+    def stream_text_response(self, user_message: str, conversation_history: list = None,
+                             cancel: threading.Event = None) -> Iterator[str]:
+        """
+        Stream a text response as it is generated.
+        
+        Args:
+            user_message (str): The user's message/query
+            conversation_history (list, optional): Previous messages to answer in context of
+            cancel (threading.Event, optional): Set to stop the stream; the provider gives up between chunks
+            
+        Yields:
+            str: Chunks of response text
+            
+        Raises:
+            Exception: Any API error, so the caller can report it mid-stream
+        """
+        if conversation_history:
+            prompt = self.build_conversation_context(conversation_history, user_message)
+        else:
+            prompt = user_message
+        
+        model = self._choose_model(user_message, depth=len(conversation_history or []))
+        # Not made current: a generator cannot hold the context across yields
+        span = tracing.start_span("llm.stream", routed_model=model, depth=len(conversation_history or []),
+                                  prompt_chars=len(prompt), prompt_tokens=len(prompt.split()))
+        start = time.monotonic()
+        chunks = 0
+        request = self._request(prompt)
+        if cancel is not None:
+            request.cancel = cancel
+        try:
+            for chunk in self.providers.stream(request, model=model):
+                if not chunks:
+                    span.set(first_chunk_ms=round((time.monotonic() - start) * 1000, 1))
+                chunks += 1
+                yield chunk
+        except GeneratorExit:
+            span.end(status="cancelled", chunks=chunks)
+            raise
+        except Exception as e:
+            self._record(model, start, e)
+            span.end(error=str(e), chunks=chunks)
+            raise
+        self._record(model, start)
+        span.end(chunks=chunks)
+    
+    @timed("gemini.get_conversation_response")
     def get_conversation_response(self, conversation_history: list, new_message: str) -> Dict[str, Any]:
         """
         Get response considering conversation history.
@@ -151,33 +703,19 @@ class GeminiClient:
             Dict containing response and metadata
         """
         try:
-            # Build conversation context
-            context = "You are a helpful AI assistant. Here's our conversation history:\n\n"
-            
-            # Add conversation history (limit to last 10 exchanges to avoid token limits)
-            for i, msg in enumerate(conversation_history[-20:]):  # Last 20 messages
-                if msg["role"] == "user":
-                    context += f"User: {msg['content']}\n"
-                elif msg["role"] == "assistant":
-                    context += f"Assistant: {msg['content']}\n"
-            
-            # Add current message
-            context += f"\nNow respond to: {new_message}"
+            context = self.build_conversation_context(conversation_history, new_message)
             
-            response = self.text_model.generate_content(
-                context,
-                generation_config=self.generation_config
-            )
+            text, provider = self._generate(context, message=new_message, depth=len(conversation_history))
             
             return {
                 "success": True,
-                "response": response.text,
+                "response": text,
                 "usage": {
                     "prompt_tokens": len(context.split()),
-                    "completion_tokens": len(response.text.split()) if response.text else 0,
-                    "total_tokens": len(context.split()) + (len(response.text.split()) if response.text else 0)
+                    "completion_tokens": len(text.split()) if text else 0,
+                    "total_tokens": len(context.split()) + (len(text.split()) if text else 0)
                 },
-                "model": "gemini-2.5-flash",
+                "model": provider.model_name,
                 "error": None
             }
             
@@ -226,10 +764,14 @@ class GeminiClient:
     def get_model_info(self) -> Dict[str, Any]:
         """Get information about the current models."""
         try:
+            models = ", ".join(self.router.models() if self.router else self.providers.models())
             return {
-                "text_model": "gemini-2.5-flash",
-                "vision_model": "gemini-2.5-flash",
+                "text_model": models,
+                "vision_model": models,
                 "provider": "Google AI",
+                "providers": self.providers.status(),
+                "routing": self.router.metrics() if self.router else None,
+                "hedging": self.hedger.metrics() if self.hedger else None,
                 "api_version": "v1",
                 "features": ["text_generation", "image_analysis", "conversation"],
                 "generation_config": {
@@ -1,19 +1,31 @@
 import cv2
 import os
+import shutil
 import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
 from PIL import Image, ImageTk
 import numpy as np
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Iterator
 import tkinter as tk
 from datetime import datetime
 
+import profiling
+from profiling import timed
+import tracing
+from tracing import traced
+
 class ImageProcessor:
     def __init__(self):
         """Initialize image processor with default settings."""
         self.supported_formats = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tiff']
         self.max_image_size = (1024, 1024)  # Max size for processing
         self.temp_dir = tempfile.gettempdir()
+        self.max_batch_workers = os.cpu_count() or 1
+        self.max_image_pixels = 100_000_000  # Reject larger images (decompression bomb guard)
+        self.upload_chunk_size = 1024 * 1024  # Bytes copied per write when saving uploads
     
+    @timed("image.capture_from_camera")
     def capture_from_camera(self, save_path: str = None) -> Optional[str]:
         """
         Capture image from default camera.
@@ -73,6 +85,7 @@ class ImageProcessor:
             print(f"Error capturing image: {e}")
             return None
     
+    @traced("image.capture")
     def capture_from_camera_headless(self, save_path: str = None) -> Optional[str]:
         """
         Capture image from camera without GUI (for web apps).
@@ -120,6 +133,7 @@ class ImageProcessor:
             print(f"Error capturing image: {e}")
             return None
     
+    @timed("image.validate_image")
     def validate_image(self, image_path: str) -> bool:
         """
         Validate if the file is a supported image format.
@@ -195,6 +209,7 @@ class ImageProcessor:
             print(f"Error converting image: {e}")
             return image_path
     
+    @timed("image.create_thumbnail")
     def create_thumbnail(self, image_path: str, size: Tuple[int, int] = (150, 150)) -> str:
         """
         Create a thumbnail of the image.
@@ -221,6 +236,7 @@ class ImageProcessor:
             print(f"Error creating thumbnail: {e}")
             return image_path
     
+    @timed("image.get_image_info")
     def get_image_info(self, image_path: str) -> dict:
         """
         Get information about the image.
@@ -247,6 +263,75 @@ class ImageProcessor:
             print(f"Error getting image info: {e}")
             return {}
     
+    @timed("image.save_upload")
+    @traced("image.upload")
+    def save_upload(self, file_obj, suffix: str = ".png") -> str:
+        """
+        Save an uploaded file to a temporary file in fixed-size chunks.
+        
+        Args:
+            file_obj: Readable binary file-like object (e.g. a Streamlit upload)
+            suffix (str): File extension for the temporary file
+            
+        Returns:
+            str: Path to the saved file
+        """
+        if hasattr(file_obj, 'seek'):
+            file_obj.seek(0)
+        
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=self.temp_dir) as tmp_file:
+            shutil.copyfileobj(file_obj, tmp_file, length=self.upload_chunk_size)
+            tracing.set_attributes(bytes=tmp_file.tell())
+            return tmp_file.name
+    
+    def check_pixel_count(self, img: Image.Image):
+        """
+        Guard against decompression bombs before any pixel data is decoded.
+        
+        Args:
+            img (Image.Image): Lazily opened image
+            
+        Raises:
+            ValueError: If the image has more pixels than max_image_pixels
+        """
+        pixels = img.width * img.height
+        if pixels > self.max_image_pixels:
+            raise ValueError(
+                f"Image too large: {img.width}×{img.height} pixels "
+                f"(limit is {self.max_image_pixels:,} pixels)"
+            )
+    
+    @timed("image.open_reduced")
+    def open_reduced(self, image_path: str, max_size: Tuple[int, int] = None) -> Image.Image:
+        """
+        Load an RGB image already reduced to fit within max_size.
+        
+        JPEGs are decoded at a reduced scale, so peak memory follows the
+        target size rather than the source size.
+        
+        Args:
+            image_path (str): Path to the image
+            max_size (tuple, optional): Maximum (width, height)
+            
+        Returns:
+            Image.Image: Loaded, reduced RGB image
+        """
+        if not max_size:
+            max_size = self.max_image_size
+        
+        with Image.open(image_path) as img:
+            self.check_pixel_count(img)
+            
+            # Let the decoder downscale (JPEG DCT scaling) instead of decoding full size
+            img.draft('RGB', max_size)
+            img.thumbnail(max_size, Image.Resampling.LANCZOS)
+            
+            if img.mode != 'RGB':
+                return img.convert('RGB')
+            return img.copy()
+    
+    @timed("image.prepare_for_ai_analysis")
+    @traced("image.preprocess")
     def prepare_for_ai_analysis(self, image_path: str) -> str:
         """
         Prepare image for AI analysis by optimizing size and format.
@@ -260,15 +345,80 @@ class ImageProcessor:
         if not self.validate_image(image_path):
             raise ValueError("Invalid image file")
         
-        # Convert to RGB if needed
-        rgb_path = self.convert_to_rgb(image_path)
+        with Image.open(image_path) as img:
+            self.check_pixel_count(img)
+            tracing.set_attributes(bytes_in=os.path.getsize(image_path), width=img.width, height=img.height,
+                                   format=img.format)
+            
+            # Already suitable, nothing to decode or write
+            if img.mode == 'RGB' and img.width <= self.max_image_size[0] and img.height <= self.max_image_size[1]:
+                tracing.set_attributes(passthrough=True)
+                return image_path
+        
+        prepared = self.open_reduced(image_path)
         
-        # Resize if too large
-        info = self.get_image_info(rgb_path)
-        if info.get('width', 0) > self.max_image_size[0] or info.get('height', 0) > self.max_image_size[1]:
-            rgb_path = self.resize_image(rgb_path)
+        filename, _ = os.path.splitext(image_path)
+        output_path = f"{filename}_prepared.jpg"
+        prepared.save(output_path, 'JPEG', quality=95)
+        tracing.set_attributes(passthrough=False, bytes_out=os.path.getsize(output_path))
         
-        return rgb_path
+        return output_path
+    
+    def prepare_batch(self, image_paths: list, max_workers: int = None) -> Iterator[dict]:
+        """
+        Prepare many images for AI analysis using a pool of worker processes.
+        
+        Decoding and resizing are CPU-bound, so each image is handled in its
+        own process to use all available cores.
+        
+        Args:
+            image_paths (list): Paths to the original images
+            max_workers (int, optional): Number of worker processes
+            
+        Yields:
+            dict: Result for each image in order of completion, with keys
+                'index', 'image_path', 'prepared_path' and 'error'; when
+                'prepared_path' differs from 'image_path' it is a new file
+                the caller should delete when done with it
+        """
+        if not image_paths:
+            return
+        
+        workers = max(1, min(max_workers or self.max_batch_workers, len(image_paths)))
+        trace_parent = tracing.context()
+        session = profiling.current_session()
+        
+        executor = ProcessPoolExecutor(max_workers=workers)
+        futures = {
+            executor.submit(_prepare_image_worker, self, path, trace_parent): (index, path)
+            for index, path in enumerate(image_paths)
+        }
+        try:
+            for future in as_completed(list(futures)):
+                index, path = futures.pop(future)
+                try:
+                    prepared_path, spans, steps = future.result()
+                    error = None
+                except Exception as e:
+                    prepared_path = None
+                    error = str(e)
+                else:
+                    # The worker's exporter and activity log never run, so report its timings here
+                    tracing.export(spans)
+                    if steps is not None:
+                        profiling.record_activity(steps, session)
+                
+                yield {
+                    'index': index,
+                    'image_path': path,
+                    'prepared_path': prepared_path,
+                    'error': error
+                }
+        finally:
+            # Closed early: don't wait for the rest, and delete what they still write
+            executor.shutdown(wait=False, cancel_futures=True)
+            for future, (_, path) in futures.items():
+                future.add_done_callback(partial(_discard_prepared, path))
     
     def cleanup_temp_files(self, file_paths: list):
         """
@@ -324,6 +474,29 @@ class CameraManager:
         except Exception:
             return False
 
+def _prepare_image_worker(processor: ImageProcessor, image_path: str, trace_parent: tuple = None) -> tuple:
+    """
+    Run prepare_for_ai_analysis inside a worker process.
+    
+    Returns:
+        tuple: Prepared path, the finished trace spans and the step timings
+            (None when profiling is off), for the parent to report
+    """
+    with tracing.collect(trace_parent) as spans, profiling.capture("image.prepare_worker") as recording:
+        prepared_path = processor.prepare_for_ai_analysis(image_path)
+    return prepared_path, spans, recording.to_dict() if recording is not None else None
+
+def _discard_prepared(image_path: str, future):
+    """Delete the prepared copy of a batch image nobody is waiting for any more."""
+    if future.cancelled() or future.exception() is not None:
+        return
+    prepared_path = future.result()[0]
+    if prepared_path != image_path:
+        try:
+            os.remove(prepared_path)
+        except FileNotFoundError:
+            pass
+
 # Utility functions for Tkinter integration
 def pil_to_tkinter(pil_image, size=None):
     """Convert PIL image to Tkinter PhotoImage."""
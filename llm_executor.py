@@ -0,0 +1,226 @@
+import hashlib
+import threading
+import time
+import uuid
+from concurrent.futures import Future, CancelledError
+from typing import Callable, Optional, Any, Dict
+
+from request_scheduler import RequestScheduler, INTERACTIVE
+
+def make_request_key(session_id: str, message_counter: int, content: str, image_path: Optional[str] = None) -> str:
+    """
+    Build an idempotency key for a chat submission.
+
+    The same prompt submitted twice at the same point in the same session
+    (a double-click, or a rerun replaying the Send button) gets the same key.
+
+    Args:
+        session_id (str): Browser session
+        message_counter (int): Id of the last message before this submission
+        content (str): Prompt text
+        image_path (str, optional): Image the prompt is about
+
+    Returns:
+        str: Hex key
+    """
+    content_hash = _content_hash(content, image_path)
+    return hashlib.sha256(f"{session_id}:{message_counter}:{content_hash}".encode("utf-8")).hexdigest()
+
+def make_content_key(query_type: str, content: str, image_path: Optional[str] = None) -> str:
+    """
+    Build the key that in-flight requests are coalesced on.
+
+    Unlike make_request_key this leaves the session out on purpose: model
+    calls only see the prompt and image, not the chat history, so the same
+    question asked in several sessions at once is sent upstream once and
+    every session gets the answer. Uploaded images live at per-session temp
+    paths, so in practice image questions are only shared within a session.
+
+    Args:
+        query_type (str): "text" or "image"
+        content (str): Prompt text
+        image_path (str, optional): Image the prompt is about
+
+    Returns:
+        str: Hex key
+    """
+    return hashlib.sha256(f"{query_type}:{_content_hash(content, image_path)}".encode("utf-8")).hexdigest()
+
+def _content_hash(content: str, image_path: Optional[str]) -> str:
+    return hashlib.sha256(f"{content}\0{image_path or ''}".encode("utf-8")).hexdigest()
+
+class LLMJob:
+    """
+    Handle for a model request running on an LLMExecutor.
+
+    The UI keeps the handle (it is small and safe to store in session state)
+    and polls it instead of blocking on the network call.
+    """
+
+    def __init__(self, future: Future, description: str = "", metadata: Optional[Dict[str, Any]] = None,
+                 key: Optional[str] = None, release: Optional[Callable[["LLMJob"], None]] = None):
+        self.id = uuid.uuid4().hex
+        self.future = future
+        self.key = key
+        self._release = release
+        self.description = description
+        self.metadata = metadata or {}
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self._cancelled = False
+        future.add_done_callback(self._on_done)
+
+    def _on_done(self, future: Future):
+        self.finished_at = time.time()
+
+    def done(self) -> bool:
+        """Whether the job has finished (successfully, with an error, or cancelled)."""
+        return self._cancelled or self.future.done()
+
+    def cancelled(self) -> bool:
+        """Whether cancel() was called."""
+        return self._cancelled
+
+    def cancel(self) -> bool:
+        """
+        Cancel the job.
+
+        A job still waiting in the queue never starts. A job whose request is
+        already on the wire runs to completion on its worker thread, but its
+        result is discarded. A request shared by several jobs is only
+        cancelled once every one of them has been cancelled.
+
+        Returns:
+            bool: True if the job had not already finished
+        """
+        if self.future.done():
+            return False
+        self._cancelled = True
+        if self._release:
+            self._release(self)
+        else:
+            self.future.cancel()
+        return True
+
+    def elapsed(self) -> float:
+        """Seconds since the job was submitted (or until it finished)."""
+        return (self.finished_at or time.time()) - self.submitted_at
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the job's result dict without blocking.
+
+        Returns:
+            dict: The result, an error result if the call raised, or None if the
+            job is still running or was cancelled
+        """
+        if self._cancelled or not self.future.done():
+            return None
+        try:
+            return self.future.result()
+        except CancelledError:
+            return None
+        except Exception as e:
+            return {"success": False, "response": None, "error": str(e)}
+
+class LLMExecutor:
+    """
+    Shared executor for model requests.
+
+    Streamlit script threads submit work here and return immediately, so they
+    are never tied up waiting on the network. Submissions with the same key
+    while one is still in flight share a single upstream call. Requests run
+    through a RequestScheduler, so sessions get a fair share of capacity.
+    """
+
+    def __init__(self, max_workers: int = 8, max_queue_wait: float = 60.0, scheduler: RequestScheduler = None):
+        """
+        Initialize the executor.
+
+        Args:
+            max_workers (int): Maximum number of requests in flight at once
+            max_queue_wait (float): Seconds a request may be queued before it is rejected
+            scheduler (RequestScheduler, optional): Scheduler to share with other callers
+        """
+        self.max_workers = max_workers
+        self.scheduler = scheduler or RequestScheduler(max_concurrent=max_workers, max_queue_wait=max_queue_wait)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._inflight = {}  # key -> [future, number of jobs waiting on it]
+        self.coalesced = 0
+
+    def submit(self, fn: Callable[..., Dict[str, Any]], *args, description: str = "",
+               metadata: Optional[Dict[str, Any]] = None, key: Optional[str] = None,
+               session_id: str = "default", priority: str = INTERACTIVE, **kwargs) -> LLMJob:
+        """
+        Run a model call in the background.
+
+        Args:
+            fn (callable): Function returning a result dict, e.g. GeminiClient.get_text_response
+            *args, **kwargs: Arguments for fn
+            description (str): Short text shown while the job is pending
+            metadata (dict, optional): Caller data needed when the result arrives
+            key (str, optional): Coalescing key (see make_content_key); an
+                in-flight request with the same key, from any session, is
+                joined instead of repeated
+            session_id (str): Session the request is scheduled and accounted under
+            priority (str): INTERACTIVE or BACKGROUND (see request_scheduler)
+
+        Returns:
+            LLMJob: Handle to poll, read and cancel
+        """
+        if key is None:
+            with self._lock:
+                self._active += 1
+            future = self.scheduler.submit(fn, *args, session_id=session_id, priority=priority, **kwargs)
+            future.add_done_callback(self._on_done)
+            return LLMJob(future, description=description, metadata=metadata)
+
+        with self._lock:
+            entry = self._inflight.get(key)
+            joined = entry is not None and not entry[0].done()
+            if joined:
+                entry[1] += 1
+                self.coalesced += 1
+            else:
+                self._active += 1
+                entry = [self.scheduler.submit(fn, *args, session_id=session_id, priority=priority, **kwargs), 1]
+                self._inflight[key] = entry
+
+        # Callbacks run immediately if the call already finished, so add them outside the lock
+        if not joined:
+            entry[0].add_done_callback(self._on_done)
+            entry[0].add_done_callback(lambda future: self._forget(key, future))
+        return LLMJob(entry[0], description=description, metadata=metadata, key=key, release=self._release)
+
+    def _release(self, job: LLMJob):
+        """Drop a cancelled job's claim on a shared request, cancelling it when nobody is left."""
+        with self._lock:
+            entry = self._inflight.get(job.key)
+            if entry is None or entry[0] is not job.future:
+                job.future.cancel()
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self._inflight[job.key]
+        job.future.cancel()
+
+    def _forget(self, key: str, future: Future):
+        with self._lock:
+            entry = self._inflight.get(key)
+            if entry is not None and entry[0] is future:
+                del self._inflight[key]
+
+    def _on_done(self, future: Future):
+        with self._lock:
+            self._active -= 1
+
+    def active_count(self) -> int:
+        """Number of jobs queued or running."""
+        with self._lock:
+            return self._active
+
+    def shutdown(self, wait: bool = False):
+        """Stop accepting work and cancel queued jobs."""
+        self.scheduler.shutdown(wait=wait)
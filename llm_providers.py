@@ -0,0 +1,347 @@
+import itertools
+import threading
+import time
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+
+import tracing
+
+class ProviderError(Exception):
+    """
+    A failed model call, classified so the pool knows whether to fail over.
+
+    kind is one of:
+        QUOTA        rate limit or quota exhausted (try another key, back off this one)
+        UNAVAILABLE  outage, timeout or connection error (try another provider)
+        AUTH         key rejected (try another key, back off this one for longer)
+        INVALID      the request itself is bad (retrying elsewhere won't help)
+        CANCELLED    the caller cancelled the request (see ProviderRequest.cancel)
+    """
+    QUOTA = "quota"
+    UNAVAILABLE = "unavailable"
+    AUTH = "auth"
+    INVALID = "invalid"
+    CANCELLED = "cancelled"
+
+    def __init__(self, message: str, kind: str = UNAVAILABLE, provider: str = None, retry_after: float = None):
+        super().__init__(message)
+        self.kind = kind
+        self.provider = provider
+        self.retry_after = retry_after
+
+    @property
+    def failover(self) -> bool:
+        """Whether another provider might succeed where this one failed."""
+        return self.kind not in (self.INVALID, self.CANCELLED)
+
+class ProviderRequest:
+    """
+    A provider-neutral model request: a prompt, an optional image and sampling settings.
+
+    Setting `cancel` asks the provider to give up; providers check it where
+    their backend allows (between stream chunks, before a retry) and raise
+    a CANCELLED ProviderError.
+    """
+    __slots__ = ("prompt", "image_path", "config", "cancel")
+
+    def __init__(self, prompt: str, image_path: str = None, config: Dict[str, Any] = None):
+        self.prompt = prompt
+        self.image_path = image_path
+        self.config = config or {}
+        self.cancel = threading.Event()
+
+    def copy(self) -> "ProviderRequest":
+        """An identical request with its own cancel flag."""
+        return ProviderRequest(self.prompt, self.image_path, dict(self.config))
+
+class LLMProvider:
+    """
+    One model endpoint with one credential.
+
+    Subclasses implement generate(), and stream() if the backend can stream.
+    They raise ProviderError for failures so ProviderPool can route around them.
+    """
+
+    def __init__(self, name: str, model_name: str, tier: int = 0):
+        """
+        Args:
+            name (str): Unique name, shown in status and errors (never the key itself)
+            model_name (str): Model this provider serves, reported in results
+            tier (int): Preference; higher tiers are only used when every lower tier is unhealthy
+        """
+        self.name = name
+        self.model_name = model_name
+        self.tier = tier
+
+    def generate(self, request: ProviderRequest) -> str:
+        """Return the full response text."""
+        raise NotImplementedError
+
+    def stream(self, request: ProviderRequest) -> Iterator[str]:
+        """Yield response text in chunks (by default, all at once)."""
+        yield self.generate(request)
+
+class FakeProvider(LLMProvider):
+    """
+    Local stand-in provider for tests and load tests; no network or key needed.
+
+    Errors queued in `errors` are raised by successive calls before the
+    provider starts succeeding, e.g. errors=[ProviderError.QUOTA] fails
+    the first call with a quota error. `latency` may be a number of
+    seconds or a callable returning one per call.
+    """
+
+    def __init__(self, name: str = "fake", model_name: str = "fake-model", tier: int = 0, latency: float = 0.0,
+                 response: Callable[[ProviderRequest], str] = None, errors: list = None):
+        super().__init__(name, model_name, tier)
+        self.latency = latency
+        self.response = response or (lambda request: f"[{self.name}] {request.prompt}")
+        self.errors = list(errors or [])
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _next_error(self) -> Optional[ProviderError]:
+        with self._lock:
+            self.calls += 1
+            if not self.errors:
+                return None
+            error = self.errors.pop(0)
+        if isinstance(error, ProviderError):
+            return error
+        return ProviderError(f"Fake {error} error", kind=error, provider=self.name)
+
+    def generate(self, request: ProviderRequest) -> str:
+        error = self._next_error()
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency and request.cancel.wait(latency):
+            raise ProviderError("Request cancelled", kind=ProviderError.CANCELLED, provider=self.name)
+        if error:
+            raise error
+        return self.response(request)
+
+    def stream(self, request: ProviderRequest) -> Iterator[str]:
+        text = self.generate(request)
+        for word in text.split(" "):
+            yield word + " "
+
+class ProviderStats:
+    """Health and latency record for one provider."""
+    __slots__ = ("latency", "in_flight", "successes", "failures", "consecutive_failures",
+                 "cooldown_until", "last_error")
+
+    def __init__(self):
+        self.latency = None  # Exponentially weighted moving average, seconds
+        self.in_flight = 0
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.last_error = None
+
+class ProviderPool:
+    """
+    Routes requests across providers (keys, endpoints, vendors).
+
+    Healthy providers in the lowest tier are tried first. Within a tier,
+    providers whose load (expected latency times requests in flight) is
+    within LOAD_TOLERANCE of the least loaded one share requests
+    round-robin; the rest follow, least loaded first. A provider that fails with a quota, outage
+    or auth error is put in a cooldown and the request fails over to the
+    next candidate; providers in cooldown are only tried as a last resort.
+    """
+
+    LATENCY_SMOOTHING = 0.2
+    # Loads within this fraction of the best count as equal, so latency noise doesn't pin every request to one key
+    LOAD_TOLERANCE = 0.25
+    QUOTA_COOLDOWN = 60.0
+    AUTH_COOLDOWN = 300.0
+    MAX_OUTAGE_COOLDOWN = 60.0
+
+    def __init__(self, providers: List[LLMProvider]):
+        if not providers:
+            raise ValueError("ProviderPool needs at least one provider")
+        names = [provider.name for provider in providers]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Provider names must be unique: {names}")
+
+        self.providers = list(providers)
+        self.stats = {provider.name: ProviderStats() for provider in providers}
+        self._lock = threading.Lock()
+        self._rotation = itertools.count()
+
+    def models(self) -> List[str]:
+        """Models served by at least one provider."""
+        return sorted({provider.model_name for provider in self.providers})
+
+    def candidates(self, model: str = None) -> List[LLMProvider]:
+        """
+        Providers in the order they should be tried for the next request.
+
+        Providers serving `model` come before other healthy providers of the
+        same tier, so a request only moves to another model when every
+        provider of the one it asked for is failing.
+        """
+        providers = self.providers
+        now = time.monotonic()
+        offset = next(self._rotation)
+        with self._lock:
+            scored = []
+            for provider in providers:
+                stats = self.stats[provider.name]
+                cooling = stats.cooldown_until > now
+                group = (cooling, stats.cooldown_until if cooling else 0.0, provider.tier,
+                         model is not None and provider.model_name != model)
+                # Unmeasured providers score 0 so they get tried and measured
+                load = (stats.latency or 0.0) * (stats.in_flight + 1)
+                scored.append((group, load, provider))
+
+        best = {}
+        for group, load, _ in scored:
+            best[group] = min(load, best.get(group, load))
+        # Providers close enough to the best of their group take turns being first
+        equals = {}
+        for group, load, provider in scored:
+            if load <= best[group] * (1 + self.LOAD_TOLERANCE):
+                equals.setdefault(group, []).append(provider)
+
+        def order(entry):
+            group, load, provider = entry
+            members = equals[group]
+            if provider in members:
+                return group, 0.0, (members.index(provider) - offset) % len(members)
+            return group, load, 0
+        return [provider for _, _, provider in sorted(scored, key=order)]
+
+    def _begin(self, provider: LLMProvider):
+        with self._lock:
+            self.stats[provider.name].in_flight += 1
+
+    def _succeeded(self, provider: LLMProvider, elapsed: float):
+        with self._lock:
+            stats = self.stats[provider.name]
+            stats.in_flight -= 1
+            stats.successes += 1
+            stats.consecutive_failures = 0
+            stats.cooldown_until = 0.0
+            if stats.latency is None:
+                stats.latency = elapsed
+            else:
+                stats.latency += self.LATENCY_SMOOTHING * (elapsed - stats.latency)
+
+    def _failed(self, provider: LLMProvider, error: ProviderError):
+        with self._lock:
+            stats = self.stats[provider.name]
+            stats.in_flight -= 1
+            stats.last_error = str(error)
+            if not error.failover:
+                # The request was bad, not the provider
+                return
+            stats.failures += 1
+            stats.consecutive_failures += 1
+            if error.kind == ProviderError.QUOTA:
+                cooldown = error.retry_after or self.QUOTA_COOLDOWN
+            elif error.kind == ProviderError.AUTH:
+                cooldown = self.AUTH_COOLDOWN
+            else:
+                cooldown = min(self.MAX_OUTAGE_COOLDOWN, 2.0 ** (stats.consecutive_failures - 1))
+            stats.cooldown_until = time.monotonic() + cooldown
+
+    @staticmethod
+    def _as_provider_error(error: Exception, provider: LLMProvider) -> ProviderError:
+        if isinstance(error, ProviderError):
+            if error.provider is None:
+                error.provider = provider.name
+            return error
+        return ProviderError(str(error), kind=ProviderError.UNAVAILABLE, provider=provider.name)
+
+    def generate(self, request: ProviderRequest, model: str = None) -> Tuple[str, LLMProvider]:
+        """
+        Run a request, failing over between providers.
+
+        Args:
+            request (ProviderRequest): The request
+            model (str, optional): Preferred model (see candidates)
+
+        Returns:
+            Tuple of (response text, provider that answered)
+
+        Raises:
+            ProviderError: The request is invalid, or every provider failed
+        """
+        last_error = None
+        for provider in self.candidates(model):
+            if request.cancel.is_set():
+                raise ProviderError("Request cancelled", kind=ProviderError.CANCELLED)
+            self._begin(provider)
+            start = time.monotonic()
+            attempt = tracing.start_span("llm.attempt", provider=provider.name, model=provider.model_name)
+            try:
+                with tracing.use_span(attempt):
+                    text = provider.generate(request)
+            except Exception as e:
+                error = self._as_provider_error(e, provider)
+                self._failed(provider, error)
+                attempt.end(error=str(error), error_kind=error.kind,
+                            status="cancelled" if error.kind == ProviderError.CANCELLED else None)
+                if not error.failover:
+                    raise error
+                print(f"Provider {provider.name} failed ({error.kind}), failing over: {error}")
+                last_error = error
+                continue
+            self._succeeded(provider, time.monotonic() - start)
+            attempt.end(output_chars=len(text or ""))
+            return text, provider
+
+        raise last_error
+
+    def stream(self, request: ProviderRequest, model: str = None) -> Iterator[str]:
+        """
+        Stream a request, failing over between providers until the first chunk arrives.
+
+        Once text has been sent, a failure is raised rather than retried, so the
+        caller never sees two partial answers.
+        """
+        last_error = None
+        for provider in self.candidates(model):
+            self._begin(provider)
+            start = time.monotonic()
+            started = False
+            try:
+                for chunk in provider.stream(request):
+                    started = True
+                    yield chunk
+            except GeneratorExit:
+                # The caller stopped reading; the provider itself was fine
+                self._succeeded(provider, time.monotonic() - start)
+                raise
+            except Exception as e:
+                error = self._as_provider_error(e, provider)
+                self._failed(provider, error)
+                if started or not error.failover:
+                    raise error
+                print(f"Provider {provider.name} failed ({error.kind}), failing over: {error}")
+                last_error = error
+                continue
+            self._succeeded(provider, time.monotonic() - start)
+            return
+
+        raise last_error
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Health, latency and counters per provider."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "name": provider.name,
+                    "model": provider.model_name,
+                    "tier": provider.tier,
+                    "healthy": self.stats[provider.name].cooldown_until <= now,
+                    "latency_ms": None if self.stats[provider.name].latency is None
+                    else self.stats[provider.name].latency * 1000,
+                    "in_flight": self.stats[provider.name].in_flight,
+                    "successes": self.stats[provider.name].successes,
+                    "failures": self.stats[provider.name].failures,
+                    "last_error": self.stats[provider.name].last_error,
+                }
+                for provider in self.providers
+            ]
@@ -1,19 +1,44 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import os
-import tempfile
 from datetime import datetime
 import pandas as pd
-from PIL import Image
 import cv2
 import base64
 import threading
 import time
+import uuid
+from functools import partial
 
 # Import our custom modules
 from database import DatabaseManager
-from gemini_client import GeminiClient
+from gemini_client import GeminiClient, providers_from_env
+from llm_providers import ProviderPool
+from model_router import create_model_router
+from request_hedger import create_request_hedger
 from image_utils import ImageProcessor, CameraManager
-from voice_utils import VoiceManager
+from transcript import Transcript
+from session_store import create_session_store, is_valid_session_id
+from llm_executor import LLMExecutor, make_content_key, make_request_key
+from request_scheduler import INTERACTIVE, BACKGROUND
+from voice_utils import (
+    VoiceManager, TTSWorker, AudioCache, SpeechPipeline, ClientClipPlayer, strip_markdown, RECOGNIZER_BACKENDS
+)
+import profiling
+from profiling import timed
+import tracing
+
+# Opt-in timing of this rerun's steps (CHATBOT_PROFILE=1); free when off
+profiling.begin_rerun()
+
+def current_script_session():
+    """Session id of the script run on this thread (None on other threads)."""
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return None
+    return st.session_state.get("session_id")
+
+# Activity and profiles are attributed to the session that caused them
+profiling.session_resolver = current_script_session
 
 # Configure Streamlit page
 st.set_page_config(
@@ -23,12 +48,74 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Number of most recent messages drawn on each rerun; older ones are paged in on request
+CHAT_WINDOW_SIZE = 30
+CHAT_PAGE_SIZE = 30
+
+# Messages kept in memory per session; the full transcript lives in SQLite
+TRANSCRIPT_MEMORY_SIZE = 100
+
+# Where transcripts and UI state live, so any replica can resume a session:
+# "sqlite" (the app database, default), "sqlite:///path/to.db" or "file:///path/to/dir"
+SESSION_STORE_URL = os.getenv("SESSION_STORE")
+
+# Session state saved to the session store (everything else is rebuilt per process).
+# Playback state is left out, so resuming a session doesn't play the last answer again
+PERSISTED_STATE_KEYS = (
+    "current_image_path", "current_upload_id", "auto_read_enabled",
+    "chat_window", "last_request_key"
+)
+
+@st.cache_resource
+def get_session_store():
+    """Session store shared by every session in this server process."""
+    return create_session_store(SESSION_STORE_URL)
+
+# Model requests in flight at once, shared fairly by every session in this server process
+LLM_MAX_WORKERS = 8
+
+# Seconds a request may wait for capacity before it is rejected
+LLM_MAX_QUEUE_WAIT = 60
+
+@st.cache_resource
+def get_model_router():
+    """Model router shared by every session, so it learns from all of their latencies."""
+    return create_model_router()
+
+@st.cache_resource
+def get_request_hedger():
+    """Hedger shared by every session, so the hedging budget is process-wide (None unless enabled)."""
+    return create_request_hedger()
+
+@st.cache_resource
+def get_provider_pool():
+    """Model providers shared by every session, so key health and latency are tracked process-wide."""
+    router = get_model_router()
+    return ProviderPool(providers_from_env(router.models() if router else None))
+
+@st.cache_resource
+def get_llm_executor():
+    """Thread pool that runs model requests off the Streamlit script thread."""
+    return LLMExecutor(max_workers=LLM_MAX_WORKERS, max_queue_wait=LLM_MAX_QUEUE_WAIT)
+
+@st.cache_resource(on_release=lambda worker: worker.shutdown())
+def get_tts_worker():
+    """Speech process shared by every session, since they all play through the server's speakers."""
+    return TTSWorker(rate=200, volume=0.9)
+
+@st.cache_resource
+def get_audio_cache(_render):
+    """Speech audio cache shared by every session, so a repeated answer is synthesised once per process."""
+    return AudioCache(render=_render)
+
 # Initialize session state
 if "db" not in st.session_state:
     st.session_state.db = DatabaseManager()
 
 if "gemini_client" not in st.session_state:
-    st.session_state.gemini_client = GeminiClient()
+    st.session_state.gemini_client = GeminiClient(
+        providers=get_provider_pool(), router=get_model_router(), hedger=get_request_hedger()
+    )
 
 if "image_processor" not in st.session_state:
     st.session_state.image_processor = ImageProcessor()
@@ -39,8 +126,37 @@ if "camera_manager" not in st.session_state:
 if "voice_manager" not in st.session_state:
     st.session_state.voice_manager = VoiceManager()
 
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+if "session_id" not in st.session_state:
+    # ?session=<id> resumes a conversation, on this or any other replica
+    requested_id = st.query_params.get("session")
+    st.session_state.session_id = requested_id if is_valid_session_id(requested_id) else uuid.uuid4().hex
+    st.query_params["session"] = st.session_state.session_id
+    
+    saved_state = get_session_store().load_state(st.session_state.session_id)
+    for key in PERSISTED_STATE_KEYS:
+        if key in saved_state:
+            st.session_state[key] = saved_state[key]
+    st.session_state.persisted_state = saved_state
+    
+    # Files are only usable if this replica can see them
+    if st.session_state.get("current_image_path"):
+        if os.path.exists(st.session_state.current_image_path):
+            st.session_state.current_image = st.session_state.image_processor.open_reduced(
+                st.session_state.current_image_path
+            )
+        else:
+            st.session_state.current_image_path = None
+
+if "transcript" not in st.session_state:
+    st.session_state.transcript = Transcript(
+        get_session_store(), st.session_state.session_id, max_in_memory=TRANSCRIPT_MEMORY_SIZE
+    )
+
+if "chat_window" not in st.session_state:
+    st.session_state.chat_window = CHAT_WINDOW_SIZE
+
+if "message_html_cache" not in st.session_state:
+    st.session_state.message_html_cache = {}
 
 if "current_image" not in st.session_state:
     st.session_state.current_image = None
@@ -48,15 +164,24 @@ if "current_image" not in st.session_state:
 if "current_image_path" not in st.session_state:
     st.session_state.current_image_path = None
 
+if "current_image_info" not in st.session_state:
+    st.session_state.current_image_info = None
+
+if "current_upload_id" not in st.session_state:
+    st.session_state.current_upload_id = None
+
+if "current_image_trace_id" not in st.session_state:
+    st.session_state.current_image_trace_id = None
+
+if "conversation_stats" not in st.session_state:
+    st.session_state.conversation_stats = None
+
 if "voice_enabled" not in st.session_state:
     st.session_state.voice_enabled = False
 
 if "auto_read_enabled" not in st.session_state:
     st.session_state.auto_read_enabled = False
 
-if "message_counter" not in st.session_state:
-    st.session_state.message_counter = 0
-
 if "play_message_id" not in st.session_state:
     st.session_state.play_message_id = None
 
@@ -66,8 +191,36 @@ if "audio_to_play" not in st.session_state:
 if "is_playing_audio" not in st.session_state:
     st.session_state.is_playing_audio = False
 
-if "tts_process" not in st.session_state:
-    st.session_state.tts_process = None
+if "batch_results" not in st.session_state:
+    st.session_state.batch_results = []
+
+if "pending_jobs" not in st.session_state:
+    st.session_state.pending_jobs = []
+
+if "last_request_key" not in st.session_state:
+    st.session_state.last_request_key = None
+
+if "tts_worker" not in st.session_state:
+    st.session_state.tts_worker = get_tts_worker()
+
+if "speech_pipeline" not in st.session_state:
+    st.session_state.speech_pipeline = None
+
+if "speech_player" not in st.session_state:
+    st.session_state.speech_player = None
+
+if "audio_cache" not in st.session_state:
+    # The TTS engine is process-wide, so any session's voice manager renders the same audio
+    st.session_state.audio_cache = get_audio_cache(st.session_state.voice_manager.speak_to_file)
+
+if "rerun_profiles" not in st.session_state:
+    st.session_state.rerun_profiles = []
+
+if "profile_next_request" not in st.session_state:
+    st.session_state.profile_next_request = False
+
+profiling.set_session(st.session_state.session_id)
+profiling.mark("session init")
 
 # Custom CSS for better appearance
 st.markdown("""
@@ -131,40 +284,144 @@ st.markdown("""
 
 def stop_tts():
     """Stop any currently playing TTS."""
-    if st.session_state.tts_process:
-        try:
-            st.session_state.tts_process.kill()
-            st.session_state.tts_process = None
-        except:
-            pass
+    st.session_state.audio_to_play = None
+    if st.session_state.speech_pipeline:
+        st.session_state.speech_pipeline.cancel()
+        st.session_state.speech_player.stop()
+        st.session_state.speech_pipeline = None
+        st.session_state.speech_player = None
+    try:
+        st.session_state.tts_worker.stop()
+    except Exception as e:
+        print(f"Error stopping TTS: {e}")
 
+@timed("tts.speak_nonblocking")
 def speak_text_nonblocking(text):
-    """Speak the given text using text-to-speech in a background process."""
+    """Speak the given text using the background text-to-speech worker."""
     try:
-        # Stop any currently playing audio first
-        stop_tts()
-        
-        voice_manager = st.session_state.voice_manager
-        # Start speech in a separate thread that won't be interrupted
-        import subprocess
-        import sys
-        
-        # Create a simple Python script to run TTS
-        script = f'''
-import pyttsx3
-engine = pyttsx3.init()
-engine.setProperty("rate", 200)
-engine.setProperty("volume", 0.9)
-engine.say("""{text}""")
-engine.runAndWait()
-'''
-        # Run in subprocess to avoid Streamlit interference
-        process = subprocess.Popen([sys.executable, "-c", script], 
-                                   creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
-        st.session_state.tts_process = process
+        # Replaces whatever is currently playing; the worker restarts itself if it crashed
+        st.session_state.tts_worker.speak(strip_markdown(text), interrupt=True)
     except Exception as e:
         st.error(f"Error with text-to-speech: {e}")
 
+@timed("tts.start_pipeline")
+def start_speech_pipeline(text):
+    """Read text aloud in the browser sentence by sentence, starting with the first sentence."""
+    stop_tts()
+    
+    voice_manager = st.session_state.voice_manager
+    if not voice_manager.tts_engine:
+        speak_text_nonblocking(text)
+        return
+    
+    settings = voice_manager.get_tts_settings()
+    audio_cache = st.session_state.audio_cache
+    player = ClientClipPlayer()
+    
+    # Each sentence is rendered (and cached) while the previous one plays
+    pipeline = SpeechPipeline(
+        synthesize=lambda sentence: audio_cache.get(sentence, settings),
+        play=player.play
+    )
+    pipeline.speak(text)
+    
+    st.session_state.speech_player = player
+    st.session_state.speech_pipeline = pipeline
+
+# Browser side of ClientClipPlayer: queues the clips it is sent and starts
+# the next one when the previous has ended, so sentences play back to back
+# regardless of how often the server polls
+SPEECH_PLAYER_JS = """
+export default function(component) {
+    const { data, parentElement, setStateValue } = component;
+    const audio = parentElement.querySelector("audio");
+    if (audio.dataset.player !== data.id) {
+        audio.dataset.player = data.id;
+        audio.clips = [];
+        audio.finished = 0;
+    }
+    const report = () => setStateValue("progress", {
+        id: data.id, received: audio.clips.length, finished: audio.finished
+    });
+    const playNext = () => {
+        if (audio.finished < audio.clips.length) {
+            audio.src = audio.clips[audio.finished];
+            audio.play().catch(() => {});
+        }
+    };
+    audio.onended = () => {
+        audio.finished += 1;
+        report();
+        playNext();
+    };
+
+    const idle = audio.finished === audio.clips.length;
+    const received = audio.clips.length;
+    data.clips.forEach((clip, i) => {
+        if (data.start + i === audio.clips.length) {
+            audio.clips.push(clip);
+        }
+    });
+    if (audio.clips.length !== received) {
+        report();
+        if (idle) {
+            playNext();
+        }
+    }
+}
+"""
+
+speech_player_component = st.components.v2.component(
+    "speech_player",
+    html='<audio controls style="width: 100%"></audio>',
+    js=SPEECH_PLAYER_JS,
+)
+
+def audio_data_url(path):
+    """Inline a WAV file as a data URL for the browser player."""
+    with open(path, "rb") as f:
+        return "data:audio/wav;base64," + base64.b64encode(f.read()).decode("ascii")
+
+@st.fragment(run_every=0.25)
+def render_speech_player():
+    """Send sentence clips from the speech pipeline to the browser as they become ready."""
+    pipeline = st.session_state.speech_pipeline
+    player = st.session_state.speech_player
+    if pipeline is None or player is None:
+        return
+    
+    result = speech_player_component(
+        key="speech_player_audio",
+        data={
+            "id": player.id,
+            "start": player.received,
+            "clips": [audio_data_url(path) for path in player.pending_clips()],
+        },
+        on_progress_change=lambda: None,
+    )
+    progress = result.progress
+    if progress and progress.get("id") == player.id:
+        player.client_progress(progress["received"], progress["finished"])
+    
+    # Keep the player mounted until the browser has played the last clip
+    if pipeline.is_done() and player.is_finished():
+        st.session_state.speech_pipeline = None
+        st.session_state.speech_player = None
+        st.rerun()
+
+@timed("tts.play_text")
+def play_text(text):
+    """Play text in the browser from the audio cache, falling back to the server speakers."""
+    stop_tts()
+    voice_manager = st.session_state.voice_manager
+    audio_path = st.session_state.audio_cache.get(text, voice_manager.get_tts_settings())
+    
+    if audio_path:
+        # Rendered once per text/voice/rate/volume, then replayed from disk
+        st.session_state.audio_to_play = audio_path
+    else:
+        speak_text_nonblocking(text)
+
 def request_play_message(message_id):
     """Request to play a specific message."""
     # If clicking the same message that's playing, stop it
@@ -175,8 +432,8 @@ def request_play_message(message_id):
         # Otherwise play the new message
         st.session_state.play_message_id = message_id
 
-def display_message(role, content, timestamp=None, message_index=None):
-    """Display a chat message with proper styling."""
+def render_message_html(role, content, timestamp=None):
+    """Format a chat message as styled HTML."""
     if timestamp is None:
         timestamp = datetime.now().strftime("%H:%M:%S")
     
@@ -184,16 +441,33 @@ def display_message(role, content, timestamp=None, message_index=None):
     header_class = "user-header" if role == "user" else "assistant-header"
     role_display = "You" if role == "user" else "AI Assistant"
     
-    # Create a container for the message
-    with st.container():
-        st.markdown(f"""
+    return f"""
         <div class="chat-message {message_class}">
             <div class="message-header {header_class}">
                 {role_display} • {timestamp}
             </div>
             <div>{content}</div>
         </div>
-        """, unsafe_allow_html=True)
+        """
+
+def get_message_html(message):
+    """Get a message's HTML, formatting it only the first time it is displayed."""
+    cache = st.session_state.message_html_cache
+    
+    html = cache.get(message.id)
+    if html is None:
+        html = render_message_html(message.role, message.content, message.timestamp)
+        cache[message.id] = html
+    return html
+
+def display_message(role, content, timestamp=None, message_index=None, html=None):
+    """Display a chat message with proper styling."""
+    if html is None:
+        html = render_message_html(role, content, timestamp)
+    
+    # Create a container for the message
+    with st.container():
+        st.markdown(html, unsafe_allow_html=True)
         
         # Add Listen and Stop buttons for AI messages
         if role == "assistant":
@@ -216,282 +490,626 @@ def display_message(role, content, timestamp=None, message_index=None):
                 ):
                     stop_tts()
 
+def load_earlier_messages():
+    """Show another page of older messages."""
+    st.session_state.chat_window += CHAT_PAGE_SIZE
+
+def show_latest_messages():
+    """Collapse the transcript back to the most recent messages."""
+    st.session_state.chat_window = CHAT_WINDOW_SIZE
+
+def reset_chat_view():
+    """Forget the transcript window and cached message HTML."""
+    st.session_state.chat_window = CHAT_WINDOW_SIZE
+    st.session_state.message_html_cache = {}
+
+@timed("chat.display_history")
 def display_chat_history():
-    """Display all messages in the chat history."""
-    for message in st.session_state.messages:
+    """Display the most recent messages in the chat history."""
+    transcript = st.session_state.transcript
+    hidden = max(0, len(transcript) - st.session_state.chat_window)
+    
+    if hidden:
+        col1, col2 = st.columns([0.7, 0.3])
+        with col1:
+            st.caption(f"{hidden} earlier message{'s' if hidden != 1 else ''} hidden")
+        with col2:
+            st.button("⬆️ Load earlier messages", key="load_earlier", on_click=load_earlier_messages)
+    elif st.session_state.chat_window > CHAT_WINDOW_SIZE and len(transcript) > CHAT_WINDOW_SIZE:
+        st.button("⬇️ Show latest only", key="show_latest", on_click=show_latest_messages)
+    
+    # Older messages are paged in from the database only when the window reaches them
+    messages = transcript.recent(st.session_state.chat_window)
+    for message in messages:
         display_message(
-            message["role"], 
-            message["content"], 
-            message.get("timestamp", ""),
-            message_index=message.get("id", 0)
+            message.role, 
+            message.content, 
+            message.timestamp,
+            message_index=message.id,
+            html=get_message_html(message)
         )
+    
+    # Keep cached HTML only for the messages on screen
+    if len(st.session_state.message_html_cache) > len(messages):
+        st.session_state.message_html_cache = {
+            message.id: st.session_state.message_html_cache[message.id] for message in messages
+        }
 
+@timed("tts.check_and_play")
 def check_and_play_audio():
     """Check if we need to play audio and do it."""
     if st.session_state.play_message_id is not None:
         # Find the message to play
-        for message in st.session_state.messages:
-            if message.get("id") == st.session_state.play_message_id and message["role"] == "assistant":
-                st.info("🔊 Playing audio...")
-                speak_text_nonblocking(message["content"])
-                break
+        message = st.session_state.transcript.get(st.session_state.play_message_id)
+        if message is not None and message.role == "assistant":
+            with st.spinner("🔊 Preparing audio..."):
+                play_text(message.content)
         # Reset the play request
         st.session_state.play_message_id = None
+    
+    if st.session_state.audio_to_play:
+        st.audio(st.session_state.audio_to_play, format="audio/wav", autoplay=True)
 
 def add_message(role, content):
     """Add a message to the chat history."""
     timestamp = datetime.now().strftime("%H:%M:%S")
-    st.session_state.message_counter += 1
-    st.session_state.messages.append({
-        "role": role,
-        "content": content,
-        "timestamp": timestamp,
-        "id": st.session_state.message_counter
-    })
+    return st.session_state.transcript.append(role, content, timestamp)
+
+@timed("session.persist")
+def persist_session_state():
+    """Save the persisted session keys to the session store if they changed."""
+    state = {key: st.session_state[key] for key in PERSISTED_STATE_KEYS}
+    if state != st.session_state.persisted_state:
+        get_session_store().save_state(st.session_state.session_id, state)
+        st.session_state.persisted_state = state
+
+def invalidate_stats():
+    """Mark the cached statistics stale; they are re-queried on the next draw."""
+    st.session_state.conversation_stats = None
+
+@timed("stats.get")
+def get_conversation_stats():
+    """Get conversation statistics, querying the database only after they were invalidated."""
+    if st.session_state.conversation_stats is None:
+        st.session_state.conversation_stats = st.session_state.db.get_conversation_stats()
+    return st.session_state.conversation_stats
+
+def save_conversation(user_query, ai_response, query_type="text", image_path=None, request_key=None):
+    """Save a conversation to the history database and invalidate the statistics."""
+    saved = st.session_state.db.add_conversation(
+        user_query=user_query,
+        ai_response=ai_response,
+        query_type=query_type,
+        image_path=image_path,
+        request_key=request_key
+    )
+    invalidate_stats()
+    return saved
+
+@timed("chat.submit_job")
+def submit_response_job(call, *args, user_query, query_type="text", image_path=None, request_key=None,
+                        priority=INTERACTIVE, trace=tracing.NOOP_SPAN):
+    """Run a model call in the background; its answer is added to the chat when it arrives."""
+    if st.session_state.profile_next_request:
+        # Profile this one request on its worker thread
+        st.session_state.profile_next_request = False
+        call = partial(profiling.profile_call, call, label=query_type)
+    
+    job = get_llm_executor().submit(
+        call, *args,
+        description=user_query,
+        # Identical prompts share one upstream call across sessions; request_key
+        # stays per session so each session's history still gets its own row
+        key=make_content_key(query_type, user_query, image_path),
+        session_id=st.session_state.session_id,
+        priority=priority,
+        metadata={
+            "user_query": user_query,
+            "query_type": query_type,
+            "image_path": image_path,
+            "request_key": request_key,
+            "trace": trace
+        }
+    )
+    st.session_state.pending_jobs.append(job)
+    return job
 
+@timed("chat.process_input")
 def process_user_input(user_input):
-    """Process user input and get AI response."""
+    """Add the user's message and request the AI response without waiting for it."""
     try:
-        # Add user message
-        add_message("user", user_input)
+        transcript = st.session_state.transcript
+        image_path = st.session_state.current_image_path
+        
+        # A second Send for the message just added (double-click, or a rerun
+        # replaying the button) is keyed from before that message, so it matches
+        message_counter = transcript.last_id
+        last_messages = transcript.recent(1)
+        if last_messages and last_messages[0].role == "user" and last_messages[0].content == user_input:
+            message_counter = last_messages[0].id - 1
+        
+        request_key = make_request_key(st.session_state.session_id, message_counter, user_input, image_path)
+        if request_key == st.session_state.last_request_key:
+            return
+        st.session_state.last_request_key = request_key
         
-        # Show processing message
-        with st.spinner("AI is thinking..."):
-            query_type = "image" if st.session_state.current_image_path else "text"
+        # One trace per turn: it is continued on the worker thread and ended when the answer is shown
+        turn = tracing.start_trace(
+            "chat.turn",
+            session_id=st.session_state.session_id,
+            query_type="image" if image_path else "text",
+            chars=len(user_input),
+            image_trace_id=st.session_state.current_image_trace_id if image_path else None
+        )
+        with tracing.use_span(turn):
+            tracing.set_content(message=user_input)
+            # Add user message
+            add_message("user", user_input)
             
-            if st.session_state.current_image_path:
+            gemini_client = st.session_state.gemini_client
+            if image_path:
                 # Image analysis
-                response = st.session_state.gemini_client.analyze_image(
-                    st.session_state.current_image_path, user_input
+                submit_response_job(
+                    gemini_client.analyze_image, image_path, user_input,
+                    user_query=user_input, query_type="image", image_path=image_path, request_key=request_key,
+                    trace=turn
                 )
             else:
                 # Text conversation
-                response = st.session_state.gemini_client.get_text_response(user_input)
-            
-            if response["success"]:
-                ai_response = response["response"]
-                add_message("assistant", ai_response)
-                
-                # Save to database
-                st.session_state.db.add_conversation(
-                    user_query=user_input,
-                    ai_response=ai_response,
-                    query_type=query_type,
-                    image_path=st.session_state.current_image_path
+                submit_response_job(
+                    gemini_client.get_text_response, user_input,
+                    user_query=user_input, request_key=request_key, trace=turn
                 )
                 
-                # Voice response if auto-read is enabled
-                if st.session_state.auto_read_enabled:
-                    try:
-                        speak_text_nonblocking(ai_response)
-                    except Exception as e:
-                        st.warning(f"Voice output error: {e}")
-                
-                st.success(f"Response received! Used {response['usage']['total_tokens']} tokens.")
-            else:
-                error_msg = f"Error: {response['error']}"
-                add_message("assistant", error_msg)
-                st.error("Failed to get AI response")
-                
     except Exception as e:
         error_msg = f"Unexpected error: {str(e)}"
         add_message("assistant", error_msg)
         st.error(f"Error processing message: {e}")
 
-def main():
-    """Main Streamlit application."""
-    # Header
-    st.markdown('<h1 class="main-header">🤖 AI Chatbot Assistant</h1>', unsafe_allow_html=True)
+@timed("chat.finish_job")
+def finish_response_job(job):
+    """Add a finished job's answer to the chat and save it to the database."""
+    trace = job.metadata.get("trace", tracing.NOOP_SPAN)
+    response = job.result()
+    if response is None:
+        trace.end(status="cancelled")
+        return
     
-    # Sidebar
-    with st.sidebar:
-        st.header("🛠️ Controls")
-        
-        # Auto-read toggle
-        st.subheader("🔊 Text-to-Speech")
-        if st.button("🎤 Auto-Read Responses" + (" ON" if st.session_state.auto_read_enabled else " OFF")):
-            st.session_state.auto_read_enabled = not st.session_state.auto_read_enabled
+    with tracing.use_span(trace):
+        if response["success"]:
+            ai_response = response["response"]
+            add_message("assistant", ai_response)
+            
+            # Save to database
+            save_conversation(
+                user_query=job.metadata["user_query"],
+                ai_response=ai_response,
+                query_type=job.metadata["query_type"],
+                image_path=job.metadata["image_path"],
+                request_key=job.metadata["request_key"]
+            )
+            
+            # Voice response if auto-read is enabled
             if st.session_state.auto_read_enabled:
-                st.success("Auto-read enabled! AI responses will be read aloud automatically.")
-            else:
-                st.info("Auto-read disabled. Use 🔊 Listen buttons to hear responses.")
-        
-        st.caption("💡 Tip: Use 🔊 Listen buttons below each AI response to hear them anytime!")
-        
-        # Image upload section
-        st.header("📷 Image Analysis")
-        uploaded_file = st.file_uploader(
-            "Upload an image for analysis",
+                try:
+                    start_speech_pipeline(ai_response)
+                except Exception as e:
+                    st.warning(f"Voice output error: {e}")
+            
+            usage = response.get("usage") or {}
+            st.toast(f"Response received! Used {usage.get('total_tokens', 0)} tokens.")
+        else:
+            add_message("assistant", f"Error: {response['error']}")
+            st.toast("Failed to get AI response")
+    
+    # Speech synthesis continues in the background and adds its spans to the trace later
+    usage = response.get("usage") or {}
+    trace.end(
+        error=response["error"] if not response["success"] else None,
+        model=response.get("model"),
+        total_tokens=usage.get("total_tokens"),
+        queued_and_answered_ms=round(job.elapsed() * 1000, 1),
+        auto_read=st.session_state.auto_read_enabled
+    )
+
+def cancel_response_job(job_id):
+    """Cancel a pending request; a reply that arrives later is discarded."""
+    for job in st.session_state.pending_jobs:
+        if job.id == job_id:
+            job.cancel()
+            job.metadata.get("trace", tracing.NOOP_SPAN).end(status="cancelled")
+            # Sending the same prompt again after cancelling is a new request
+            if job.key == st.session_state.last_request_key:
+                st.session_state.last_request_key = None
+    st.session_state.pending_jobs = [job for job in st.session_state.pending_jobs if not job.cancelled()]
+
+@st.fragment(run_every=0.5)
+@timed("chat.pending_responses")
+def render_pending_responses():
+    """Poll pending requests, showing progress until their answers are ready."""
+    pending = st.session_state.pending_jobs
+    
+    # Answers are added in submission order so the chat stays in sequence
+    finished = 0
+    while finished < len(pending) and pending[finished].done():
+        finish_response_job(pending[finished])
+        finished += 1
+    
+    if finished:
+        st.session_state.pending_jobs = pending[finished:]
+        # The chat history is outside this fragment, so redraw the whole page
+        st.rerun()
+    
+    for job in pending:
+        col1, col2 = st.columns([0.8, 0.2])
+        with col1:
+            st.caption(f"⏳ AI is thinking... ({job.elapsed():.0f}s) — _{job.description[:60]}_")
+        with col2:
+            st.button(
+                "✖️ Cancel",
+                key=f"cancel_job_{job.id}",
+                on_click=cancel_response_job,
+                args=(job.id,)
+            )
+
+def toggle_auto_read():
+    """Turn reading responses aloud on or off."""
+    st.session_state.auto_read_enabled = not st.session_state.auto_read_enabled
+    # Only this fragment reruns, so save the change now
+    persist_session_state()
+
+@st.fragment
+@timed("sidebar.tts_controls")
+def render_tts_controls():
+    """Sidebar section: auto-read toggle."""
+    st.subheader("🔊 Text-to-Speech")
+    st.button(
+        "🎤 Auto-Read Responses" + (" ON" if st.session_state.auto_read_enabled else " OFF"),
+        on_click=toggle_auto_read
+    )
+    
+    if st.session_state.auto_read_enabled:
+        st.caption("Auto-read enabled! AI responses will be read aloud automatically.")
+    
+    st.caption("💡 Tip: Use 🔊 Listen buttons below each AI response to hear them anytime!")
+
+def set_current_image(source_path, upload_id=None):
+    """Prepare an image for analysis and make it the current image."""
+    image_processor = st.session_state.image_processor
+    st.session_state.current_image_path = image_processor.prepare_for_ai_analysis(source_path)
+    st.session_state.current_image = image_processor.open_reduced(source_path)
+    st.session_state.current_image_info = image_processor.get_image_info(source_path)
+    st.session_state.current_upload_id = upload_id
+    # Later turns about this image refer to the trace of its upload and preprocessing
+    st.session_state.current_image_trace_id = tracing.current_trace_id()
+
+def clear_current_image():
+    """Forget the current image (an upload still in the file uploader is not processed again)."""
+    st.session_state.current_image = None
+    st.session_state.current_image_path = None
+    st.session_state.current_image_info = None
+
+@st.fragment
+@timed("sidebar.image_section")
+def render_image_section():
+    """Sidebar section: image upload, camera capture and batch analysis."""
+    st.header("📷 Image Analysis")
+    uploaded_file = st.file_uploader(
+        "Upload an image for analysis",
+        type=['png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp'],
+        key="image_uploader"
+    )
+    
+    if uploaded_file and uploaded_file.file_id != st.session_state.current_upload_id:
+        # Only a newly uploaded file is saved and processed; reruns reuse the result
+        try:
+            with tracing.span("image.attach", source="upload", upload_bytes=uploaded_file.size):
+                temp_path = st.session_state.image_processor.save_upload(uploaded_file, suffix=".png")
+                set_current_image(temp_path, upload_id=uploaded_file.file_id)
+            # The chat area shows the current image, so redraw the whole page once
+            st.rerun()
+        except Exception as e:
+            st.session_state.current_upload_id = uploaded_file.file_id
+            st.error(f"Error processing image: {e}")
+    
+    if (uploaded_file and st.session_state.current_image
+            and uploaded_file.file_id == st.session_state.current_upload_id):
+        st.image(st.session_state.current_image, caption="Uploaded Image", use_container_width=True)
+        info = st.session_state.current_image_info or {}
+        st.info(f"Image: {info.get('width', 0)}×{info.get('height', 0)} pixels")
+    
+    # Camera capture
+    if st.button("📸 Capture from Camera"):
+        # Capture, preprocessing and the analysis are one turn
+        turn = tracing.start_trace("chat.turn", session_id=st.session_state.session_id, query_type="image",
+                                   source="camera")
+        try:
+            with st.spinner("Opening camera... Please allow camera access if prompted."), tracing.use_span(turn):
+                # Use headless camera capture for web
+                captured_path = st.session_state.image_processor.capture_from_camera_headless()
+                if captured_path:
+                    # Process the captured image
+                    set_current_image(captured_path)
+                    processed_path = st.session_state.current_image_path
+                    
+                    # Display the captured image
+                    st.image(st.session_state.current_image, caption="Captured Image", use_container_width=True)
+                    
+                    # Automatically analyze the image in the background
+                    add_message("user", "📸 Camera capture - What do you see?")
+                    submit_response_job(
+                        st.session_state.gemini_client.analyze_image,
+                        processed_path, "What do you see in this image? Please describe it in detail.",
+                        user_query="Camera capture - What do you see?",
+                        query_type="image",
+                        image_path=processed_path,
+                        priority=BACKGROUND,
+                        trace=turn
+                    )
+                    
+                    st.rerun()
+                else:
+                    turn.end(error="No image captured")
+                    st.error("Failed to capture image from camera")
+        except Exception as e:
+            turn.end(error=str(e))
+            st.error(f"Camera capture error: {e}")
+            st.info("If camera doesn't work, try uploading an image instead.")
+    
+    # Batch analysis of several images at once
+    with st.expander("🗂️ Batch Analysis"):
+        batch_files = st.file_uploader(
+            "Upload multiple images",
             type=['png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp'],
-            key="image_uploader"
+            accept_multiple_files=True,
+            key="batch_uploader"
         )
-        
-        if uploaded_file:
-            try:
-                # Save uploaded file temporarily
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp_file:
-                    tmp_file.write(uploaded_file.read())
-                    temp_path = tmp_file.name
-                
-                # Process image
-                processed_path = st.session_state.image_processor.prepare_for_ai_analysis(temp_path)
-                st.session_state.current_image_path = processed_path
-                st.session_state.current_image = Image.open(temp_path)
-                
-                # Display image
-                st.image(st.session_state.current_image, caption="Uploaded Image", use_container_width=True)
-                
-                # Get image info
-                info = st.session_state.image_processor.get_image_info(temp_path)
-                st.info(f"Image: {info.get('width', 0)}×{info.get('height', 0)} pixels")
-                
-            except Exception as e:
-                st.error(f"Error processing image: {e}")
-        
-        # Camera capture
-        if st.button("📸 Capture from Camera"):
-            try:
-                with st.spinner("Opening camera... Please allow camera access if prompted."):
-                    # Use headless camera capture for web
-                    captured_path = st.session_state.image_processor.capture_from_camera_headless()
-                    if captured_path:
-                        # Process the captured image
-                        processed_path = st.session_state.image_processor.prepare_for_ai_analysis(captured_path)
-                        st.session_state.current_image_path = processed_path
-                        st.session_state.current_image = Image.open(captured_path)
-                        
-                        # Display the captured image
-                        st.image(st.session_state.current_image, caption="Captured Image", use_container_width=True)
-                        
-                        # Automatically analyze the image
-                        with st.spinner("Analyzing captured image..."):
-                            analysis_response = st.session_state.gemini_client.analyze_image(
-                                processed_path, "What do you see in this image? Please describe it in detail."
+        batch_question = st.text_input(
+            "Question for every image",
+            value="What do you see in this image?",
+            key="batch_question"
+        )
+
+        if batch_files and st.button("🔍 Analyze All"):
+            # The whole batch is one trace; each image's model call is a child span
+            with tracing.span("image.batch", images=len(batch_files)):
+                batch_paths = []
+                try:
+                    for batch_file in batch_files:
+                        suffix = os.path.splitext(batch_file.name)[1] or ".png"
+                        batch_paths.append(st.session_state.image_processor.save_upload(batch_file, suffix=suffix))
+
+                    progress = st.progress(0.0, text=f"Analyzing 0/{len(batch_paths)} images...")
+                    # Batch calls queue behind interactive chat and count against this session's share
+                    results = st.session_state.gemini_client.analyze_images_batch(
+                        batch_paths,
+                        batch_question,
+                        image_processor=st.session_state.image_processor,
+                        submit=partial(
+                            get_llm_executor().scheduler.submit,
+                            session_id=st.session_state.session_id,
+                            priority=BACKGROUND
+                        )
+                    )
+                    batch_results = []
+                    for done, result in enumerate(results, start=1):
+                        name = batch_files[result["index"]].name
+                        progress.progress(done / len(batch_paths), text=f"Analyzing {done}/{len(batch_paths)} images...")
+                        batch_results.append((name, result))
+
+                        if result["success"]:
+                            st.markdown(f"**{name}**")
+                            st.write(result["response"])
+                            save_conversation(
+                                user_query=f"[{name}] {batch_question}",
+                                ai_response=result["response"],
+                                query_type="image",
+                                # The upload is deleted below, so record the name it was uploaded as
+                                image_path=name
                             )
-                            
-                            if analysis_response["success"]:
-                                st.success("Image captured and analyzed!")
-                                
-                                # Add to chat messages for display
-                                add_message("user", "📸 Camera capture - What do you see?")
-                                add_message("assistant", analysis_response['response'])
-                                
-                                # Save the analysis to database
-                                st.session_state.db.add_conversation(
-                                    user_query="Camera capture - What do you see?",
-                                    ai_response=analysis_response['response'],
-                                    query_type="image",
-                                    image_path=processed_path
-                                )
-                                
-                                # Voice response if auto-read is enabled
-                                if st.session_state.auto_read_enabled:
-                                    try:
-                                        speak_text_nonblocking(analysis_response['response'])
-                                    except Exception as e:
-                                        st.warning(f"Voice output error: {e}")
-                            else:
-                                st.error(f"Failed to analyze image: {analysis_response['error']}")
-                        
-                        st.rerun()
-                    else:
-                        st.error("Failed to capture image from camera")
-            except Exception as e:
-                st.error(f"Camera capture error: {e}")
-                st.info("If camera doesn't work, try uploading an image instead.")
-        
-        # Clear image
-        if st.session_state.current_image and st.button("❌ Clear Image"):
-            st.session_state.current_image = None
-            st.session_state.current_image_path = None
-            st.success("Image cleared!")
-            st.rerun()
-        
-        # History section
-        st.header("📋 Chat History")
-        
-        # Search
-        search_term = st.text_input("🔍 Search conversations", key="search_input")
-        if st.button("Search") and search_term:
-            results = st.session_state.db.search_conversations(search_term)
-            if results:
-                st.success(f"Found {len(results)} results")
-                with st.expander("Search Results"):
-                    for i, result in enumerate(results[:10]):  # Show first 10 results
-                        id_, user_query, ai_response, timestamp, query_type, image_path = result
-                        st.write(f"**{i+1}. {timestamp}** ({query_type})")
-                        st.write(f"**You:** {user_query}")
-                        st.write(f"**AI:** {ai_response}")
-                        st.write("---")
-            else:
-                st.info("No conversations found")
-        
-        
-        # Clear history
-        if st.button("🗑️ Clear All History"):
-            if st.session_state.db.clear_all_history():
-                st.success("History cleared!")
+                        else:
+                            st.error(f"{name}: {result['error']}")
+                finally:
+                    # The uploads are only needed for this batch
+                    st.session_state.image_processor.cleanup_temp_files(batch_paths)
+
+            # The statistics live in another fragment, so redraw the whole page;
+            # the results are kept in the session so they are shown again after it
+            st.session_state.batch_results = batch_results
+            st.rerun(scope="app")
+
+        for name, result in st.session_state.batch_results:
+            if result["success"]:
+                st.markdown(f"**{name}**")
+                st.write(result["response"])
             else:
-                st.error("Failed to clear history")
-        
-        # Statistics
-        st.header("📊 Statistics")
-        try:
-            stats = st.session_state.db.get_conversation_stats()
-            st.metric("Total Conversations", stats.get('total_conversations', 0))
-            st.metric("Recent (7 days)", stats.get('recent_conversations', 0))
-            
-            # Show conversation types
-            by_type = stats.get('by_type', {})
-            if by_type:
-                st.write("**By Type:**")
-                for conv_type, count in by_type.items():
-                    st.write(f"• {conv_type}: {count}")
-        except Exception as e:
-            st.error(f"Error loading statistics: {e}")
+                st.error(f"{name}: {result['error']}")
+
+    # Clear image
+    if st.session_state.current_image and st.button("❌ Clear Image"):
+        clear_current_image()
+        st.success("Image cleared!")
+        st.rerun()
+
+@st.fragment
+@timed("sidebar.history_section")
+def render_history_section():
+    """Sidebar section: history search and clearing."""
+    st.header("📋 Chat History")
+    
+    # Search
+    search_term = st.text_input("🔍 Search conversations", key="search_input")
+    if st.button("Search") and search_term:
+        results = st.session_state.db.search_conversations(search_term)
+        if results:
+            st.success(f"Found {len(results)} results")
+            with st.expander("Search Results"):
+                for i, result in enumerate(results[:10]):  # Show first 10 results
+                    id_, user_query, ai_response, timestamp, query_type, image_path = result
+                    st.write(f"**{i+1}. {timestamp}** ({query_type})")
+                    st.write(f"**You:** {user_query}")
+                    st.write(f"**AI:** {ai_response}")
+                    st.write("---")
+        else:
+            st.info("No conversations found")
+    
+    
+    # Clear history
+    if st.button("🗑️ Clear All History"):
+        if st.session_state.db.clear_all_history():
+            invalidate_stats()
+            # Statistics live in another fragment, so redraw the whole page
+            st.rerun()
+        else:
+            st.error("Failed to clear history")
+
+@st.fragment
+@timed("sidebar.statistics")
+def render_statistics():
+    """Sidebar section: conversation statistics, queried only after a change."""
+    st.header("📊 Statistics")
+    try:
+        stats = get_conversation_stats()
+        st.metric("Total Conversations", stats.get('total_conversations', 0))
+        st.metric("Recent (7 days)", stats.get('recent_conversations', 0))
         
-        # Settings
-        st.header("⚙️ Settings")
-        if st.button("🎤 Test Microphone"):
-            try:
-                result = st.session_state.voice_manager.test_microphone()
-                if result:
-                    st.success("Microphone test successful!")
-                else:
-                    st.error("Microphone test failed")
-            except Exception as e:
-                st.error(f"Microphone test error: {e}")
+        # Show conversation types
+        by_type = stats.get('by_type', {})
+        if by_type:
+            st.write("**By Type:**")
+            for conv_type, count in by_type.items():
+                st.write(f"• {conv_type}: {count}")
+    except Exception as e:
+        st.error(f"Error loading statistics: {e}")
+    
+    with st.expander("🚦 Request Queue"):
+        render_queue_metrics()
+
+def arm_request_profiling():
+    st.session_state.profile_next_request = True
+
+def render_profiling_panel():
+    """Sidebar section (CHATBOT_PROFILE=1): where the last reruns and requests spent their time."""
+    with st.expander("⏱️ Profiling"):
+        reruns = st.session_state.rerun_profiles
+        if reruns:
+            st.write("**Last rerun:**")
+            st.code(profiling.format_waterfall(reruns[-1]), language=None)
+            st.write(f"**Slowest steps over the last {len(reruns)} reruns:**")
+            for name, total, calls in profiling.slowest_steps(reruns):
+                st.write(f"• `{name}`: {total * 1000:.1f} ms in {calls} call{'s' if calls != 1 else ''}")
+        else:
+            st.caption("The waterfall appears after the first rerun.")
         
-        if st.button("🔊 Test Speakers"):
-            try:
-                st.session_state.voice_manager.test_speakers()
-                st.success("Speaker test completed!")
-            except Exception as e:
-                st.error(f"Speaker test error: {e}")
+        activity = profiling.recent_activity(st.session_state.session_id)[-5:]
+        if activity:
+            st.write("**Requests and fragment reruns:**")
+            for recording in reversed(activity):
+                st.code(profiling.format_waterfall(recording), language=None)
         
-        # Camera status
-        camera_status = "Available" if st.session_state.camera_manager.camera_available else "Not Available"
-        st.info(f"Camera Status: {camera_status}")
+        if st.session_state.profile_next_request:
+            st.caption("🔬 The next request will be profiled.")
+        else:
+            st.button("🔬 Profile next request", on_click=arm_request_profiling,
+                      help="Run the next model request under pyinstrument (if installed) or cProfile")
+        for report in reversed(profiling.recent_profiles(st.session_state.session_id)):
+            st.write(f"**{report['label']}** → `{report['path']}`")
+            st.code(report["summary"][:3000], language=None)
+
+def render_queue_metrics():
+    """Show the shared request scheduler's load and which sessions use it most."""
+    metrics = get_llm_executor().scheduler.metrics()
+    st.write(f"**Running:** {metrics['running']}/{metrics['max_concurrent']}")
+    st.write(f"**Queued:** {metrics['queued']['interactive']} interactive, {metrics['queued']['background']} background")
+    st.write(f"**Queue wait:** p50 {metrics['wait_p50']:.1f}s, p95 {metrics['wait_p95']:.1f}s")
     
-    # Main chat area
-    st.header("💬 Chat")
+    sessions = sorted(metrics["sessions"].items(), key=lambda item: item[1]["service_seconds"], reverse=True)
+    if sessions:
+        st.write("**Top sessions by API time:**")
+        for session_id, stats in sessions[:5]:
+            you = " (you)" if session_id == st.session_state.session_id else ""
+            st.write(
+                f"• `{session_id[:8]}`{you}: {stats['service_seconds']:.1f}s, "
+                f"{stats['completed']} done, {stats['queued']} queued, {stats['rejected']} rejected"
+            )
     
-    # Display current image if loaded
-    if st.session_state.current_image:
-        st.image(st.session_state.current_image, caption="Current Image for Analysis", width=300)
+    router = get_model_router()
+    if router is not None:
+        routing = router.metrics()
+        st.write("**Model routing:**")
+        for name, route in routing["routes"].items():
+            p95 = routing["models"][route["model"]]["p95"]
+            p95_text = f"p95 {p95:.1f}s" if p95 is not None else "p95 not measured"
+            st.write(
+                f"• {name}: `{route['model']}`, {p95_text} (SLO {route['slo']:.0f}s), "
+                f"{route['requests']} requests, {route['rerouted']} rerouted"
+            )
     
-    # Chat history container
-    chat_container = st.container()
+    hedger = get_request_hedger()
+    if hedger is not None:
+        hedging = hedger.metrics()
+        st.write(
+            f"**Hedging:** {hedging['hedge_rate']:.0%} of {hedging['calls']} calls hedged, "
+            f"{hedging['hedge_wins']} won, {hedging['latency_saved_seconds']:.1f}s saved"
+        )
     
-    with chat_container:
-        display_chat_history()
+    st.write("**Providers:**")
+    for provider in get_provider_pool().status():
+        health = "🟢" if provider["healthy"] else "🔴"
+        latency = f"{provider['latency_ms']:.0f} ms" if provider["latency_ms"] is not None else "not measured"
+        st.write(f"{health} `{provider['name']}`: {latency}, {provider['successes']} ok, {provider['failures']} failed")
+
+@st.fragment
+@timed("sidebar.settings")
+def render_settings():
+    """Sidebar section: speech recognition backend, device tests and camera status."""
+    st.header("⚙️ Settings")
+    voice_manager = st.session_state.voice_manager
+    backend_names = list(RECOGNIZER_BACKENDS)
+    current_backend = voice_manager.recognizer_backend.name
+    selected_backend = st.selectbox(
+        "🗣️ Speech recognition",
+        backend_names,
+        index=backend_names.index(current_backend) if current_backend in backend_names else 0,
+        help="google needs network access; vosk and whisper run locally on the CPU"
+    )
+    if selected_backend != current_backend:
+        if voice_manager.set_recognizer_backend(selected_backend):
+            st.success(f"Using {selected_backend} speech recognition")
+        else:
+            st.error(f"Could not switch to {selected_backend}")
     
-    # Check if audio should be played
-    check_and_play_audio()
+    if st.button("🎤 Test Microphone"):
+        try:
+            result = st.session_state.voice_manager.test_microphone()
+            if result:
+                st.success("Microphone test successful!")
+            else:
+                st.error("Microphone test failed")
+        except Exception as e:
+            st.error(f"Microphone test error: {e}")
     
-    # Chat input
-    st.markdown("---")
+    if st.button("🔊 Test Speakers"):
+        try:
+            st.session_state.voice_manager.test_speakers()
+            st.success("Speaker test completed!")
+        except Exception as e:
+            st.error(f"Speaker test error: {e}")
     
+    # Camera status
+    camera_status = "Available" if st.session_state.camera_manager.camera_available else "Not Available"
+    st.info(f"Camera Status: {camera_status}")
+
+def clear_chat():
+    """Clear the chat transcript and the current image."""
+    st.session_state.transcript.clear()
+    reset_chat_view()
+    clear_current_image()
+
+@st.fragment
+@timed("chat.input")
+def render_chat_input():
+    """Chat input; typing and switching input method only rerun this fragment."""
     # Input methods
     input_method = st.radio("Input Method:", ["Text", "Voice"], horizontal=True)
     
@@ -519,10 +1137,7 @@ def main():
         with col3:
             st.markdown("<br>", unsafe_allow_html=True)  # Add some spacing
             if st.button("🔄 Clear Chat", key="clear_chat_text"):
-                st.session_state.messages = []
-                st.session_state.current_image = None
-                st.session_state.current_image_path = None
-                st.success("Chat cleared!")
+                clear_chat()
                 st.rerun()
     
     else:
@@ -535,7 +1150,13 @@ def main():
             if st.button("🎤 Start Recording"):
                 try:
                     with st.spinner("Listening... Please speak now"):
-                        result = st.session_state.voice_manager.listen_once(timeout=10)
+                        # Show the transcript live; submit as soon as the user stops talking
+                        partial_placeholder = st.empty()
+                        result = st.session_state.voice_manager.listen_streaming(
+                            on_partial=lambda text: partial_placeholder.markdown(f"🎙️ _{text}_"),
+                            timeout=10
+                        )
+                        partial_placeholder.empty()
                         if result:
                             st.success(f"Recognized: {result}")
                             process_user_input(result)
@@ -547,11 +1168,52 @@ def main():
         
         with col2:
             if st.button("🔄 Clear Chat"):
-                st.session_state.messages = []
-                st.session_state.current_image = None
-                st.session_state.current_image_path = None
-                st.success("Chat cleared!")
+                clear_chat()
                 st.rerun()
+
+def main():
+    """Main Streamlit application."""
+    # Header
+    st.markdown('<h1 class="main-header">🤖 AI Chatbot Assistant</h1>', unsafe_allow_html=True)
+    
+    # Sidebar; each section is a fragment so its widgets only rerun that section
+    with st.sidebar:
+        st.header("🛠️ Controls")
+        render_tts_controls()
+        render_image_section()
+        render_history_section()
+        render_statistics()
+        render_settings()
+        if profiling.ENABLED:
+            render_profiling_panel()
+    
+    # Main chat area
+    st.header("💬 Chat")
+    
+    # Display current image if loaded
+    if st.session_state.current_image:
+        st.image(st.session_state.current_image, caption="Current Image for Analysis", width=300)
+    
+    # Chat history container
+    chat_container = st.container()
+    
+    with chat_container:
+        display_chat_history()
+    
+    # Check if audio should be played
+    check_and_play_audio()
+    
+    # Answers still being generated
+    if st.session_state.pending_jobs:
+        render_pending_responses()
+    
+    # Auto-read playback polls for the next sentence clip
+    if st.session_state.speech_pipeline:
+        render_speech_player()
+    
+    # Chat input
+    st.markdown("---")
+    render_chat_input()
     
     # Help section
     with st.expander("ℹ️ Help & Instructions"):
@@ -596,6 +1258,12 @@ def main():
         "<p style='text-align: center; color: #666;'>AI Chatbot Assistant - Powered by Google Gemini AI</p>", 
         unsafe_allow_html=True
     )
+    
+    persist_session_state()
+    
+    rerun_profile = profiling.end_rerun()
+    if rerun_profile is not None:
+        st.session_state.rerun_profiles = (st.session_state.rerun_profiles + [rerun_profile])[-10:]
 
 if __name__ == "__main__":
     try:
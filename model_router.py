@@ -0,0 +1,204 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+# Route names
+LIGHT = "light"
+STRONG = "strong"
+
+# Fenced blocks, or lines that look like source code or a stack trace
+CODE_PATTERN = re.compile(
+    r"```|^\s*(def |class |import |from \S+ import |function |public |#include|SELECT |Traceback )"
+    r"|[;{}]\s*$",
+    re.MULTILINE | re.IGNORECASE
+)
+# Requests that ask for reasoning rather than a quick answer
+REASONING_PATTERN = re.compile(
+    r"\b(step by step|explain why|prove|derive|compare|trade-?offs?|analy[sz]e|debug|optimi[sz]e|refactor)\b",
+    re.IGNORECASE
+)
+
+class RequestFeatures:
+    """Cheap signals about how hard a request is."""
+    __slots__ = ("words", "has_code", "has_image", "depth", "reasoning")
+
+    def __init__(self, message: str, image_path: str = None, depth: int = 0):
+        """
+        Args:
+            message (str): The user's message (not the assembled prompt)
+            image_path (str, optional): Attached image
+            depth (int): Messages of conversation history before this one
+        """
+        self.words = len(message.split())
+        self.has_code = bool(CODE_PATTERN.search(message))
+        self.has_image = bool(image_path)
+        self.depth = depth
+        self.reasoning = bool(REASONING_PATTERN.search(message))
+
+class Route:
+    """A class of requests, the model that serves it and its latency objective."""
+
+    def __init__(self, name: str, model: str, slo: float):
+        """
+        Args:
+            name (str): Route name (LIGHT or STRONG)
+            model (str): Preferred model for the route
+            slo (float): Target p95 latency in seconds
+        """
+        self.name = name
+        self.model = model
+        self.slo = slo
+        self.requests = 0
+        self.rerouted = 0
+
+class ModelStats:
+    """Recent latency and outcome samples for one model."""
+
+    def __init__(self, window: float):
+        self.window = window
+        self.samples = deque()  # (time, seconds, ok)
+
+    def add(self, seconds: float, ok: bool):
+        self.samples.append((time.monotonic(), seconds, ok))
+
+    def prune(self):
+        cutoff = time.monotonic() - self.window
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+
+    def summary(self) -> Dict[str, Any]:
+        self.prune()
+        latencies = sorted(seconds for _, seconds, ok in self.samples if ok)
+        errors = sum(1 for _, _, ok in self.samples if not ok)
+
+        def percentile(fraction):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] if latencies else None
+
+        return {
+            "samples": len(self.samples),
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "error_rate": errors / len(self.samples) if self.samples else 0.0,
+        }
+
+class ModelRouter:
+    """
+    Picks a model per request.
+
+    Requests are classified from cheap features: code, images, long messages,
+    deep conversations and reasoning-style questions go to the strong route,
+    everything else to the light route. Each route prefers its own model, but
+    when that model's recent p95 latency breaks the route's SLO or its error
+    rate is too high, the request goes to the other route's model if that one
+    is doing better. Samples older than the window are forgotten, so a slow
+    model is tried again once it has been left alone for a while.
+    """
+
+    LONG_MESSAGE_WORDS = 150
+    DEEP_CONVERSATION = 8
+    MIN_SAMPLES = 5
+    MAX_ERROR_RATE = 0.2
+
+    def __init__(self, routes: List[Route], window: float = 300.0):
+        """
+        Initialize the router.
+
+        Args:
+            routes (list): Route for LIGHT and STRONG
+            window (float): Seconds of latency and error history to learn from
+        """
+        self.routes = {route.name: route for route in routes}
+        if set(self.routes) != {LIGHT, STRONG}:
+            raise ValueError("ModelRouter needs a light and a strong route")
+        self.window = window
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def models(self) -> List[str]:
+        """Models the router may choose."""
+        return sorted({route.model for route in self.routes.values()})
+
+    def classify(self, features: RequestFeatures) -> str:
+        """Route name for a request."""
+        if (features.has_code or features.has_image or features.reasoning
+                or features.words > self.LONG_MESSAGE_WORDS or features.depth >= self.DEEP_CONVERSATION):
+            return STRONG
+        return LIGHT
+
+    def _model_stats(self, model: str) -> ModelStats:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = ModelStats(self.window)
+        return stats
+
+    def _within_slo(self, model: str, slo: float) -> Optional[bool]:
+        """Whether a model currently meets an SLO (None if there is too little data to say)."""
+        summary = self._model_stats(model).summary()
+        if summary["samples"] < self.MIN_SAMPLES:
+            return None
+        if summary["error_rate"] > self.MAX_ERROR_RATE:
+            return False
+        return summary["p95"] is not None and summary["p95"] <= slo
+
+    def choose(self, message: str, image_path: str = None, depth: int = 0) -> str:
+        """
+        Pick the model for a request.
+
+        Args:
+            message (str): The user's message
+            image_path (str, optional): Attached image
+            depth (int): Messages of conversation history before this one
+
+        Returns:
+            str: Model name
+        """
+        route = self.routes[self.classify(RequestFeatures(message, image_path, depth))]
+        with self._lock:
+            route.requests += 1
+            if self._within_slo(route.model, route.slo) is not False:
+                return route.model
+
+            # The preferred model is too slow or failing; use another that isn't
+            for other in self.routes.values():
+                if other.model != route.model and self._within_slo(other.model, route.slo) is not False:
+                    route.rerouted += 1
+                    return other.model
+            return route.model
+
+    def record(self, model: str, seconds: float, ok: bool = True):
+        """Record how a call to a model went."""
+        with self._lock:
+            self._model_stats(model).add(seconds, ok)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Routes with their SLO and reroute counts, and recent stats per model."""
+        with self._lock:
+            return {
+                "routes": {
+                    route.name: {
+                        "model": route.model,
+                        "slo": route.slo,
+                        "requests": route.requests,
+                        "rerouted": route.rerouted,
+                    }
+                    for route in self.routes.values()
+                },
+                "models": {model: self._model_stats(model).summary() for model in self.models()},
+            }
+
+def create_model_router() -> Optional[ModelRouter]:
+    """
+    Create the router from environment variables, or None if MODEL_ROUTING=off.
+
+    GEMINI_LIGHT_MODEL / GEMINI_STRONG_MODEL name the models and
+    LIGHT_ROUTE_SLO / STRONG_ROUTE_SLO their p95 latency targets in seconds.
+    """
+    if os.getenv("MODEL_ROUTING", "on").lower() in ("off", "false", "0"):
+        return None
+    return ModelRouter([
+        Route(LIGHT, os.getenv("GEMINI_LIGHT_MODEL", "gemini-2.5-flash-lite"), float(os.getenv("LIGHT_ROUTE_SLO", "4"))),
+        Route(STRONG, os.getenv("GEMINI_STRONG_MODEL", "gemini-2.5-flash"), float(os.getenv("STRONG_ROUTE_SLO", "20"))),
+    ])
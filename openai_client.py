@@ -0,0 +1,129 @@
+import base64
+import json
+import mimetypes
+from typing import Iterator
+
+import requests
+
+from llm_providers import LLMProvider, ProviderError, ProviderRequest
+
+class OpenAICompatibleProvider(LLMProvider):
+    """
+    Provider for any OpenAI-compatible chat completions endpoint
+    (OpenAI itself, Azure-style gateways, vLLM, Ollama, LM Studio...).
+    """
+
+    def __init__(self, api_key: str, base_url: str = "https://api.openai.com/v1", model_name: str = "gpt-4o-mini",
+                 name: str = None, tier: int = 0, timeout: float = 60.0):
+        """
+        Initialize the provider.
+
+        Args:
+            api_key (str): API key sent as a bearer token
+            base_url (str): Endpoint root; /chat/completions is appended
+            model_name (str): Model to request
+            name (str, optional): Unique provider name (defaults to model@host)
+            tier (int): Routing preference (see LLMProvider)
+            timeout (float): Seconds to wait for a response
+        """
+        super().__init__(name or f"{model_name}@{base_url.split('//')[-1].split('/')[0]}", model_name, tier)
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        # One session per provider keeps connections to the endpoint alive
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
+
+    def _messages(self, request: ProviderRequest) -> list:
+        if not request.image_path:
+            return [{"role": "user", "content": request.prompt}]
+
+        try:
+            with open(request.image_path, "rb") as f:
+                encoded = base64.b64encode(f.read()).decode("ascii")
+        except OSError as e:
+            raise ProviderError(f"Failed to load image: {e}", kind=ProviderError.INVALID, provider=self.name)
+        mime_type = mimetypes.guess_type(request.image_path)[0] or "image/jpeg"
+        return [{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": request.prompt},
+                {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{encoded}"}},
+            ],
+        }]
+
+    def _payload(self, request: ProviderRequest, stream: bool) -> dict:
+        payload = {"model": self.model_name, "messages": self._messages(request), "stream": stream}
+        config = request.config
+        if "temperature" in config:
+            payload["temperature"] = config["temperature"]
+        if "top_p" in config:
+            payload["top_p"] = config["top_p"]
+        if "max_output_tokens" in config:
+            payload["max_tokens"] = config["max_output_tokens"]
+        return payload
+
+    def _post(self, request: ProviderRequest, stream: bool) -> requests.Response:
+        try:
+            response = self.session.post(
+                f"{self.base_url}/chat/completions",
+                json=self._payload(request, stream),
+                timeout=self.timeout,
+                stream=stream
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise ProviderError(str(e), kind=ProviderError.UNAVAILABLE, provider=self.name)
+
+        if response.status_code >= 400:
+            raise self._error_for(response)
+        return response
+
+    def _error_for(self, response: requests.Response) -> ProviderError:
+        """Classify an HTTP error response."""
+        try:
+            message = response.json().get("error", {}).get("message") or response.text
+        except ValueError:
+            message = response.text
+        message = f"HTTP {response.status_code}: {message[:200]}"
+
+        status = response.status_code
+        if status == 429:
+            retry_after = response.headers.get("Retry-After")
+            try:
+                retry_after = float(retry_after) if retry_after else None
+            except ValueError:
+                retry_after = None
+            return ProviderError(message, kind=ProviderError.QUOTA, provider=self.name, retry_after=retry_after)
+        if status in (401, 403):
+            return ProviderError(message, kind=ProviderError.AUTH, provider=self.name)
+        if status >= 500 or status == 408:
+            return ProviderError(message, kind=ProviderError.UNAVAILABLE, provider=self.name)
+        return ProviderError(message, kind=ProviderError.INVALID, provider=self.name)
+
+    def generate(self, request: ProviderRequest) -> str:
+        response = self._post(request, stream=False)
+        try:
+            return response.json()["choices"][0]["message"]["content"] or ""
+        except (ValueError, KeyError, IndexError) as e:
+            raise ProviderError(f"Malformed response: {e}", kind=ProviderError.UNAVAILABLE, provider=self.name)
+
+    def stream(self, request: ProviderRequest) -> Iterator[str]:
+        response = self._post(request, stream=True)
+        with response:
+            try:
+                # Server-sent events: "data: {...}" lines, ending with "data: [DONE]"
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        return
+                    if request.cancel.is_set():
+                        raise ProviderError("Request cancelled", kind=ProviderError.CANCELLED, provider=self.name)
+                    choices = json.loads(data).get("choices") or [{}]
+                    text = choices[0].get("delta", {}).get("content")
+                    if text:
+                        yield text
+            except (requests.ConnectionError, requests.Timeout) as e:
+                raise ProviderError(str(e), kind=ProviderError.UNAVAILABLE, provider=self.name)
+            except ValueError as e:
+                raise ProviderError(f"Malformed stream: {e}", kind=ProviderError.UNAVAILABLE, provider=self.name)
@@ -0,0 +1,252 @@
+import contextvars
+import cProfile
+import functools
+import io
+import os
+import pstats
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional
+
+# Instrumentation is decided once at import: when it is off, timed() returns
+# functions unchanged and step() a shared no-op context, so there is no cost
+ENABLED = os.getenv("CHATBOT_PROFILE", "").lower() in ("1", "on", "true")
+
+# Where profile_call() writes its reports
+PROFILE_DIR = os.getenv("CHATBOT_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "chatbot_profiles"))
+
+_NULL_STEP = nullcontext()
+_local = threading.local()
+_lock = threading.Lock()
+
+# Timings outside a rerun (model calls on worker threads, fragment reruns) and
+# reports written by profile_call(), kept per session so a session only sees its own
+MAX_SESSIONS = 100
+_activity = OrderedDict()  # session -> deque of recordings, newest last
+_profiles = OrderedDict()  # session -> deque of reports, newest last
+
+# The session the current work is for. Worker threads inherit it through the
+# copied context of the request that started them; on script threads it comes
+# from session_resolver, which the app sets (it returns None off script threads)
+_session = contextvars.ContextVar("profiling_session", default=None)
+session_resolver = None
+
+class Recording:
+    """Timed steps of one rerun or request, as offsets from its start."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = datetime.now().strftime("%H:%M:%S")
+        self.start = time.perf_counter()
+        self.spans = []  # (name, start offset s, duration s, depth)
+        self.depth = 0
+        self.last_mark = self.start
+        self.duration = None
+
+    def add(self, name: str, start: float, duration: float, depth: int):
+        self.spans.append((name, start - self.start, duration, depth))
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            # Steps are recorded as they end; show them in start order
+            "spans": sorted(self.spans, key=lambda span: span[1]),
+        }
+
+def current_session() -> Optional[str]:
+    """The session the current thread is working for, if known."""
+    session = _session.get()
+    if session is None and session_resolver is not None:
+        session = session_resolver()
+    return session
+
+def set_session(session_id: Optional[str]):
+    """Attribute this thread's activity, and requests it starts, to a session."""
+    _session.set(session_id)
+
+def _remember(store: OrderedDict, session: Optional[str], entry: Dict[str, Any], maxlen: int):
+    with _lock:
+        entries = store.get(session)
+        if entries is None:
+            entries = store[session] = deque(maxlen=maxlen)
+            if len(store) > MAX_SESSIONS:
+                store.popitem(last=False)
+        else:
+            store.move_to_end(session)
+        entries.append(entry)
+
+def record_activity(recording: Dict[str, Any], session: str = None):
+    """Add a finished recording (e.g. from a worker process) to a session's recent activity."""
+    _remember(_activity, session, recording, 50)
+
+def recent_activity(session: str = None) -> List[Dict[str, Any]]:
+    """A session's recordings outside reruns, newest last."""
+    with _lock:
+        return list(_activity.get(session, ()))
+
+def recent_profiles(session: str = None) -> List[Dict[str, Any]]:
+    """A session's profile_call() reports, newest last."""
+    with _lock:
+        return list(_profiles.get(session, ()))
+
+def begin_rerun(name: str = "rerun"):
+    """Start recording this thread's steps (call at the top of the script)."""
+    if ENABLED:
+        _local.recording = Recording(name)
+
+def end_rerun() -> Optional[Dict[str, Any]]:
+    """Stop recording this thread's steps and return the waterfall (None when off)."""
+    recording = getattr(_local, "recording", None)
+    if recording is None:
+        return None
+    _local.recording = None
+    recording.finish()
+    return recording.to_dict()
+
+def mark(name: str):
+    """Record the time since the previous mark (or the rerun start) as a top-level step."""
+    recording = getattr(_local, "recording", None) if ENABLED else None
+    if recording is None:
+        return
+    now = time.perf_counter()
+    recording.add(name, recording.last_mark, now - recording.last_mark, 0)
+    recording.last_mark = now
+
+@contextmanager
+def _timed_step(name: str):
+    recording = getattr(_local, "recording", None)
+    top_level = recording is None
+    if top_level:
+        # Not inside a rerun: this step is its own entry in recent_activity,
+        # and requests it starts on other threads belong to the same session
+        recording = _local.recording = Recording(name)
+        session = current_session()
+        token = _session.set(session)
+    depth = recording.depth
+    recording.depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recording.depth -= 1
+        recording.add(name, start, time.perf_counter() - start, depth)
+        if top_level:
+            _local.recording = None
+            _session.reset(token)
+            recording.finish()
+            record_activity(recording.to_dict(), session)
+
+@contextmanager
+def capture(name: str):
+    """
+    Record a block's steps without storing them, e.g. in a worker process
+    whose activity would otherwise never reach the app.
+
+    Yields:
+        Recording: Call to_dict() after the block (None when off)
+    """
+    if not ENABLED:
+        yield None
+        return
+    previous = getattr(_local, "recording", None)
+    recording = _local.recording = Recording(name)
+    try:
+        yield recording
+    finally:
+        _local.recording = previous
+        recording.finish()
+
+def step(name: str):
+    """Context manager timing a block as a step of the current rerun or request."""
+    return _timed_step(name) if ENABLED else _NULL_STEP
+
+def timed(name: str = None) -> Callable:
+    """
+    Decorator timing every call of a function as a step.
+
+    Args:
+        name (str, optional): Step name (defaults to the function's qualified name)
+    """
+    def decorator(fn):
+        if not ENABLED:
+            return fn
+        step_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _timed_step(step_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def profile_call(fn: Callable, *args, label: str = "request", **kwargs):
+    """
+    Run one call under a profiler and save the report.
+
+    Uses pyinstrument when installed (an HTML report), otherwise cProfile
+    (a .prof file for snakeviz and friends, plus a text summary).
+
+    Returns:
+        The call's return value
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    session = current_session()
+    stem = os.path.join(PROFILE_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{label}")
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        Profiler = None
+
+    if Profiler is not None:
+        profiler = Profiler()
+        profiler.start()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.stop()
+            path = f"{stem}.html"
+            with open(path, "w") as f:
+                f.write(profiler.output_html())
+            _remember(_profiles, session, {"label": label, "path": path, "summary": profiler.output_text()}, 10)
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+        path = f"{stem}.prof"
+        profiler.dump_stats(path)
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(25)
+        _remember(_profiles, session, {"label": label, "path": path, "summary": summary.getvalue()}, 10)
+
+def format_waterfall(recording: Dict[str, Any], width: int = 30) -> str:
+    """Render a recording as a text waterfall: one bar per step, placed by start time."""
+    total = recording["duration"] or max((start + duration for _, start, duration, _ in recording["spans"]), default=0)
+    lines = [f"{recording['name']} at {recording['started_at']}: {total * 1000:.1f} ms"]
+    for name, start, duration, depth in recording["spans"]:
+        offset = int(start / total * width) if total else 0
+        length = max(1, int(duration / total * width)) if total else 1
+        bar = " " * offset + "█" * min(length, width - offset)
+        lines.append(f"{bar:<{width}} {duration * 1000:>8.1f} ms  {'  ' * depth}{name}")
+    return "\n".join(lines)
+
+def slowest_steps(recordings: List[Dict[str, Any]], limit: int = 5) -> List[tuple]:
+    """Steps with the most total time across recordings, as (name, total seconds, calls)."""
+    totals = {}
+    for recording in recordings:
+        for name, _, duration, _ in recording["spans"]:
+            total, calls = totals.get(name, (0.0, 0))
+            totals[name] = (total + duration, calls + 1)
+    return sorted(((name, total, calls) for name, (total, calls) in totals.items()),
+                  key=lambda item: item[1], reverse=True)[:limit]
@@ -0,0 +1,194 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Any, Optional
+
+class RequestHedger:
+    """
+    Cuts tail latency by racing a second copy of slow calls.
+
+    A call that has not finished within the given percentile of recent
+    latencies (tracked per key, e.g. per model) is "hedged": an identical
+    call is started and whichever finishes first wins. The loser is
+    cancelled. At most max_hedge_fraction of recent calls may be hedged,
+    so a slow backend is not hit with double the traffic.
+    """
+
+    def __init__(self, percentile: float = 0.95, max_hedge_fraction: float = 0.1, min_samples: int = 20,
+                 window: int = 200, max_workers: int = 64):
+        """
+        Initialize the hedger.
+
+        Args:
+            percentile (float): Latency percentile after which a call is hedged
+            max_hedge_fraction (float): Highest share of recent calls that may be hedged
+            min_samples (int): Latencies needed for a key before it is hedged at all
+            window (int): Recent latencies (per key) and calls kept for the threshold and budget
+            max_workers (int): Threads running the raced calls
+        """
+        self.percentile = percentile
+        self.max_hedge_fraction = max_hedge_fraction
+        self.min_samples = min_samples
+        self.window = window
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._recent_hedged = deque(maxlen=window)
+        self._counts = {"calls": 0, "hedged": 0, "hedge_wins": 0, "over_budget": 0}
+        self._latency_saved = 0.0
+
+    def threshold(self, key: str) -> Optional[float]:
+        """Seconds after which a call for key is hedged (None until there are enough samples)."""
+        with self._lock:
+            latencies = self._latencies.get(key)
+            if not latencies or len(latencies) < self.min_samples:
+                return None
+            ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+
+    def _record_latency(self, key: str, seconds: float):
+        with self._lock:
+            latencies = self._latencies.get(key)
+            if latencies is None:
+                latencies = self._latencies[key] = deque(maxlen=self.window)
+            latencies.append(seconds)
+
+    def _take_budget(self) -> bool:
+        """Whether one more hedge fits the budget (and count it if so)."""
+        with self._lock:
+            hedged = sum(self._recent_hedged)
+            if hedged + 1 > self.max_hedge_fraction * (len(self._recent_hedged) + 1):
+                self._counts["over_budget"] += 1
+                return False
+            self._counts["hedged"] += 1
+            return True
+
+    def _finish(self, hedged: bool):
+        with self._lock:
+            self._recent_hedged.append(hedged)
+
+    def _timed(self, key: str, fn: Callable, ended: list):
+        start = time.monotonic()
+        try:
+            result = fn()
+        finally:
+            ended.append(time.monotonic())
+        # Failed and cancelled attempts would drag the threshold down
+        self._record_latency(key, ended[0] - start)
+        return result
+
+    def run(self, key: str, call: Callable[[], Any], cancel: Callable[[Any], None] = None) -> Any:
+        """
+        Run a call, hedging it if it is slow.
+
+        Args:
+            key (str): Latency class of the call (calls are compared with others of the same key)
+            call (callable): Starts one attempt; called again for the hedge. Returns
+                (attempt handle, callable producing the result), so the loser can be cancelled
+            cancel (callable, optional): Cancels an attempt given its handle
+
+        Returns:
+            The first successful attempt's result; if both attempts fail, the error is raised
+        """
+        with self._lock:
+            self._counts["calls"] += 1
+
+        primary_handle, primary_fn = call()
+        primary_end = []
+        primary_start = time.monotonic()
+        # Each attempt runs in a copy of the caller's context, so both belong to its trace
+        primary = self._pool.submit(contextvars.copy_context().run, self._timed, key, primary_fn, primary_end)
+
+        threshold = self.threshold(key)
+        done, _ = wait([primary], timeout=threshold) if threshold is not None else ([primary], None)
+        if done or not self._take_budget():
+            self._finish(hedged=False)
+            return primary.result()
+        self._finish(hedged=True)
+
+        hedge_handle, hedge_fn = call()
+        hedge_end = []
+        hedge = self._pool.submit(contextvars.copy_context().run, self._timed, key, hedge_fn, hedge_end)
+        handles = {primary: primary_handle, hedge: hedge_handle}
+
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for winner in done:
+                if winner.exception() is not None:
+                    error = error or winner.exception()
+                    continue
+
+                for loser in pending:
+                    loser.cancel()
+                    if cancel is not None:
+                        cancel(handles[loser])
+                if winner is hedge:
+                    with self._lock:
+                        self._counts["hedge_wins"] += 1
+                    winner_end = time.monotonic()
+                    primary.add_done_callback(
+                        lambda _, end=winner_end: self._add_saved(key, primary, primary_start, primary_end, end)
+                    )
+                return winner.result()
+        raise error
+
+    def _add_saved(self, key: str, primary, primary_start: float, primary_end: list, winner_end: float):
+        """Add the time a winning hedge saved over its primary."""
+        if not primary.cancelled() and primary.exception() is None:
+            # The primary ran to completion, so the saving can be measured
+            saved = primary_end[0] - winner_end
+        else:
+            # The primary stopped at the cancel: estimate when it would have finished
+            # from recent calls that took longer than it had been running
+            elapsed = winner_end - primary_start
+            with self._lock:
+                slower = [seconds for seconds in self._latencies.get(key, ()) if seconds > elapsed]
+            saved = sum(slower) / len(slower) - elapsed if slower else 0.0
+        with self._lock:
+            self._latency_saved += max(0.0, saved)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Calls, hedge rate, how often the hedge won and latency saved by hedging.
+
+        latency_saved_seconds is measured where the losing primary ran to
+        completion and estimated from recent latencies where it was cancelled.
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            saved = self._latency_saved
+            thresholds = {}
+            for key, latencies in self._latencies.items():
+                ordered = sorted(latencies)
+                if len(ordered) >= self.min_samples:
+                    thresholds[key] = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+        return {
+            **counts,
+            "hedge_rate": counts["hedged"] / counts["calls"] if counts["calls"] else 0.0,
+            "hedge_win_rate": counts["hedge_wins"] / counts["hedged"] if counts["hedged"] else 0.0,
+            "latency_saved_seconds": saved,
+            "thresholds": thresholds,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+def create_request_hedger() -> Optional[RequestHedger]:
+    """
+    Create a hedger from environment variables, or None unless GEMINI_HEDGING=on.
+
+    HEDGE_PERCENTILE (default 95) sets when a call is hedged and
+    HEDGE_MAX_FRACTION (default 0.1) the share of calls that may be.
+    """
+    if os.getenv("GEMINI_HEDGING", "off").lower() not in ("on", "true", "1"):
+        return None
+    return RequestHedger(
+        percentile=float(os.getenv("HEDGE_PERCENTILE", "95")) / 100,
+        max_hedge_fraction=float(os.getenv("HEDGE_MAX_FRACTION", "0.1"))
+    )
@@ -0,0 +1,306 @@
+import contextvars
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional, Dict, Any
+
+# Priority classes, highest first; a class is only served when all higher ones are empty
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+class RequestRejected(Exception):
+    """Raised through a request's future when it waited in the queue too long."""
+
+class _Task:
+    __slots__ = ("fn", "args", "kwargs", "future", "session_id", "priority", "cost", "enqueued_at", "context")
+
+    def __init__(self, fn, args, kwargs, session_id, priority, cost):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.session_id = session_id
+        self.priority = priority
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+        # Run in the submitter's context, so its trace continues on the worker thread
+        self.context = contextvars.copy_context()
+
+class _SessionStats:
+    __slots__ = ("submitted", "completed", "failed", "rejected", "cancelled", "queued", "running",
+                 "wait_seconds", "service_seconds", "last_active")
+
+    def __init__(self):
+        self.submitted = self.completed = self.failed = self.rejected = self.cancelled = 0
+        self.queued = self.running = 0
+        self.wait_seconds = self.service_seconds = 0.0
+        self.last_active = time.monotonic()
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__ if name != "last_active"}
+
+class RequestScheduler:
+    """
+    Process-wide fair scheduler for model requests.
+
+    Requests are queued per priority class and, within a class, per session.
+    Sessions take turns by deficit round-robin: each turn a session earns
+    quantum * weight credit and may dispatch requests while their cost fits
+    its credit. One session flooding the queue therefore only delays its
+    own requests. Interactive requests always go before background ones,
+    and a request still queued after max_queue_wait seconds is rejected
+    with RequestRejected instead of waiting indefinitely. A session's
+    counters are dropped once it has had nothing queued or running for
+    stats_ttl seconds.
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_queue_wait: float = 30.0, quantum: float = 1.0,
+                 session_weights: Optional[Dict[str, float]] = None, stats_ttl: float = 600.0):
+        """
+        Initialize the scheduler and start its dispatcher thread.
+
+        Args:
+            max_concurrent (int): Requests running at once
+            max_queue_wait (float): Seconds a request may wait before it is rejected
+            quantum (float): Credit a session earns per turn (in request cost units)
+            session_weights (dict, optional): Relative share per session id (default 1.0)
+            stats_ttl (float): Seconds an idle session's counters are kept in metrics()
+        """
+        if not max_queue_wait > 0:
+            raise ValueError(f"max_queue_wait must be positive, got {max_queue_wait!r}")
+        for session_id, weight in (session_weights or {}).items():
+            self._check_weight(session_id, weight)
+        self.max_concurrent = max_concurrent
+        self.max_queue_wait = max_queue_wait
+        self.quantum = quantum
+        self.session_weights = dict(session_weights or {})
+        self.stats_ttl = stats_ttl
+
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="scheduler")
+        self._condition = threading.Condition()
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}  # session -> deque of tasks
+        self._deficits = {priority: {} for priority in PRIORITIES}
+        self._running = 0
+        self._shutdown = False
+        self._stats = {}
+        self._next_eviction = time.monotonic() + stats_ttl
+        self._recent_waits = deque(maxlen=1000)
+
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="scheduler-dispatch", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, fn: Callable, *args, session_id: str = "default", priority: str = INTERACTIVE,
+               cost: float = 1.0, **kwargs) -> Future:
+        """
+        Queue a call.
+
+        Args:
+            fn (callable): Function to run, e.g. GeminiClient.get_text_response
+            *args, **kwargs: Arguments for fn
+            session_id (str): Session the request is charged to
+            priority (str): INTERACTIVE or BACKGROUND
+            cost (float): Relative cost, e.g. 1 for chat and more for large images
+
+        Returns:
+            Future: Resolves to fn's return value, or raises RequestRejected
+        """
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority: {priority}")
+        # A session without positive weight would never earn credit and stall the dispatcher
+        self._check_weight(session_id, self.session_weights.get(session_id, 1.0))
+
+        task = _Task(fn, args, kwargs, session_id, priority, cost)
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Scheduler has been shut down")
+            queue = self._queues[priority].get(session_id)
+            if queue is None:
+                queue = self._queues[priority][session_id] = deque()
+            queue.append(task)
+
+            stats = self._session_stats(session_id)
+            stats.submitted += 1
+            stats.queued += 1
+            self._condition.notify()
+        return task.future
+
+    def run(self, fn: Callable, *args, session_id: str = "default", priority: str = INTERACTIVE,
+            cost: float = 1.0, **kwargs):
+        """Queue a call and wait for its result (raises RequestRejected if it waited too long)."""
+        return self.submit(fn, *args, session_id=session_id, priority=priority, cost=cost, **kwargs).result()
+
+    def set_weight(self, session_id: str, weight: float):
+        """
+        Change a session's relative share; it applies from the session's next turn.
+
+        Raises:
+            ValueError: If weight is not positive
+        """
+        self._check_weight(session_id, weight)
+        with self._condition:
+            self.session_weights[session_id] = weight
+
+    @staticmethod
+    def _check_weight(session_id: str, weight: float):
+        if not weight > 0:
+            raise ValueError(f"Session weight must be positive, got {weight!r} for session {session_id!r}")
+
+    def _session_stats(self, session_id: str) -> _SessionStats:
+        stats = self._stats.get(session_id)
+        if stats is None:
+            stats = self._stats[session_id] = _SessionStats()
+        stats.last_active = time.monotonic()
+        return stats
+
+    def _evict_idle_stats(self, now: float):
+        """Drop counters of sessions with nothing queued or running for stats_ttl seconds."""
+        if now < self._next_eviction:
+            return
+        self._next_eviction = now + min(60.0, self.stats_ttl)
+        for session_id in [session_id for session_id, stats in self._stats.items()
+                           if not stats.queued and not stats.running and now - stats.last_active > self.stats_ttl]:
+            del self._stats[session_id]
+
+    def _expire(self, now: float):
+        """Reject queued requests that have waited longer than max_queue_wait."""
+        for priority in PRIORITIES:
+            queues = self._queues[priority]
+            for session_id in list(queues):
+                queue = queues[session_id]
+                while queue and now - queue[0].enqueued_at > self.max_queue_wait:
+                    task = queue.popleft()
+                    stats = self._session_stats(session_id)
+                    stats.queued -= 1
+                    if task.future.set_running_or_notify_cancel():
+                        stats.rejected += 1
+                        task.future.set_exception(RequestRejected(
+                            f"Request waited more than {self.max_queue_wait:.0f}s in the queue"
+                        ))
+                    else:
+                        stats.cancelled += 1
+                if not queue:
+                    del queues[session_id]
+                    self._deficits[priority].pop(session_id, None)
+
+    def _next_task(self) -> Optional[_Task]:
+        """Pick the next request by priority, then deficit round-robin across sessions."""
+        for priority in PRIORITIES:
+            queues = self._queues[priority]
+            deficits = self._deficits[priority]
+            while queues:
+                # The session at the front of the rotation gets the next turn
+                session_id, queue = next(iter(queues.items()))
+                deficit = deficits.get(session_id, 0.0)
+                if deficit < queue[0].cost:
+                    deficit += self.quantum * self.session_weights.get(session_id, 1.0)
+
+                if queue[0].cost <= deficit:
+                    task = queue.popleft()
+                    deficit -= task.cost
+                    self._session_stats(session_id).queued -= 1
+                    if not queue:
+                        # An idle session does not bank credit
+                        del queues[session_id]
+                        deficits.pop(session_id, None)
+                    else:
+                        deficits[session_id] = deficit
+                        if deficit < queue[0].cost:
+                            queues.move_to_end(session_id)
+                    if task.future.set_running_or_notify_cancel():
+                        return task
+                    self._session_stats(session_id).cancelled += 1
+                    continue
+
+                # Not enough credit yet: keep it and move to the back of the rotation
+                deficits[session_id] = deficit
+                queues.move_to_end(session_id)
+        return None
+
+    def _dispatch_loop(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._shutdown:
+                        return
+                    now = time.monotonic()
+                    self._expire(now)
+                    self._evict_idle_stats(now)
+                    task = self._next_task() if self._running < self.max_concurrent else None
+                    if task is not None:
+                        break
+                    # Wake up at least often enough to reject requests on time
+                    self._condition.wait(timeout=min(1.0, self.max_queue_wait / 4))
+
+                self._running += 1
+                wait = time.monotonic() - task.enqueued_at
+                self._recent_waits.append(wait)
+                stats = self._session_stats(task.session_id)
+                stats.running += 1
+                stats.wait_seconds += wait
+            self._pool.submit(self._run_task, task)
+
+    def _run_task(self, task: _Task):
+        start = time.monotonic()
+        try:
+            result = task.context.run(task.fn, *task.args, **task.kwargs)
+        except BaseException as e:
+            task.future.set_exception(e)
+            failed = True
+        else:
+            task.future.set_result(result)
+            # Result dicts report API errors rather than raising
+            failed = isinstance(result, dict) and result.get("success") is False
+
+        with self._condition:
+            self._running -= 1
+            stats = self._session_stats(task.session_id)
+            stats.running -= 1
+            stats.service_seconds += time.monotonic() - start
+            if failed:
+                stats.failed += 1
+            else:
+                stats.completed += 1
+            self._condition.notify()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Snapshot of queue state and per-session usage.
+
+        Returns:
+            dict: running, queue depth per priority, wait percentiles over the
+            last 1000 dispatches, and per-session counters with service time
+        """
+        with self._condition:
+            waits = sorted(self._recent_waits)
+            sessions = {session_id: stats.to_dict() for session_id, stats in self._stats.items()}
+            queued = {
+                priority: sum(len(queue) for queue in self._queues[priority].values())
+                for priority in PRIORITIES
+            }
+            running = self._running
+
+        def percentile(fraction):
+            return waits[min(len(waits) - 1, int(len(waits) * fraction))] if waits else 0.0
+
+        return {
+            "running": running,
+            "max_concurrent": self.max_concurrent,
+            "queued": queued,
+            "wait_p50": percentile(0.5),
+            "wait_p95": percentile(0.95),
+            "sessions": sessions,
+        }
+
+    def shutdown(self, wait: bool = False):
+        """Stop dispatching; queued requests are cancelled."""
+        with self._condition:
+            self._shutdown = True
+            for priority in PRIORITIES:
+                for queue in self._queues[priority].values():
+                    for task in queue:
+                        task.future.cancel()
+                self._queues[priority].clear()
+            self._condition.notify_all()
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,226 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+from typing import List, Tuple, Optional, Dict, Any
+from urllib.parse import urlparse
+
+from database import DatabaseManager
+
+try:
+    import fcntl
+except ImportError:
+    # Not on Windows: without advisory locks only one process may use a FileSessionStore directory
+    fcntl = None
+
+# Session ids come from the URL, so only allow ids that are safe as file names
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def is_valid_session_id(session_id: str) -> bool:
+    """Whether a session id (e.g. from ?session=) is well formed."""
+    return bool(session_id) and bool(SESSION_ID_PATTERN.match(session_id))
+
+class SessionStore:
+    """
+    Where a browser session's state lives outside the Streamlit process.
+
+    A store holds two things per session id: the chat transcript (the
+    message methods below, the same interface Transcript uses on
+    DatabaseManager) and a small JSON-serializable dict of UI state.
+    Any replica pointed at the same store can resume a session by id.
+    """
+
+    def load_state(self, session_id: str) -> Dict[str, Any]:
+        """Get a session's UI state (empty if the session is new)."""
+        raise NotImplementedError
+
+    def save_state(self, session_id: str, state: Dict[str, Any]):
+        """Replace a session's UI state."""
+        raise NotImplementedError
+
+    def delete_session(self, session_id: str):
+        """Forget a session's UI state and transcript."""
+        raise NotImplementedError
+
+    def add_message(self, session_id: str, message_id: int, role: str, content: str, timestamp: str = None) -> bool:
+        raise NotImplementedError
+
+    def get_messages(self, session_id: str, before_id: int = None, limit: int = 50) -> List[Tuple]:
+        raise NotImplementedError
+
+    def get_message(self, session_id: str, message_id: int) -> Optional[Tuple]:
+        raise NotImplementedError
+
+    def get_message_bounds(self, session_id: str) -> Tuple[int, int]:
+        raise NotImplementedError
+
+    def clear_messages(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+class SQLiteSessionStore(SessionStore):
+    """Session store in the app's SQLite database; for a single node."""
+
+    def __init__(self, db: DatabaseManager):
+        self.db = db
+
+    def load_state(self, session_id: str) -> Dict[str, Any]:
+        state = self.db.get_session_state(session_id)
+        return json.loads(state) if state else {}
+
+    def save_state(self, session_id: str, state: Dict[str, Any]):
+        self.db.save_session_state(session_id, json.dumps(state))
+
+    def delete_session(self, session_id: str):
+        self.db.delete_session_state(session_id)
+        self.db.clear_messages(session_id)
+
+    def add_message(self, session_id, message_id, role, content, timestamp=None):
+        return self.db.add_message(session_id, message_id, role, content, timestamp)
+
+    def get_messages(self, session_id, before_id=None, limit=50):
+        return self.db.get_messages(session_id, before_id=before_id, limit=limit)
+
+    def get_message(self, session_id, message_id):
+        return self.db.get_message(session_id, message_id)
+
+    def get_message_bounds(self, session_id):
+        return self.db.get_message_bounds(session_id)
+
+    def clear_messages(self, session_id):
+        return self.db.clear_messages(session_id)
+
+def _lock_file(f, shared: bool):
+    """Lock a file until it is closed (a no-op where fcntl is unavailable)."""
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+class FileSessionStore(SessionStore):
+    """
+    Session store in a directory; a development stand-in for a shared service.
+
+    Each session gets a directory holding state.json (replaced atomically)
+    and messages.jsonl (append-only, guarded by flock), so several
+    processes on one host can use it at once. Every message read parses
+    the session's whole messages.jsonl, so cost grows with the length of
+    the conversation, and flock is unreliable on many network mounts and
+    missing on Windows. For production or several hosts use SQLite or a
+    real shared store instead.
+    """
+
+    def __init__(self, directory: str = None):
+        """
+        Initialize the store.
+
+        Args:
+            directory (str, optional): Root directory (defaults to tmp/chatbot_sessions)
+        """
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "chatbot_sessions")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _session_dir(self, session_id: str, create: bool = False) -> str:
+        if not is_valid_session_id(session_id):
+            raise ValueError(f"Invalid session id: {session_id!r}")
+        path = os.path.join(self.directory, session_id)
+        if create:
+            os.makedirs(path, exist_ok=True)
+        return path
+
+    def _messages_path(self, session_id: str, create: bool = False) -> str:
+        return os.path.join(self._session_dir(session_id, create), "messages.jsonl")
+
+    def load_state(self, session_id: str) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self._session_dir(session_id), "state.json")) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def save_state(self, session_id: str, state: Dict[str, Any]):
+        session_dir = self._session_dir(session_id, create=True)
+        # Write then rename, so readers never see a half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=session_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, os.path.join(session_dir, "state.json"))
+        except OSError as e:
+            print(f"Error saving session state: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def delete_session(self, session_id: str):
+        shutil.rmtree(self._session_dir(session_id), ignore_errors=True)
+
+    def _read_messages(self, session_id: str) -> Dict[int, Tuple]:
+        """All messages by id; a later line for the same id replaces an earlier one."""
+        messages = {}
+        try:
+            with open(self._messages_path(session_id)) as f:
+                _lock_file(f, shared=True)
+                for line in f:
+                    try:
+                        message_id, role, content, timestamp = json.loads(line)
+                    except ValueError:
+                        continue  # Torn write from a crashed process
+                    messages[message_id] = (message_id, role, content, timestamp)
+        except OSError:
+            pass
+        return messages
+
+    def add_message(self, session_id, message_id, role, content, timestamp=None):
+        try:
+            with open(self._messages_path(session_id, create=True), "a") as f:
+                _lock_file(f, shared=False)
+                f.write(json.dumps([message_id, role, content, timestamp]) + "\n")
+            return True
+        except OSError as e:
+            print(f"Error adding message: {e}")
+            return False
+
+    def get_messages(self, session_id, before_id=None, limit=50):
+        messages = self._read_messages(session_id)
+        ids = sorted(i for i in messages if before_id is None or i < before_id)
+        return [messages[i] for i in ids[-limit:]] if limit else []
+
+    def get_message(self, session_id, message_id):
+        return self._read_messages(session_id).get(message_id)
+
+    def get_message_bounds(self, session_id):
+        messages = self._read_messages(session_id)
+        return len(messages), max(messages, default=0)
+
+    def clear_messages(self, session_id):
+        try:
+            os.remove(self._messages_path(session_id))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error clearing messages: {e}")
+            return False
+        return True
+
+def create_session_store(url: str = None, db: DatabaseManager = None) -> SessionStore:
+    """
+    Create a session store from a URL.
+
+    Args:
+        url (str, optional): "sqlite" (default; the app database), "sqlite:///path/to.db"
+            or "file:///path/to/dir"
+        db (DatabaseManager, optional): App database used by plain "sqlite"
+
+    Returns:
+        SessionStore: The store
+    """
+    url = url or "sqlite"
+    parsed = urlparse(url)
+    scheme, path = (parsed.scheme, parsed.path) if parsed.scheme else (url, "")
+
+    if scheme == "sqlite":
+        if path:
+            return SQLiteSessionStore(DatabaseManager(path))
+        return SQLiteSessionStore(db or DatabaseManager())
+    if scheme == "file":
+        return FileSessionStore(path or None)
+
+    raise ValueError(f"Unknown session store: {url}")
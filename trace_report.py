@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Latency breakdown of traced chat turns, from the JSONL files written with
+TRACE_EXPORT=jsonl (see tracing.py).
+
+For every root span with the given name (by default "chat.turn", one per
+user turn) the report shows how long turns took, which stages (image
+preprocessing, model calls and attempts, database writes, speech) they
+spent their time in, how long a turn waited before its model call
+started, error rates and cache hit rates. Spans that ended after their
+turn (speech playback) are reported but not counted in the turn's share.
+
+Usage:
+    python trace_report.py /tmp/chatbot_traces/traces.jsonl*
+    python trace_report.py traces-*.jsonl --root api.chat --by model
+"""
+import argparse
+import glob
+import json
+from collections import defaultdict
+
+def load_spans(patterns: list) -> list:
+    spans = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        spans.append(json.loads(line))
+    return spans
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))] if sorted_values else 0.0
+
+def summarize(durations: list) -> str:
+    durations = sorted(durations)
+    return (f"{len(durations):>7}{percentile(durations, 0.5):>10.1f}{percentile(durations, 0.95):>10.1f}"
+            f"{percentile(durations, 0.99):>10.1f}")
+
+def report(spans: list, root_name: str, group_by: str = None):
+    traces = defaultdict(list)
+    for span in spans:
+        traces[span["trace_id"]].append(span)
+
+    roots = {trace_id: next((s for s in members if s["name"] == root_name and not s["parent_id"]), None)
+             for trace_id, members in traces.items()}
+    roots = {trace_id: root for trace_id, root in roots.items() if root is not None}
+    if not roots:
+        print(f"No '{root_name}' traces found in {len(spans)} spans")
+        return
+
+    header = f"{'':<34}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    groups = defaultdict(list)
+    for root in roots.values():
+        groups[str(root["attributes"].get(group_by, "-")) if group_by else root_name].append(root)
+    print(f"{len(roots)} '{root_name}' traces, {len(spans)} spans\n")
+    print(f"{header}{'errors':>8}")
+    print("-" * (len(header) + 8))
+    for group, members in sorted(groups.items()):
+        errors = sum(root["status"] == "error" for root in members)
+        print(f"{group:<34}{summarize([root['duration_ms'] for root in members])}{errors:>8}")
+
+    stage_durations = defaultdict(list)
+    stage_errors = defaultdict(int)
+    stage_in_turn = defaultdict(float)
+    cache_hits = defaultdict(lambda: [0, 0])
+    waits = []
+    total_turn_ms = sum(root["duration_ms"] for root in roots.values())
+    for trace_id, root in roots.items():
+        root_end = root["start_time"] + root["duration_ms"] / 1000
+        first_call = None
+        for span in traces[trace_id]:
+            if span is root:
+                continue
+            name = span["name"]
+            stage_durations[name].append(span["duration_ms"])
+            stage_errors[name] += span["status"] == "error"
+            if span["parent_id"] == root["span_id"] and span["start_time"] <= root_end:
+                stage_in_turn[name] += span["duration_ms"]
+            hit = span["attributes"].get("cache_hit", span["attributes"].get("image_cache"))
+            if hit is not None:
+                cache_hits[name][0] += hit in (True, "hit")
+                cache_hits[name][1] += 1
+            if name in ("llm.generate", "llm.stream") and (first_call is None or span["start_time"] < first_call):
+                first_call = span["start_time"]
+        if first_call is not None:
+            waits.append((first_call - root["start_time"]) * 1000)
+
+    print(f"\n{'stage':<34}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'of turn':>9}{'errors':>8}")
+    print("-" * 88)
+    for name, durations in sorted(stage_durations.items(), key=lambda item: -sum(item[1])):
+        share = f"{stage_in_turn[name] / total_turn_ms:.0%}" if stage_in_turn[name] else "-"
+        print(f"{name:<34}{summarize(durations)}{share:>9}{stage_errors[name]:>8}")
+    if waits:
+        print(f"{'(start to first model call)':<34}{summarize(waits)}")
+
+    if cache_hits:
+        print("\nCache hit rates:")
+        for name, (hits, total) in sorted(cache_hits.items()):
+            print(f"  {name:<32}{hits / total:>6.0%} of {total}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency breakdown of traced turns from JSONL span files")
+    parser.add_argument("files", nargs="+", help="JSONL span files (glob patterns allowed)")
+    parser.add_argument("--root", default="chat.turn", help="Name of the root span of a turn")
+    parser.add_argument("--by", help="Root attribute to group turn latency by, e.g. query_type or model")
+    args = parser.parse_args()
+    report(load_spans(args.files), args.root, args.by)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+import atexit
+import contextvars
+import functools
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Any, List, Optional
+
+# Where finished spans go: "jsonl" (TRACE_FILE), "otlp" (TRACE_OTLP_ENDPOINT) or off.
+# Decided once at import: when off, traced() returns functions unchanged and
+# span() a shared no-op context, so tracing costs nothing
+EXPORT = os.getenv("TRACE_EXPORT", "").lower()
+ENABLED = EXPORT in ("jsonl", "otlp")
+
+TRACE_DIR = os.getenv("CHATBOT_TRACE_DIR", os.path.join(tempfile.gettempdir(), "chatbot_traces"))
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join(TRACE_DIR, "traces.jsonl"))
+# The trace file is moved to TRACE_FILE + ".1" once it reaches this size
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_MB", "50")) * 1024 * 1024
+# Spans carry sizes, not what users typed or the model answered, unless this is set
+INCLUDE_CONTENT = os.getenv("TRACE_CONTENT", "").lower() in ("1", "on", "true")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "ai-chatbot")
+
+_NULL_CONTEXT = nullcontext()
+# The span new spans are children of; copied into worker threads by the
+# request scheduler, the hedger and the speech pipeline
+_current = contextvars.ContextVar("current_span", default=None)
+# Set by collect(): finished spans go to this list instead of the exporter
+_collector = contextvars.ContextVar("span_collector", default=None)
+
+class Span:
+    """One timed operation of a trace, with attributes such as bytes, tokens, cache hits and model."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_time", "_start", "duration",
+                 "attributes", "status", "error", "thread")
+
+    def __init__(self, name: str, trace_id: str = None, parent_id: str = None, attributes: Dict[str, Any] = None):
+        self.name = name
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+        self.attributes = {key: value for key, value in (attributes or {}).items() if value is not None}
+        self.status = "ok"
+        self.error = None
+        self.thread = threading.current_thread().name
+
+    def set(self, **attributes):
+        """Add or replace attributes (None values are skipped)."""
+        self.attributes.update((key, value) for key, value in attributes.items() if value is not None)
+
+    def end(self, error: str = None, status: str = None, **attributes):
+        """
+        Finish the span and hand it to the exporter. Later calls are ignored.
+
+        Args:
+            error (str, optional): Error message; marks the span as failed
+            status (str, optional): "ok", "error" or "cancelled" (default from error)
+            **attributes: Final attributes, e.g. tokens
+        """
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._start
+        self.set(**attributes)
+        if error:
+            self.error = str(error)
+        self.status = status or ("error" if error else "ok")
+        collector = _collector.get()
+        if collector is not None:
+            collector.append(self)
+        elif _exporter is not None:
+            _exporter.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "error": self.error,
+            "thread": self.thread,
+            "attributes": self.attributes,
+        }
+
+class _NoopSpan:
+    """Stands in for a span when tracing is off, so callers need no checks."""
+
+    trace_id = None
+
+    def set(self, **attributes):
+        pass
+
+    def end(self, error: str = None, status: str = None, **attributes):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class _RemoteParent(_NoopSpan):
+    """A span running in another process, as a parent for spans started here."""
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+def start_trace(name: str, **attributes) -> Span:
+    """
+    Start a new trace, e.g. for one user turn.
+
+    The span is not made current and not ended here: pass it to use_span()
+    wherever work for the trace happens (possibly over several reruns) and
+    call end() when the turn is over.
+
+    Returns:
+        Span: The root span (NOOP_SPAN when tracing is off)
+    """
+    return Span(name, attributes=attributes) if ENABLED else NOOP_SPAN
+
+def start_span(name: str, **attributes) -> Span:
+    """Start a child of the current span (a new trace if there is none) without making it current."""
+    if not ENABLED:
+        return NOOP_SPAN
+    parent = _current.get()
+    if parent is None:
+        return Span(name, attributes=attributes)
+    return Span(name, trace_id=parent.trace_id, parent_id=parent.span_id, attributes=attributes)
+
+@contextmanager
+def use_span(span: Optional[Span]):
+    """Make span current for a block without ending it (no-op for None and NOOP_SPAN)."""
+    if span is None or span is NOOP_SPAN:
+        yield span
+        return
+    token = _current.set(span)
+    try:
+        yield span
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def _span(name: str, attributes: Dict[str, Any]):
+    span = start_span(name, **attributes)
+    token = _current.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.end(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current.reset(token)
+        span.end()
+
+def span(name: str, **attributes):
+    """Context manager tracing a block as a child of the current span; exceptions mark it failed."""
+    return _span(name, attributes) if ENABLED else _NULL_CONTEXT
+
+def traced(name: str = None) -> Callable:
+    """
+    Decorator tracing every call of a function as a span.
+
+    Args:
+        name (str, optional): Span name (defaults to the function's qualified name)
+    """
+    def decorator(fn):
+        if not ENABLED:
+            return fn
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _span(span_name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def set_attributes(**attributes):
+    """Add attributes to the current span, if any."""
+    if ENABLED:
+        current = _current.get()
+        if current is not None:
+            current.set(**attributes)
+
+def set_content(**texts):
+    """Add message text (prompts, answers) to the current span, only if TRACE_CONTENT is on."""
+    if INCLUDE_CONTENT:
+        set_attributes(**texts)
+
+def current_span() -> Optional[Span]:
+    return _current.get() if ENABLED else None
+
+def current_trace_id() -> Optional[str]:
+    current = current_span()
+    return current.trace_id if current is not None else None
+
+def context() -> Optional[tuple]:
+    """The current span as (trace_id, span_id), to continue its trace in another process."""
+    current = current_span()
+    return (current.trace_id, current.span_id) if current is not None else None
+
+@contextmanager
+def collect(parent: tuple = None):
+    """
+    Keep the spans finished in a block in a list instead of exporting them.
+
+    For work in a worker process, whose exporter thread never runs: pass the
+    parent's context(), send the list back and export() it in the parent.
+    """
+    spans = []
+    if not ENABLED:
+        yield spans
+        return
+    collector_token = _collector.set(spans)
+    current_token = _current.set(_RemoteParent(*parent)) if parent else None
+    try:
+        yield spans
+    finally:
+        if current_token is not None:
+            _current.reset(current_token)
+        _collector.reset(collector_token)
+
+def export(spans: List[Span]):
+    """Export spans finished elsewhere (see collect())."""
+    if _exporter is not None:
+        for finished in spans:
+            _exporter.export(finished)
+
+class JSONLExporter:
+    """Append finished spans to a file, one JSON object per line, keeping one rotated file."""
+
+    def __init__(self, path: str, max_bytes: int = TRACE_FILE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _rotate(self):
+        try:
+            if os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+        except FileNotFoundError:
+            pass  # Not written yet, or another worker process just rotated it
+
+    def write(self, spans: List[Span]):
+        self._rotate()
+        with open(self.path, "a", encoding="utf-8") as f:
+            for finished in spans:
+                f.write(json.dumps(finished.to_dict(), default=str) + "\n")
+
+class OTLPExporter:
+    """POST finished spans to an OpenTelemetry collector as OTLP/HTTP JSON."""
+
+    def __init__(self, endpoint: str, service_name: str = SERVICE_NAME, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    @staticmethod
+    def _value(value) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def _attributes(self, attributes: Dict[str, Any]) -> list:
+        return [{"key": key, "value": self._value(value)} for key, value in attributes.items()]
+
+    def _span(self, finished: Span) -> Dict[str, Any]:
+        start = int(finished.start_time * 1e9)
+        otlp_span = {
+            "traceId": finished.trace_id,
+            "spanId": finished.span_id,
+            "name": finished.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(start),
+            "endTimeUnixNano": str(start + int(finished.duration * 1e9)),
+            "attributes": self._attributes({**finished.attributes, "thread.name": finished.thread}),
+            # STATUS_CODE_OK / STATUS_CODE_ERROR
+            "status": {"code": 1} if finished.status == "ok" else {"code": 2, "message": finished.error or finished.status},
+        }
+        if finished.parent_id:
+            otlp_span["parentSpanId"] = finished.parent_id
+        return otlp_span
+
+    def write(self, spans: List[Span]):
+        body = {"resourceSpans": [{
+            "resource": {"attributes": self._attributes({"service.name": self.service_name})},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [self._span(finished) for finished in spans]}],
+        }]}
+        request = urllib.request.Request(
+            self.endpoint, data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+class _BatchExporter:
+    """Collect finished spans and write them in batches on a background thread."""
+
+    def __init__(self, writer, batch_size: int = 256, interval: float = 1.0, max_queue: int = 10000):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._write_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def export(self, finished: Span):
+        try:
+            self._queue.put_nowait(finished)
+        except queue.Full:
+            # Never slow down a request to keep a span
+            self.dropped += 1
+
+    def _drain(self, first: Span = None) -> List[Span]:
+        batch = [first] if first is not None else []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Span]):
+        if not batch:
+            return
+        try:
+            with self._write_lock:
+                self.writer.write(batch)
+        except Exception as e:
+            print(f"Error exporting {len(batch)} trace spans: {e}")
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.interval)
+            except queue.Empty:
+                continue
+            self._write(self._drain(first))
+
+    def flush(self):
+        """Write every queued span now (also called at exit)."""
+        while not self._queue.empty():
+            self._write(self._drain())
+
+def _create_exporter() -> Optional[_BatchExporter]:
+    if EXPORT == "jsonl":
+        return _BatchExporter(JSONLExporter(TRACE_FILE))
+    if EXPORT == "otlp":
+        return _BatchExporter(OTLPExporter(TRACE_OTLP_ENDPOINT))
+    if EXPORT:
+        print(f"Unknown TRACE_EXPORT '{EXPORT}', tracing is off")
+    return None
+
+_exporter = _create_exporter()
+
+def flush():
+    """Write all finished spans now."""
+    if _exporter is not None:
+        _exporter.flush()
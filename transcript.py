@@ -0,0 +1,122 @@
+from collections import deque
+from datetime import datetime
+from typing import List, Optional, Iterator
+
+class ChatMessage:
+    """A single chat message. Uses __slots__ to keep per-message memory small."""
+    __slots__ = ("id", "role", "content", "timestamp")
+
+    def __init__(self, id: int, role: str, content: str, timestamp: str = ""):
+        self.id = id
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "ChatMessage":
+        """Build a message from a (message_id, role, content, timestamp) database row."""
+        message_id, role, content, timestamp = row
+        return cls(message_id, role, content, timestamp or "")
+
+    def to_dict(self) -> dict:
+        """Convert to the dict format used by GeminiClient.get_conversation_response."""
+        return {"role": self.role, "content": self.content, "timestamp": self.timestamp, "id": self.id}
+
+    def __repr__(self):
+        return f"ChatMessage(id={self.id}, role={self.role!r}, content={self.content[:30]!r})"
+
+class Transcript:
+    """
+    A session's chat transcript with only the most recent messages in memory.
+
+    Every message is written through to the database as it is added, so
+    messages that fall out of the in-memory window can be paged back in on
+    demand and memory stays flat however long the session runs. Any object
+    with DatabaseManager's message methods works, including a SessionStore.
+    """
+
+    def __init__(self, db, session_id: str, max_in_memory: int = 100):
+        """
+        Load the tail of a session's transcript.
+
+        Args:
+            db: DatabaseManager or SessionStore holding the transcript
+            session_id (str): Session the transcript belongs to
+            max_in_memory (int): Number of recent messages kept in memory
+        """
+        self.db = db
+        self.session_id = session_id
+        self.max_in_memory = max_in_memory
+        self._recent = deque(
+            (ChatMessage.from_row(row) for row in db.get_messages(session_id, limit=max_in_memory)),
+            maxlen=max_in_memory
+        )
+        self._count, self.last_id = db.get_message_bounds(session_id)
+
+    def __len__(self) -> int:
+        """Total number of messages, including those only in the database."""
+        return self._count
+
+    def __iter__(self) -> Iterator[ChatMessage]:
+        """Iterate over the messages held in memory, oldest first."""
+        return iter(self._recent)
+
+    def append(self, role: str, content: str, timestamp: str = None) -> ChatMessage:
+        """
+        Add a message to the end of the transcript.
+
+        Args:
+            role (str): 'user' or 'assistant'
+            content (str): Message text
+            timestamp (str, optional): Display timestamp (defaults to now)
+
+        Returns:
+            ChatMessage: The stored message
+        """
+        if timestamp is None:
+            timestamp = datetime.now().strftime("%H:%M:%S")
+
+        self.last_id += 1
+        message = ChatMessage(self.last_id, role, content, timestamp)
+        self.db.add_message(self.session_id, message.id, role, content, timestamp)
+
+        # The deque drops the oldest message once the window is full
+        self._recent.append(message)
+        self._count += 1
+        return message
+
+    def recent(self, count: int) -> List[ChatMessage]:
+        """
+        Get the last `count` messages, paging older ones in from the database if needed.
+
+        Args:
+            count (int): Number of messages wanted
+
+        Returns:
+            list: Messages, oldest first
+        """
+        in_memory = list(self._recent)
+        if count <= len(in_memory):
+            return in_memory[len(in_memory) - count:]
+
+        if len(in_memory) >= self._count:
+            return in_memory
+
+        before_id = in_memory[0].id if in_memory else None
+        older = self.db.get_messages(self.session_id, before_id=before_id, limit=count - len(in_memory))
+        return [ChatMessage.from_row(row) for row in older] + in_memory
+
+    def get(self, message_id: int) -> Optional[ChatMessage]:
+        """Find a message by id, in memory or in the database."""
+        for message in reversed(self._recent):
+            if message.id == message_id:
+                return message
+
+        row = self.db.get_message(self.session_id, message_id)
+        return ChatMessage.from_row(row) if row else None
+
+    def clear(self):
+        """Delete the whole transcript."""
+        self.db.clear_messages(self.session_id)
+        self._recent.clear()
+        self._count = 0
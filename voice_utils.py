@@ -2,15 +2,457 @@ import speech_recognition as sr
 import pyttsx3
 import threading
 import queue
-from typing import Optional, Callable
+import multiprocessing
+import hashlib
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import re
+import json
+import wave
+from typing import Optional, Callable, List, Any
 import time
 import os
+import contextvars
+
+import tracing
+from tracing import traced
+
+# pyttsx3.init() returns one engine per driver for the whole process, and it is
+# not thread-safe: every save_to_file/say + runAndWait holds this lock. Re-entrant
+# so AudioCache can hold it around a render that calls speak_to_file
+_tts_engine_lock = threading.RLock()
+
+# Speech recognition backends
+_shared_models = {}
+_shared_models_lock = threading.Lock()
+
+def _load_shared_model(key: tuple, loader: Callable[[], Any]):
+    """Load a recognition model once per process and share it between callers."""
+    with _shared_models_lock:
+        if key not in _shared_models:
+            print(f"Loading speech model {key}...")
+            _shared_models[key] = loader()
+        return _shared_models[key]
+
+class RecognizerBackend:
+    """
+    Base class for speech-to-text backends.
+    
+    recognize() returns the transcript, raising sr.UnknownValueError when
+    no speech could be understood and sr.RequestError when the backend
+    itself fails, matching the speech_recognition conventions.
+    """
+    name = "base"
+    local = False
+    supports_partial = False
+    
+    def recognize(self, audio: sr.AudioData) -> str:
+        """Transcribe a phrase of audio."""
+        raise NotImplementedError
+    
+    def warm_up(self):
+        """Load any models ahead of the first recognition."""
+        pass
+    
+    def create_stream(self, sample_rate: int, sample_width: int) -> 'RecognitionStream':
+        """Start recognizing audio that arrives in chunks."""
+        return RecognitionStream(self, sample_rate, sample_width)
+
+class RecognitionStream:
+    """
+    Audio fed to a backend chunk by chunk while the user is speaking.
+    
+    The default implementation buffers the audio and recognizes it once at
+    the end; backends that support partial transcripts override accept().
+    """
+    
+    def __init__(self, backend: RecognizerBackend, sample_rate: int, sample_width: int):
+        self.backend = backend
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self._chunks = []
+    
+    def accept(self, chunk: bytes) -> Optional[str]:
+        """
+        Add raw PCM audio.
+        
+        Returns:
+            str: Updated partial transcript, or None if there is nothing new
+        """
+        self._chunks.append(chunk)
+        return None
+    
+    def audio(self) -> sr.AudioData:
+        """All audio accepted so far."""
+        return sr.AudioData(b"".join(self._chunks), self.sample_rate, self.sample_width)
+    
+    def finish(self) -> str:
+        """Return the final transcript, raising sr.UnknownValueError if nothing was understood."""
+        return self.backend.recognize(self.audio())
+    
+    def close(self):
+        """Release anything the stream started; called however listening ended."""
+
+class GoogleRecognizerBackend(RecognizerBackend):
+    """Google Web Speech API (requires network access)."""
+    name = "google"
+    
+    def __init__(self, recognizer: sr.Recognizer = None, language: str = "en-US"):
+        self.recognizer = recognizer or sr.Recognizer()
+        self.language = language
+    
+    def recognize(self, audio: sr.AudioData) -> str:
+        return self.recognizer.recognize_google(audio, language=self.language)
+
+class VoskRecognizerBackend(RecognizerBackend):
+    """Offline recognition with a Vosk (Kaldi) model on the CPU."""
+    name = "vosk"
+    local = True
+    supports_partial = True
+    sample_rate = 16000
+    
+    def __init__(self, model_path: str = None):
+        """
+        Args:
+            model_path (str, optional): Directory of an unpacked Vosk model
+                (defaults to VOSK_MODEL_PATH or ./model)
+        """
+        self.model_path = model_path or os.getenv("VOSK_MODEL_PATH", "model")
+    
+    def _get_model(self):
+        try:
+            import vosk
+        except ImportError:
+            raise sr.RequestError("Vosk is not installed. Install it with: pip install vosk")
+        
+        if not os.path.isdir(self.model_path):
+            raise sr.RequestError(f"Vosk model not found at '{self.model_path}'. Set VOSK_MODEL_PATH.")
+        
+        vosk.SetLogLevel(-1)
+        return _load_shared_model(("vosk", os.path.abspath(self.model_path)), lambda: vosk.Model(self.model_path))
+    
+    def warm_up(self):
+        self._get_model()
+    
+    def recognize(self, audio: sr.AudioData) -> str:
+        from vosk import KaldiRecognizer
+        
+        recognizer = KaldiRecognizer(self._get_model(), self.sample_rate)
+        recognizer.AcceptWaveform(audio.get_raw_data(convert_rate=self.sample_rate, convert_width=2))
+        text = json.loads(recognizer.FinalResult()).get("text", "")
+        
+        if not text.strip():
+            raise sr.UnknownValueError()
+        return text
+    
+    def create_stream(self, sample_rate: int, sample_width: int) -> RecognitionStream:
+        return VoskRecognitionStream(self, sample_rate, sample_width)
+
+class VoskRecognitionStream(RecognitionStream):
+    """Incremental Vosk recognition with partial transcripts."""
+    
+    def __init__(self, backend: VoskRecognizerBackend, sample_rate: int, sample_width: int):
+        super().__init__(backend, sample_rate, sample_width)
+        from vosk import KaldiRecognizer
+        
+        self._recognizer = KaldiRecognizer(backend._get_model(), sample_rate)
+        self._final_parts = []
+        self._last_partial = ""
+    
+    def accept(self, chunk: bytes) -> Optional[str]:
+        self._chunks.append(chunk)
+        if self.sample_width != 2:
+            chunk = sr.AudioData(chunk, self.sample_rate, self.sample_width).get_raw_data(convert_width=2)
+        
+        if self._recognizer.AcceptWaveform(chunk):
+            # Vosk closed an utterance segment; keep it and start a new partial
+            self._final_parts.append(json.loads(self._recognizer.Result()).get("text", ""))
+            partial = ""
+        else:
+            partial = json.loads(self._recognizer.PartialResult()).get("partial", "")
+        
+        text = " ".join(part for part in self._final_parts + [partial] if part)
+        if text == self._last_partial:
+            return None
+        self._last_partial = text
+        return text
+    
+    def finish(self) -> str:
+        self._final_parts.append(json.loads(self._recognizer.FinalResult()).get("text", ""))
+        text = " ".join(part for part in self._final_parts if part)
+        if not text.strip():
+            raise sr.UnknownValueError()
+        return text
+
+class WhisperRecognizerBackend(RecognizerBackend):
+    """Offline recognition with a small Whisper model via faster-whisper on the CPU."""
+    name = "whisper"
+    local = True
+    supports_partial = True
+    sample_rate = 16000
+    
+    def __init__(self, model_size: str = None, language: str = "en"):
+        """
+        Args:
+            model_size (str, optional): Whisper model name, e.g. tiny.en or base.en
+                (defaults to WHISPER_MODEL or tiny.en)
+            language (str): Language spoken in the audio
+        """
+        self.model_size = model_size or os.getenv("WHISPER_MODEL", "tiny.en")
+        self.language = language
+    
+    def _get_model(self):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise sr.RequestError("faster-whisper is not installed. Install it with: pip install faster-whisper")
+        
+        return _load_shared_model(
+            ("whisper", self.model_size),
+            lambda: WhisperModel(self.model_size, device="cpu", compute_type="int8")
+        )
+    
+    def warm_up(self):
+        self._get_model()
+    
+    def recognize(self, audio: sr.AudioData) -> str:
+        import numpy as np
+        
+        raw = audio.get_raw_data(convert_rate=self.sample_rate, convert_width=2)
+        samples = np.frombuffer(raw, dtype=np.int16).astype(np.float32) / 32768.0
+        segments, _ = self._get_model().transcribe(samples, language=self.language, beam_size=1)
+        text = " ".join(segment.text.strip() for segment in segments)
+        
+        if not text.strip():
+            raise sr.UnknownValueError()
+        return text
+    
+    def create_stream(self, sample_rate: int, sample_width: int) -> RecognitionStream:
+        return WhisperRecognitionStream(self, sample_rate, sample_width)
+
+class WhisperRecognitionStream(RecognitionStream):
+    """
+    Whisper has no streaming mode, so partials re-transcribe recent audio at intervals.
+    
+    Partials run on a worker thread and cover only the last partial_window
+    seconds, so accept() never blocks the capture loop and each partial
+    costs the same however long the user talks. The final transcript
+    still covers all the audio.
+    """
+    
+    def __init__(self, backend: WhisperRecognizerBackend, sample_rate: int, sample_width: int,
+                 partial_interval: float = 1.0, partial_window: float = 6.0):
+        super().__init__(backend, sample_rate, sample_width)
+        self.partial_interval = partial_interval
+        self.partial_window = partial_window
+        self._last_partial_at = time.time()
+        self._buffered_bytes = 0
+        # At most one snapshot waits; newer audio replaces it rather than queueing up
+        self._pending = queue.Queue(maxsize=1)
+        self._results = queue.Queue()
+        self._worker = None
+    
+    def _run_partials(self):
+        while True:
+            snapshot = self._pending.get()
+            if snapshot is None:
+                return
+            audio, truncated = snapshot
+            try:
+                text = self.backend.recognize(audio)
+                self._results.put("… " + text if truncated else text)
+            except sr.UnknownValueError:
+                pass
+            except Exception as e:
+                print(f"Error in partial speech recognition: {e}")
+    
+    def _tail(self) -> tuple:
+        """The last partial_window seconds of audio, and whether earlier audio was left out."""
+        limit = int(self.partial_window * self.sample_rate) * self.sample_width
+        tail = []
+        size = 0
+        for chunk in reversed(self._chunks):
+            if size >= limit:
+                break
+            tail.append(chunk)
+            size += len(chunk)
+        data = b"".join(reversed(tail))[-limit:]
+        return sr.AudioData(data, self.sample_rate, self.sample_width), self._buffered_bytes > limit
+    
+    def accept(self, chunk: bytes) -> Optional[str]:
+        self._chunks.append(chunk)
+        self._buffered_bytes += len(chunk)
+        
+        if time.time() - self._last_partial_at >= self.partial_interval and self._pending.empty():
+            self._last_partial_at = time.time()
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run_partials, name="whisper-partials", daemon=True)
+                self._worker.start()
+            try:
+                self._pending.put_nowait(self._tail())
+            except queue.Full:
+                pass
+        
+        # Return the newest partial that finished since the last call, if any
+        partial = None
+        while True:
+            try:
+                partial = self._results.get_nowait()
+            except queue.Empty:
+                break
+        return partial
+    
+    def close(self):
+        if self._worker is not None:
+            while True:
+                try:
+                    self._pending.get_nowait()
+                except queue.Empty:
+                    break
+            self._pending.put(None)
+            self._worker.join()
+            self._worker = None
+    
+    def finish(self) -> str:
+        # Let a partial in progress finish first rather than compete with the final pass for the CPU
+        self.close()
+        return super().finish()
+
+RECOGNIZER_BACKENDS = {
+    GoogleRecognizerBackend.name: GoogleRecognizerBackend,
+    VoskRecognizerBackend.name: VoskRecognizerBackend,
+    WhisperRecognizerBackend.name: WhisperRecognizerBackend,
+}
+
+def create_recognizer_backend(name: str, **kwargs) -> RecognizerBackend:
+    """
+    Create a speech recognition backend by name.
+    
+    Args:
+        name (str): One of RECOGNIZER_BACKENDS
+        **kwargs: Backend-specific options
+        
+    Returns:
+        RecognizerBackend: The backend
+    """
+    backend_class = RECOGNIZER_BACKENDS.get(name.lower())
+    if backend_class is None:
+        raise ValueError(f"Unknown speech recognition backend '{name}'. Choose from: {', '.join(RECOGNIZER_BACKENDS)}")
+    return backend_class(**kwargs)
+
+class EnergyVAD:
+    """
+    Energy-based voice activity detection over raw 16-bit PCM frames.
+    
+    The noise floor is learned from the audio itself and keeps adapting
+    while nobody is speaking, so no fixed energy threshold is needed.
+    Speech starts once the frame energy stays above the floor by
+    start_ratio for min_speech_ms, and ends after hangover_ms below
+    end_ratio.
+    """
+    
+    def __init__(self, sample_rate: int = 16000, sample_width: int = 2, start_ratio: float = 3.0,
+                 end_ratio: float = 2.0, min_speech_ms: int = 90, hangover_ms: int = 700,
+                 calibration_ms: int = 300, noise_adaptation: float = 0.05, min_energy: float = 50.0):
+        """
+        Args:
+            sample_rate (int): Samples per second
+            sample_width (int): Bytes per sample (only 2 is supported)
+            start_ratio (float): Energy over noise floor needed to start speech
+            end_ratio (float): Energy over noise floor needed to stay in speech
+            min_speech_ms (int): Loud audio needed before speech is reported
+            hangover_ms (int): Quiet audio needed before end of speech is reported
+            calibration_ms (int): Initial audio used to learn the noise floor
+            noise_adaptation (float): How quickly the noise floor follows quiet audio
+            min_energy (float): Lower bound for the thresholds, for very quiet rooms
+        """
+        if sample_width != 2:
+            raise ValueError("EnergyVAD expects 16-bit audio")
+        
+        self.sample_rate = sample_rate
+        self.start_ratio = start_ratio
+        self.end_ratio = end_ratio
+        self.min_speech_ms = min_speech_ms
+        self.hangover_ms = hangover_ms
+        self.calibration_ms = calibration_ms
+        self.noise_adaptation = noise_adaptation
+        self.min_energy = min_energy
+        self.reset()
+    
+    def reset(self):
+        """Forget the noise floor and speech state."""
+        self.noise_floor = None
+        self.in_speech = False
+        self._calibration = []
+        self._calibrated_ms = 0.0
+        self._speech_ms = 0.0
+        self._silence_ms = 0.0
+    
+    @staticmethod
+    def frame_energy(frame: bytes) -> float:
+        """Root-mean-square amplitude of a 16-bit PCM frame."""
+        import numpy as np
+        
+        samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+        if samples.size == 0:
+            return 0.0
+        return float(np.sqrt(np.mean(samples * samples)))
+    
+    def process(self, frame: bytes) -> Optional[str]:
+        """
+        Classify the next frame.
+        
+        Args:
+            frame (bytes): Raw 16-bit mono PCM audio
+            
+        Returns:
+            str: 'speech_start' or 'speech_end' when the state changes, otherwise None
+        """
+        energy = self.frame_energy(frame)
+        frame_ms = 1000.0 * len(frame) / 2 / self.sample_rate
+        
+        if self._calibrated_ms < self.calibration_ms:
+            self._calibration.append(energy)
+            self._calibrated_ms += frame_ms
+            self.noise_floor = sum(self._calibration) / len(self._calibration)
+            return None
+        
+        if not self.in_speech:
+            if energy > max(self.min_energy, self.noise_floor * self.start_ratio):
+                self._speech_ms += frame_ms
+                if self._speech_ms >= self.min_speech_ms:
+                    self.in_speech = True
+                    self._silence_ms = 0.0
+                    return 'speech_start'
+            else:
+                self._speech_ms = 0.0
+                self.noise_floor += self.noise_adaptation * (energy - self.noise_floor)
+            return None
+        
+        if energy < max(self.min_energy, self.noise_floor * self.end_ratio):
+            self._silence_ms += frame_ms
+            if self._silence_ms >= self.hangover_ms:
+                self.in_speech = False
+                self._speech_ms = 0.0
+                return 'speech_end'
+        else:
+            self._silence_ms = 0.0
+        return None
 
 class VoiceManager:
-    def __init__(self):
-        """Initialize voice manager with speech recognition and text-to-speech."""
+    def __init__(self, recognizer_backend: str = None):
+        """
+        Initialize voice manager with speech recognition and text-to-speech.
+        
+        Args:
+            recognizer_backend (str, optional): Speech recognition backend name
+                (defaults to SPEECH_BACKEND or google)
+        """
         self.recognizer = sr.Recognizer()
         self.microphone = sr.Microphone()
+        self.recognizer_backend = None
+        self.set_recognizer_backend(recognizer_backend or os.getenv("SPEECH_BACKEND", "google"))
         
         # Initialize text-to-speech engine
         try:
@@ -20,7 +462,7 @@ class VoiceManager:
             print(f"Error initializing TTS engine: {e}")
             self.tts_engine = None
         
-        # Voice recognition settings
+        # Voice recognition settings; the energy threshold is only used if calibration fails
         self.energy_threshold = 4000
         self.dynamic_energy_threshold = True
         self.pause_threshold = 0.8
@@ -34,18 +476,25 @@ class VoiceManager:
         self.voice_queue = queue.Queue()
     
     def setup_microphone(self):
-        """Configure microphone settings."""
+        """
+        Configure microphone settings.
+        
+        The ambient noise is measured once here; listen_once, listen_continuous
+        and test_microphone all start from that threshold, and the dynamic
+        threshold follows the room from there.
+        """
+        self.recognizer.energy_threshold = self.energy_threshold
+        self.recognizer.dynamic_energy_threshold = self.dynamic_energy_threshold
+        self.recognizer.pause_threshold = self.pause_threshold
+        self.recognizer.phrase_threshold = self.phrase_threshold
+        
         try:
             with self.microphone as source:
                 print("Calibrating microphone for ambient noise...")
                 self.recognizer.adjust_for_ambient_noise(source, duration=1)
             
-            self.recognizer.energy_threshold = self.energy_threshold
-            self.recognizer.dynamic_energy_threshold = self.dynamic_energy_threshold
-            self.recognizer.pause_threshold = self.pause_threshold
-            self.recognizer.phrase_threshold = self.phrase_threshold
-            
-            print("Microphone setup completed.")
+            self.energy_threshold = self.recognizer.energy_threshold
+            print(f"Microphone setup completed (energy threshold {self.energy_threshold:.0f}).")
             
         except Exception as e:
             print(f"Error setting up microphone: {e}")
@@ -77,6 +526,32 @@ class VoiceManager:
         except Exception as e:
             print(f"Error setting up TTS: {e}")
     
+    def set_recognizer_backend(self, name: str, **kwargs) -> bool:
+        """
+        Choose the speech recognition backend.
+        
+        Args:
+            name (str): Backend name (see RECOGNIZER_BACKENDS)
+            **kwargs: Backend-specific options
+            
+        Returns:
+            bool: True if the backend was selected
+        """
+        try:
+            if name == GoogleRecognizerBackend.name:
+                kwargs.setdefault('recognizer', self.recognizer)
+            self.recognizer_backend = create_recognizer_backend(name, **kwargs)
+            return True
+        except Exception as e:
+            print(f"Error setting speech recognition backend: {e}")
+            if self.recognizer_backend is None:
+                self.recognizer_backend = GoogleRecognizerBackend(self.recognizer)
+            return False
+    
+    def recognize(self, audio: sr.AudioData) -> str:
+        """Transcribe audio with the selected backend."""
+        return self.recognizer_backend.recognize(audio)
+    
     def listen_once(self, timeout: int = 5, phrase_time_limit: int = 10) -> Optional[str]:
         """
         Listen for a single voice input.
@@ -101,8 +576,8 @@ class VoiceManager:
             
             print("Processing speech...")
             
-            # Recognize speech using Google's service
-            text = self.recognizer.recognize_google(audio)
+            # Recognize speech using the selected backend
+            text = self.recognize(audio)
             print(f"You said: {text}")
             return text
             
@@ -119,48 +594,179 @@ class VoiceManager:
             print(f"Error during speech recognition: {e}")
             return None
     
-    def listen_continuous(self, callback: Callable[[str], None], stop_event: threading.Event):
+    def listen_streaming(self, on_partial: Callable[[str], None] = None, timeout: int = 5,
+                         phrase_time_limit: int = 15, preroll_ms: int = 300) -> Optional[str]:
+        """
+        Listen for a single voice input, segmented by voice activity detection.
+        
+        Recognition runs while the user is still talking: partial transcripts
+        are passed to on_partial when the backend supports them, and the
+        final transcript is returned as soon as end of speech is detected.
+        
+        Args:
+            on_partial (function, optional): Called with each updated partial transcript
+            timeout (int): Seconds to wait for speech to begin
+            phrase_time_limit (int): Maximum seconds to record phrase
+            preroll_ms (int): Audio kept from just before speech was detected
+            
+        Returns:
+            str: Recognized text or None if recognition failed
+        """
+        stream = None
+        try:
+            print("Listening... Speak now!")
+            
+            with self.microphone as source:
+                sample_rate = source.SAMPLE_RATE
+                frame_ms = 1000.0 * source.CHUNK / sample_rate
+                vad = EnergyVAD(sample_rate=sample_rate, sample_width=source.SAMPLE_WIDTH)
+                stream = self.recognizer_backend.create_stream(sample_rate, source.SAMPLE_WIDTH)
+                preroll = deque(maxlen=max(1, int(preroll_ms / frame_ms)))
+                
+                started_at = time.time()
+                speech_started_at = None
+                
+                while True:
+                    frame = source.stream.read(source.CHUNK)
+                    event = vad.process(frame)
+                    
+                    if speech_started_at is None:
+                        preroll.append(frame)
+                        if event != 'speech_start':
+                            if time.time() - started_at > timeout:
+                                print("No speech detected within timeout period")
+                                return None
+                            continue
+                        
+                        speech_started_at = time.time()
+                        chunks = list(preroll)
+                    else:
+                        chunks = [frame]
+                    
+                    for chunk in chunks:
+                        partial = stream.accept(chunk)
+                        if partial and on_partial:
+                            on_partial(partial)
+                    
+                    if event == 'speech_end' or time.time() - speech_started_at > phrase_time_limit:
+                        break
+            
+            print("Processing speech...")
+            text = stream.finish()
+            print(f"You said: {text}")
+            return text
+            
+        except sr.UnknownValueError:
+            print("Could not understand the audio")
+            return None
+        except sr.RequestError as e:
+            print(f"Error with speech recognition service: {e}")
+            return None
+        except Exception as e:
+            print(f"Error during speech recognition: {e}")
+            return None
+        finally:
+            if stream is not None:
+                stream.close()
+    
+    def listen_continuous(self, callback: Callable[[str], None], stop_event: threading.Event,
+                          recognition_workers: int = 2):
         """
         Listen continuously for voice input.
         
+        A capture thread keeps the microphone open and queues each phrase,
+        while a small pool of workers recognizes them in parallel, so no
+        audio is dropped while a phrase is being recognized. Results are
+        delivered to the callback in the order they were spoken.
+        
         Args:
             callback (function): Function to call with recognized text
             stop_event (threading.Event): Event to stop listening
+            recognition_workers (int): Number of phrases recognized in parallel
+            
+        Returns:
+            threading.Thread: Thread delivering results; it exits after stop_event is set
         """
         self.is_listening = True
         print("Starting continuous listening...")
         
-        def listen_in_background():
-            with self.microphone as source:
-                self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
+        phrases = queue.Queue(maxsize=32)
+        
+        def should_stop():
+            return stop_event.is_set() or not self.is_listening
+        
+        def capture_phrases():
+            try:
+                with self.microphone as source:
+                    # Already calibrated in setup_microphone
+                    while not should_stop():
+                        try:
+                            # Shorter timeout so stop_event is checked regularly
+                            audio = self.recognizer.listen(source, timeout=1, phrase_time_limit=5)
+                        except sr.WaitTimeoutError:
+                            continue  # Normal timeout, continue listening
+                        
+                        while not should_stop():
+                            try:
+                                phrases.put(audio, timeout=0.5)
+                                break
+                            except queue.Full:
+                                continue
+            except Exception as e:
+                print(f"Error in continuous listening: {e}")
+            finally:
+                # The recognizer stops reading once stop_event is set, so never block on a full queue
+                while True:
+                    try:
+                        phrases.put(None, timeout=0.5)
+                        break
+                    except queue.Full:
+                        if should_stop():
+                            break
+        
+        def recognize_phrase(audio):
+            try:
+                return self.recognize(audio)
+            except sr.UnknownValueError:
+                return None  # Couldn't understand, continue listening
+            except sr.RequestError as e:
+                print(f"Speech recognition error: {e}")
+                return None
+        
+        def deliver_in_order(pending: deque):
+            while pending and pending[0].done():
+                text = pending.popleft().result()
+                if text and text.strip() and not should_stop():
+                    callback(text)
+        
+        def recognize_in_background():
+            pending = deque()
+            capturing = True
             
-            while not stop_event.is_set() and self.is_listening:
-                try:
-                    with self.microphone as source:
-                        # Listen for audio with shorter timeout for continuous mode
-                        audio = self.recognizer.listen(source, timeout=1, phrase_time_limit=5)
+            with ThreadPoolExecutor(max_workers=max(1, recognition_workers)) as pool:
+                while (capturing or pending) and not should_stop():
+                    try:
+                        audio = phrases.get(timeout=0.1)
+                        if audio is None:
+                            capturing = False
+                        else:
+                            pending.append(pool.submit(recognize_phrase, audio))
+                    except queue.Empty:
+                        pass
                     
-                    # Recognize speech
-                    text = self.recognizer.recognize_google(audio)
-                    if text.strip():
-                        callback(text)
-                        
-                except sr.WaitTimeoutError:
-                    continue  # Normal timeout, continue listening
-                except sr.UnknownValueError:
-                    continue  # Couldn't understand, continue listening
-                except sr.RequestError as e:
-                    print(f"Speech recognition error: {e}")
-                    break
-                except Exception as e:
-                    print(f"Error in continuous listening: {e}")
-                    break
+                    deliver_in_order(pending)
+                
+                for future in pending:
+                    future.cancel()
+            
+            print("Continuous listening stopped.")
         
-        # Start listening in background thread
-        listen_thread = threading.Thread(target=listen_in_background, daemon=True)
-        listen_thread.start()
+        capture_thread = threading.Thread(target=capture_phrases, daemon=True)
+        recognition_thread = threading.Thread(target=recognize_in_background, daemon=True)
+        capture_thread.start()
+        recognition_thread.start()
         
-        return listen_thread
+        return recognition_thread
     
     def speak(self, text: str, blocking: bool = True):
         """
@@ -177,8 +783,9 @@ class VoiceManager:
             try:
                 self.is_speaking = True
                 print(f"Speaking: {text}")
-                self.tts_engine.say(text)
-                self.tts_engine.runAndWait()
+                with _tts_engine_lock:
+                    self.tts_engine.say(text)
+                    self.tts_engine.runAndWait()
                 self.is_speaking = False
                 print("Speech completed.")
                 
@@ -209,8 +816,9 @@ class VoiceManager:
         
         try:
             print(f"Saving speech to file: {output_path}")
-            self.tts_engine.save_to_file(text, output_path)
-            self.tts_engine.runAndWait()
+            with _tts_engine_lock:
+                self.tts_engine.save_to_file(text, output_path)
+                self.tts_engine.runAndWait()
             print("Speech saved to file.")
             return True
         except Exception as e:
@@ -276,13 +884,28 @@ class VoiceManager:
         except Exception as e:
             print(f"Error setting volume: {e}")
     
+    def get_tts_settings(self) -> dict:
+        """Get the current TTS voice, rate and volume."""
+        if not self.tts_engine:
+            return {}
+        
+        try:
+            return {
+                'voice': self.tts_engine.getProperty('voice'),
+                'rate': self.tts_engine.getProperty('rate'),
+                'volume': self.tts_engine.getProperty('volume')
+            }
+        except Exception as e:
+            print(f"Error getting TTS settings: {e}")
+            return {}
+    
     def test_microphone(self) -> bool:
         """Test if microphone is working."""
         try:
             with self.microphone as source:
                 print("Testing microphone... Say something!")
                 audio = self.recognizer.listen(source, timeout=3, phrase_time_limit=2)
-                text = self.recognizer.recognize_google(audio)
+                text = self.recognize(audio)
                 print(f"Microphone test successful. Heard: {text}")
                 return True
         except Exception as e:
@@ -319,6 +942,670 @@ class VoiceManager:
             print(f"Error setting microphone: {e}")
             return False
 
+def _tts_worker_main(job_queue, generation, speaking, rate: int, volume: float, voice_id: Optional[str]):
+    """
+    Entry point of the TTS worker process.
+    
+    The engine is initialised once and then speaks jobs from job_queue until
+    a None job arrives. Each job carries the generation it was queued in;
+    when the parent bumps the shared generation counter the current
+    utterance is stopped and older queued jobs are skipped.
+    """
+    engine = pyttsx3.init()
+    engine.setProperty('rate', rate)
+    engine.setProperty('volume', volume)
+    if voice_id:
+        engine.setProperty('voice', voice_id)
+    
+    current = {'generation': 0}
+    
+    def on_word(name, location, length):
+        if generation.value != current['generation']:
+            engine.stop()
+    
+    engine.connect('started-word', on_word)
+    
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        
+        job_generation, text = job
+        if job_generation != generation.value:
+            continue  # Cancelled before it started
+        
+        current['generation'] = job_generation
+        speaking.value = 1
+        try:
+            engine.say(text)
+            engine.runAndWait()
+        except Exception as e:
+            print(f"Error in TTS worker: {e}")
+        finally:
+            speaking.value = 0
+
+class TTSWorker:
+    """Long-lived text-to-speech process that speaks jobs sent over a queue."""
+    
+    def __init__(self, rate: int = 200, volume: float = 0.9, voice_id: Optional[str] = None,
+                 stop_timeout: float = 0.5):
+        """
+        Initialize the worker. The process is started on first use.
+        
+        Args:
+            rate (int): Speech rate (words per minute)
+            volume (float): Speech volume (0.0 to 1.0)
+            voice_id (str, optional): TTS voice to use
+            stop_timeout (float): Seconds to wait for speech to stop before restarting the worker
+        """
+        self.rate = rate
+        self.volume = volume
+        self.voice_id = voice_id
+        self.stop_timeout = stop_timeout
+        self.restart_count = 0
+        
+        # Spawn rather than fork so the worker doesn't inherit the web server's threads
+        self._context = multiprocessing.get_context('spawn')
+        self._generation = self._context.Value('i', 0)
+        self._speaking = self._context.Value('i', 0)
+        self._queue = None
+        self._process = None
+        self._lock = threading.Lock()
+    
+    def is_alive(self) -> bool:
+        """Check whether the worker process is running."""
+        return self._process is not None and self._process.is_alive()
+    
+    def is_speaking(self) -> bool:
+        """Check whether the worker is currently speaking."""
+        return self.is_alive() and bool(self._speaking.value)
+    
+    def _ensure_running(self):
+        """Start the worker process, restarting it if it has crashed."""
+        if self.is_alive():
+            return
+        
+        if self._process is not None:
+            self.restart_count += 1
+            print(f"TTS worker exited (code {self._process.exitcode}), restarting...")
+        
+        self._speaking.value = 0
+        self._queue = self._context.Queue()
+        self._process = self._context.Process(
+            target=_tts_worker_main,
+            args=(self._queue, self._generation, self._speaking, self.rate, self.volume, self.voice_id),
+            daemon=True
+        )
+        self._process.start()
+    
+    @traced("tts.worker_speak")
+    def speak(self, text: str, interrupt: bool = True):
+        """
+        Queue text to be spoken.
+        
+        Args:
+            text (str): Text to speak
+            interrupt (bool): Stop current and queued speech first
+        """
+        if not text or not text.strip():
+            return
+        
+        with self._lock:
+            if interrupt:
+                self._cancel()
+            # Speech itself happens in the worker process, outside the trace
+            tracing.set_attributes(chars=len(text), restarts=self.restart_count)
+            self._ensure_running()
+            self._queue.put((self._generation.value, text))
+    
+    def stop(self):
+        """Stop current speech and drop any queued speech."""
+        with self._lock:
+            self._cancel()
+    
+    def _cancel(self):
+        """Invalidate queued jobs and wait briefly for current speech to stop."""
+        with self._generation.get_lock():
+            self._generation.value += 1
+        
+        if not self.is_alive():
+            return
+        
+        deadline = time.time() + self.stop_timeout
+        while self._speaking.value and time.time() < deadline:
+            time.sleep(0.02)
+        
+        if self._speaking.value:
+            # The driver didn't honour stop(); restart the worker instead
+            self._process.terminate()
+            self._process.join(timeout=1)
+    
+    def shutdown(self):
+        """Stop the worker process."""
+        with self._lock:
+            if not self.is_alive():
+                return
+            self._cancel()
+            if self.is_alive():
+                self._queue.put(None)
+                self._process.join(timeout=2)
+                if self._process.is_alive():
+                    self._process.terminate()
+            self._process = None
+
+class AudioCache:
+    """Size-capped LRU disk cache of synthesised speech."""
+    
+    def __init__(self, render: Callable[[str, str], bool], cache_dir: str = None,
+                 max_bytes: int = 200 * 1024 * 1024, extension: str = ".wav"):
+        """
+        Initialize the cache.
+        
+        Args:
+            render (function): Called as render(text, output_path) to synthesise
+                audio, e.g. VoiceManager.speak_to_file
+            cache_dir (str, optional): Directory holding the audio files
+            max_bytes (int): Total size the cache is trimmed back to
+            extension (str): File extension of rendered audio
+        """
+        self.render = render
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "chatbot_tts_cache")
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self.hits = 0
+        self.misses = 0
+        # The TTS engine is shared by the whole process, so render one file at a time across all caches
+        self._render_lock = _tts_engine_lock
+        os.makedirs(self.cache_dir, exist_ok=True)
+    
+    def cache_key(self, text: str, settings: dict = None) -> str:
+        """Hash the text together with the voice, rate and volume."""
+        settings = settings or {}
+        key_source = "|".join([
+            str(settings.get('voice', '')),
+            str(settings.get('rate', '')),
+            str(settings.get('volume', '')),
+            text
+        ])
+        return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+    
+    @traced("tts.synthesize")
+    def get(self, text: str, settings: dict = None) -> Optional[str]:
+        """
+        Get the audio file for text, rendering it on the first request.
+        
+        Args:
+            text (str): Text to speak
+            settings (dict, optional): TTS voice, rate and volume used for rendering
+            
+        Returns:
+            str: Path to the audio file, or None if rendering failed
+        """
+        if not text or not text.strip():
+            return None
+        
+        path = os.path.join(self.cache_dir, self.cache_key(text, settings) + self.extension)
+        tracing.set_attributes(chars=len(text))
+        
+        if self._touch(path):
+            self.hits += 1
+            tracing.set_attributes(cache_hit=True)
+            return path
+        
+        with self._render_lock:
+            # Another caller may have rendered it while we waited
+            if self._touch(path):
+                self.hits += 1
+                tracing.set_attributes(cache_hit=True)
+                return path
+            
+            self.misses += 1
+            tracing.set_attributes(cache_hit=False)
+            temp_path = f"{path}.{os.getpid()}.tmp{self.extension}"
+            try:
+                if not self.render(text, temp_path) or not os.path.getsize(temp_path):
+                    return None
+                tracing.set_attributes(bytes=os.path.getsize(temp_path))
+                os.replace(temp_path, path)
+            except OSError as e:
+                print(f"Error rendering audio: {e}")
+                return None
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        
+        self.evict()
+        return path
+    
+    def _touch(self, path: str) -> bool:
+        """Mark a cached file as recently used. Returns False if it doesn't exist."""
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+    
+    def evict(self):
+        """Delete least recently used files until the cache fits in max_bytes."""
+        try:
+            entries = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file() and entry.name.endswith(self.extension) and '.tmp' not in entry.name:
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError as e:
+            print(f"Error scanning audio cache: {e}")
+            return
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+    
+    def clear(self):
+        """Delete every cached audio file."""
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(self.extension):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+
+# Markdown patterns used when preparing text for speech
+_CODE_FENCE = re.compile(r'^\s*(```|~~~)')
+_HEADING = re.compile(r'^\s{0,3}#{1,6}\s+')
+_LIST_ITEM = re.compile(r'^\s*([-*+]|\d+[.)])\s+')
+_BLOCK_QUOTE = re.compile(r'^\s*>\s?')
+_TABLE_ROW = re.compile(r'^\s*\|')
+_TABLE_SEPARATOR = re.compile(r'^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$')
+_HORIZONTAL_RULE = re.compile(r'^\s*([-*_]\s*){3,}$')
+_INLINE_PATTERNS = [
+    (re.compile(r'!\[([^\]]*)\]\([^)]*\)'), r'\1'),  # Images -> alt text
+    (re.compile(r'\[([^\]]+)\]\([^)]*\)'), r'\1'),   # Links -> link text
+    (re.compile(r'<[^>]+>'), ''),                        # HTML tags
+    (re.compile(r'`+'), ''),                             # Inline code markers
+    (re.compile(r'\*+|~~'), ''),                         # Bold/italic/strikethrough
+    (re.compile(r'(?<!\w)_+|_+(?!\w)'), ''),             # Underscore emphasis
+    (re.compile(r'\s+'), ' '),
+]
+_SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+_ABBREVIATIONS = {'e.g', 'i.e', 'mr', 'mrs', 'ms', 'dr', 'prof', 'vs', 'st', 'no', 'fig'}
+
+def _clean_inline_markdown(text: str) -> str:
+    """Remove inline markdown formatting from text."""
+    for pattern, replacement in _INLINE_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+class SentenceSplitter:
+    """
+    Incrementally turn markdown text into plain sentences for speech.
+    
+    Text can be fed in arbitrary chunks (e.g. from a streaming response);
+    each call returns the sentences completed so far. Code blocks are
+    skipped and markdown formatting is removed.
+    """
+    
+    def __init__(self):
+        """Initialize an empty splitter."""
+        self._pending = ""      # Raw text not yet processed
+        self._sentence = ""     # Cleaned text of the sentence being built
+        self._at_line_start = True
+        self._in_code_block = False
+    
+    def feed(self, chunk: str) -> List[str]:
+        """
+        Add text and return any sentences it completes.
+        
+        Args:
+            chunk (str): Next piece of markdown text
+            
+        Returns:
+            list: Completed plain-text sentences
+        """
+        self._pending += chunk
+        sentences = []
+        
+        while "\n" in self._pending:
+            line, self._pending = self._pending.split("\n", 1)
+            sentences.extend(self._add_segment(line, line_end=True))
+        
+        # Speak sentences in an unfinished line without waiting for the newline,
+        # unless the line could still turn out to be a code fence
+        if self._pending and not self._in_code_block and not (
+                self._at_line_start and self._pending.lstrip()[:1] in ('`', '~', '')):
+            cut = None
+            for match in _SENTENCE_END.finditer(self._pending):
+                cut = match.end()
+            if cut is not None:
+                segment, self._pending = self._pending[:cut], self._pending[cut:]
+                sentences.extend(self._add_segment(segment, line_end=False))
+        
+        return sentences
+    
+    def flush(self) -> List[str]:
+        """
+        Signal the end of the text and return the remaining sentences.
+        
+        Returns:
+            list: Remaining plain-text sentences
+        """
+        sentences = []
+        if self._pending:
+            sentences.extend(self._add_segment(self._pending, line_end=True))
+            self._pending = ""
+        sentences.extend(self._end_sentence())
+        return sentences
+    
+    def _add_segment(self, segment: str, line_end: bool) -> List[str]:
+        """Process a complete line, or the start of one, and return finished sentences."""
+        sentences = []
+        flush_after = False
+        
+        if self._at_line_start:
+            if _CODE_FENCE.match(segment):
+                self._in_code_block = not self._in_code_block
+                self._at_line_start = True
+                return self._end_sentence()
+            
+            if self._in_code_block:
+                return []
+            
+            if not segment.strip() or _HORIZONTAL_RULE.match(segment) or _TABLE_SEPARATOR.match(segment):
+                self._at_line_start = line_end
+                return self._end_sentence()
+            
+            # A new block element ends whatever came before it
+            for pattern in (_HEADING, _LIST_ITEM, _BLOCK_QUOTE):
+                match = pattern.match(segment)
+                if match:
+                    sentences.extend(self._end_sentence())
+                    segment = segment[match.end():]
+                    flush_after = pattern is _HEADING
+                    break
+            else:
+                if _TABLE_ROW.match(segment):
+                    sentences.extend(self._end_sentence())
+                    cells = [cell.strip() for cell in segment.strip().strip('|').split('|')]
+                    segment = ", ".join(cell for cell in cells if cell)
+                    flush_after = True
+        
+        self._sentence = f"{self._sentence} {_clean_inline_markdown(segment)}".strip()
+        sentences.extend(self._split_complete())
+        
+        if flush_after and line_end:
+            sentences.extend(self._end_sentence())
+        
+        self._at_line_start = line_end
+        return sentences
+    
+    def _split_complete(self) -> List[str]:
+        """Remove and return the complete sentences in the current buffer."""
+        sentences = []
+        start = 0
+        text = self._sentence + " "
+        
+        for match in _SENTENCE_END.finditer(text):
+            words = text[start:match.start()].split()
+            if words and words[-1].lower().rstrip('.') in _ABBREVIATIONS:
+                continue
+            sentence = text[start:match.end()].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+        
+        self._sentence = text[start:].strip()
+        return sentences
+    
+    def _end_sentence(self) -> List[str]:
+        """Return the buffered text as a sentence even without final punctuation."""
+        sentence, self._sentence = self._sentence.strip(), ""
+        return [sentence] if sentence else []
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Strip markdown from text and split it into sentences.
+    
+    Args:
+        text (str): Markdown text
+        
+    Returns:
+        list: Plain-text sentences
+    """
+    splitter = SentenceSplitter()
+    return splitter.feed(text) + splitter.flush()
+
+def strip_markdown(text: str) -> str:
+    """Convert markdown text to plain text suitable for speech."""
+    return " ".join(split_sentences(text))
+
+def audio_duration(path: str, text: str = "", words_per_minute: int = 200) -> float:
+    """
+    Get the playing time of an audio file in seconds.
+    
+    Args:
+        path (str): Path to the audio file
+        text (str): Spoken text, used for an estimate if the file can't be read as WAV
+        words_per_minute (int): Speech rate for the estimate
+        
+    Returns:
+        float: Duration in seconds
+    """
+    try:
+        with wave.open(path, 'rb') as wav_file:
+            return wav_file.getnframes() / float(wav_file.getframerate())
+    except (wave.Error, OSError, EOFError):
+        return max(0.5, len(text.split()) * 60.0 / words_per_minute)
+
+class SpeechPipeline:
+    """
+    Speak text sentence by sentence, synthesising ahead of playback.
+    
+    One thread synthesises sentences while another plays them, so the next
+    sentence is rendered while the current one plays and the first audio
+    is ready as soon as the first sentence has been synthesised.
+    """
+    
+    def __init__(self, synthesize: Callable[[str], Any], play: Callable[[Any], None], lookahead: int = 2):
+        """
+        Initialize and start the pipeline.
+        
+        Args:
+            synthesize (function): Turns a sentence into a playable clip, or None to skip it
+            play (function): Plays a clip, returning when playback has finished
+            lookahead (int): Number of synthesised clips that may wait for playback
+        """
+        self.synthesize = synthesize
+        self.play = play
+        self.time_to_first_audio = None
+        self.sentences_played = 0
+        
+        self._splitter = SentenceSplitter()
+        self._sentences = queue.Queue()
+        self._clips = queue.Queue(maxsize=max(1, lookahead))
+        self._cancelled = threading.Event()
+        self._started_at = time.time()
+        
+        # Both threads continue the caller's trace
+        self._synth_thread = threading.Thread(
+            target=contextvars.copy_context().run, args=(self._synthesize_loop,), daemon=True
+        )
+        self._play_thread = threading.Thread(
+            target=contextvars.copy_context().run, args=(self._play_loop,), daemon=True
+        )
+        self._synth_thread.start()
+        self._play_thread.start()
+    
+    def feed(self, chunk: str):
+        """Add more text, e.g. the next chunk of a streaming response."""
+        for sentence in self._splitter.feed(chunk):
+            self._sentences.put(sentence)
+    
+    def finish(self):
+        """Signal that no more text will be fed."""
+        for sentence in self._splitter.flush():
+            self._sentences.put(sentence)
+        self._sentences.put(None)
+    
+    def speak(self, text: str):
+        """Speak a complete text."""
+        self.feed(text)
+        self.finish()
+    
+    def cancel(self):
+        """Stop synthesis and playback as soon as possible."""
+        self._cancelled.set()
+        self._sentences.put(None)
+        try:
+            while True:
+                self._clips.get_nowait()
+        except queue.Empty:
+            pass
+        self._put_clip(None)
+    
+    def is_cancelled(self) -> bool:
+        """Check whether the pipeline was cancelled."""
+        return self._cancelled.is_set()
+    
+    def is_done(self) -> bool:
+        """Check whether playback has finished or been cancelled."""
+        return not self._play_thread.is_alive()
+    
+    def wait(self, timeout: float = None) -> bool:
+        """Wait for playback to finish. Returns True if it did."""
+        self._play_thread.join(timeout)
+        return self.is_done()
+    
+    def _put_clip(self, clip) -> bool:
+        """Queue a clip for playback, giving up if the pipeline is cancelled."""
+        while True:
+            try:
+                self._clips.put(clip, timeout=0.1)
+                return True
+            except queue.Full:
+                if not self._cancelled.is_set():
+                    continue
+                if clip is not None:
+                    return False
+                # Make room for the end marker
+                try:
+                    self._clips.get_nowait()
+                except queue.Empty:
+                    pass
+    
+    def _synthesize_loop(self):
+        """Synthesise sentences and hand them to the player."""
+        while not self._cancelled.is_set():
+            sentence = self._sentences.get()
+            if sentence is None:
+                break
+            
+            try:
+                clip = self.synthesize(sentence)
+            except Exception as e:
+                print(f"Error synthesising speech: {e}")
+                continue
+            
+            if clip is not None and not self._put_clip(clip):
+                return
+        
+        self._put_clip(None)
+    
+    def _play_loop(self):
+        """Play clips in order until the end of the text or cancellation."""
+        while True:
+            clip = self._clips.get()
+            if clip is None or self._cancelled.is_set():
+                break
+            
+            if self.time_to_first_audio is None:
+                self.time_to_first_audio = time.time() - self._started_at
+            
+            try:
+                first = self.sentences_played == 0
+                with tracing.span("tts.play", sentence=self.sentences_played,
+                                  time_to_first_audio_ms=round(self.time_to_first_audio * 1000, 1) if first else None):
+                    self.play(clip)
+                self.sentences_played += 1
+            except Exception as e:
+                print(f"Error playing speech: {e}")
+
+class ClientClipPlayer:
+    """
+    Queue audio clips for a client (e.g. a browser) that plays them back to back.
+    
+    The client plays every clip to its end and reports its progress with
+    client_progress(). play() returns once the client has no more than
+    `ahead` clips waiting, so a SpeechPipeline driving it stays just ahead of
+    playback and no clip is cut short by server-side timing.
+    """
+    
+    def __init__(self, ahead: int = 1, stall_margin: float = 5.0):
+        """
+        Initialize with an empty queue.
+        
+        Args:
+            ahead (int): Clips the client may hold beyond the one playing
+            stall_margin (float): Seconds past the expected end of playback after
+                which a client that stopped reporting (e.g. a closed tab) is given up on
+        """
+        self.ahead = ahead
+        self.stall_margin = stall_margin
+        self.id = os.urandom(8).hex()
+        self.clips = []
+        self._durations = []
+        self.received = 0
+        self.finished = 0
+        self._playback_end = time.monotonic()
+        self._stopped = False
+        self._changed = threading.Condition()
+    
+    def _stalled(self) -> bool:
+        return time.monotonic() > self._playback_end + self.stall_margin
+    
+    def play(self, path: str):
+        """Queue a clip and wait until the client has caught up to within `ahead` clips."""
+        with self._changed:
+            self.clips.append(path)
+            self._durations.append(audio_duration(path))
+            self._playback_end = max(self._playback_end, time.monotonic()) + self._durations[-1]
+            while not self._stopped and len(self.clips) - self.finished > self.ahead:
+                remaining = self._playback_end + self.stall_margin - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+    
+    def client_progress(self, received: int, finished: int):
+        """Record how many clips the client has received and played to the end."""
+        with self._changed:
+            self.received = max(self.received, min(received, len(self.clips)))
+            if finished > self.finished:
+                self.finished = min(finished, len(self.clips))
+                # Re-anchor the expected end of playback on the client's actual progress
+                self._playback_end = time.monotonic() + sum(self._durations[self.finished:])
+                self._changed.notify_all()
+    
+    def pending_clips(self) -> List[str]:
+        """Clips the client has not received yet, starting at index `received`."""
+        with self._changed:
+            return self.clips[self.received:]
+    
+    def is_finished(self) -> bool:
+        """Whether every queued clip has been played (or the client stopped responding)."""
+        with self._changed:
+            return self._stopped or self.finished >= len(self.clips) or self._stalled()
+    
+    def stop(self):
+        """Stop waiting for the client."""
+        with self._changed:
+            self._stopped = True
+            self._changed.notify_all()
+
 # Utility functions for voice commands
 def is_voice_command(text: str, command: str) -> bool:
     """Check if text contains a voice command."""